@@ -1,5 +1,6 @@
 from flask import Flask, jsonify, request
 import os
+import threading
 from .buyRequest import buyRequest
 from .buy import buy_stock
 from .utils import test_database_connection
@@ -16,6 +17,27 @@ def create_app():
     if not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
         print("Starting background price updater...")
         start_background_price_updater(interval_minutes=0.3)
+        
+        # Load the in-memory stock search index
+        from .search import warm_search_index
+        warm_search_index()
+        
+        # Recover the in-memory trade ledger before any order can run; without it trades go straight to SQL
+        if os.getenv('LEDGER_ENABLED', 'true').lower() != 'false':
+            from .ledger import trade_ledger
+            trade_ledger.load()
+        
+        # Reload resting limit/stop orders; price updates trigger them from here on
+        from .order_service import start_order_service
+        start_order_service()
+        
+        # Seed the live portfolio valuation; until then summaries are computed in SQL
+        from .valuation import portfolio_valuation
+        threading.Thread(target=portfolio_valuation.load, daemon=True).start()
+        
+        # Record end-of-day (and optional intraday) NAV snapshots for performance history
+        from .nav import start_background_nav_snapshots
+        start_background_nav_snapshots()
 
     @app.route("/")          # sanity check
     def health():
@@ -39,6 +61,9 @@ def create_app():
             "price_updater_status": price_updater_status,
             "endpoints": {
                 "quotes": "/api/stocks/<symbol>",
+                "multi_quotes": "/api/stocks?symbols=<symbols>",
+                "quote_stream": "/api/stream/quotes?symbols=<symbols>",
+                "dashboard": "/api/dashboard?days=<days>",
                 "overview": "/api/stocks/<symbol>/overview",
                 "financials": "/api/stocks/<symbol>/overview (includes financial data)",
                 "intraday": "/api/stocks/<symbol>/intraday",
@@ -47,7 +72,15 @@ def create_app():
                 "earnings": "/api/stocks/<symbol>/earnings",
                 "test": "/api/test-connection",
                 "manual_price_update": "/api/prices/update",
-                "owned_stocks": "/api/prices/owned-stocks"
+                "owned_stocks": "/api/prices/owned-stocks",
+                "db_pool": "/api/db/pool",
+                "valuation": "/api/portfolio/valuation",
+                "analytics": "/api/portfolio/analytics?start=<date>&end=<date>&symbol=<symbol>",
+                "risk": "/api/portfolio/risk?confidence=<0.95>&horizon=<days>",
+                "backtest": "POST /api/backtest",
+                "ledger": "/api/ledger/stats",
+                "resting_orders": "/api/orders?user_id=<user>&symbol=<symbol>",
+                "nav_history": "/api/portfolio/nav?period=<day|intraday|week|month>&start=<date>&end=<date>"
             }
         })
 
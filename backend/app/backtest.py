@@ -0,0 +1,311 @@
+import datetime
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from .order_request import OrderRequest, OrderSide, create_market_order
+from .lots import QUANTITY_EPSILON
+from .performance import compute_metrics
+
+# Replays stored bars through the market-order semantics of OrderManager / trade_executor
+# (cash check, weighted average cost, FIFO lots, realized P&L on sells) against an in-memory
+# ledger. Nothing is fetched from the network and nothing is written to the database.
+
+TRADING_DAYS_PER_YEAR = 252
+# Minutes in a regular session, to annualize statistics of intraday bars
+TRADING_MINUTES_PER_DAY = 390
+
+class BacktestLedger:
+    """Cash, positions and FIFO lots of one simulated account"""
+
+    def __init__(self, symbols: Sequence[str], initial_cash: float):
+        self.symbols = list(symbols)
+        self.cash = float(initial_cash)
+        self.column = {symbol: index for index, symbol in enumerate(self.symbols)}
+        self.quantities = np.zeros(len(self.symbols))    # shares held per symbol column
+        self.average_costs = np.zeros(len(self.symbols))
+        self.realized_pnl = 0.0
+        self.trades = []
+        self.rejected = []
+        self._lots = [deque() for _ in self.symbols]     # [quantity, price] per open lot, oldest first
+
+    def place_order(self, order: OrderRequest, price: float, timestamp) -> Dict:
+        """Fill a market order at `price`; returns the same shape as OrderManager.place_order"""
+        column = self.column.get(order.symbol)
+        if column is None or not np.isfinite(price):
+            result = {"error": f"No price for {order.symbol} at {timestamp}"}
+        elif order.side == OrderSide.BUY:
+            result = self._buy(column, order.quantity, price, timestamp)
+        else:
+            result = self._sell(column, order.quantity, price, timestamp)
+
+        if 'error' in result:
+            self.rejected.append({"time": str(timestamp), "symbol": order.symbol,
+                                  "side": order.side.value, "quantity": order.quantity, **result})
+        return result
+
+    def position(self, symbol: str) -> float:
+        return float(self.quantities[self.column[symbol]])
+
+    def equity(self, prices: np.ndarray) -> float:
+        held = self.quantities > 0
+        return self.cash + float(self.quantities[held] @ prices[held])
+
+    def _buy(self, column: int, quantity: float, price: float, timestamp) -> Dict:
+        total_cost = price * quantity
+        if total_cost > self.cash:
+            return {"error": f"Insufficient funds. Required: ${total_cost:.2f}, Available: ${self.cash:.2f}"}
+
+        # Weighted average cost of the combined position
+        old_quantity = self.quantities[column]
+        new_quantity = old_quantity + quantity
+        self.average_costs[column] = (old_quantity * self.average_costs[column] + total_cost) / new_quantity
+        self.quantities[column] = new_quantity
+        self._lots[column].append([quantity, price])
+        self.cash -= total_cost
+
+        self.trades.append({"time": str(timestamp), "symbol": self.symbols[column], "side": "BUY",
+                            "quantity": quantity, "price": price, "realized_pnl": None})
+        return {
+            "success": True,
+            "filled_price": price,
+            "filled_quantity": quantity,
+            "total_cost": total_cost
+        }
+
+    def _sell(self, column: int, quantity: float, price: float, timestamp) -> Dict:
+        holding_quantity = self.quantities[column]
+        if holding_quantity + QUANTITY_EPSILON < quantity:
+            return {"error": f"Insufficient shares. Available: {holding_quantity}, Requested: {quantity}"}
+
+        # Consume the oldest open lots; what is left keeps the position's cost
+        lots = self._lots[column]
+        cost_basis = 0.0
+        remaining_to_sell = quantity
+        while remaining_to_sell > QUANTITY_EPSILON and lots:
+            lot = lots[0]
+            sold = min(remaining_to_sell, lot[0])
+            cost_basis += sold * lot[1]
+            remaining_to_sell -= sold
+            lot[0] -= sold
+            if lot[0] < QUANTITY_EPSILON:
+                lots.popleft()
+
+        proceeds = price * quantity
+        realized_pnl = proceeds - cost_basis
+        new_quantity = holding_quantity - quantity
+        if new_quantity < QUANTITY_EPSILON:
+            self.quantities[column] = 0.0
+            self.average_costs[column] = 0.0
+            lots.clear()
+        else:
+            self.quantities[column] = new_quantity
+            self.average_costs[column] = sum(lot[0] * lot[1] for lot in lots) / new_quantity
+        self.cash += proceeds
+        self.realized_pnl += realized_pnl
+
+        self.trades.append({"time": str(timestamp), "symbol": self.symbols[column], "side": "SELL",
+                            "quantity": quantity, "price": price, "realized_pnl": round(realized_pnl, 2)})
+        return {
+            "success": True,
+            "filled_price": price,
+            "filled_quantity": quantity,
+            "proceeds": proceeds,
+            "realized_pnl": round(realized_pnl, 2)
+        }
+
+class Bar:
+    """What a strategy sees at one timestamp: prices up to now and the account"""
+
+    def __init__(self, index: int, timestamp, symbols: List[str], closes: np.ndarray, ledger: BacktestLedger):
+        self.index = index
+        self.timestamp = timestamp
+        self.symbols = symbols
+        self.ledger = ledger
+        self._closes = closes
+
+    @property
+    def prices(self) -> np.ndarray:
+        """Closes of every symbol at this bar (NaN before a symbol's first bar)"""
+        return self._closes[self.index]
+
+    def history(self, lookback: int = None) -> np.ndarray:
+        """(bars, symbols) closes up to and including this bar; never the future"""
+        start = 0 if lookback is None else max(0, self.index + 1 - lookback)
+        return self._closes[start:self.index + 1]
+
+    def buy(self, symbol: str, quantity: float) -> OrderRequest:
+        return create_market_order(symbol, OrderSide.BUY, quantity)
+
+    def sell(self, symbol: str, quantity: float) -> OrderRequest:
+        return create_market_order(symbol, OrderSide.SELL, quantity)
+
+# A strategy is called once per bar and returns the orders to fill at that bar's close.
+# It may also define prepare(closes, symbols), called once with the whole close matrix,
+# to precompute indicators in one vectorized pass.
+Strategy = Callable[[Bar], Optional[Iterable[OrderRequest]]]
+
+def run_backtest(strategy: Strategy, closes: pd.DataFrame, initial_cash: float = 100000.0) -> Dict:
+    """
+    Replay a (timestamp x symbol) close matrix through `strategy` and return the equity
+    curve, the trade log, rejected orders and performance statistics of the equity curve.
+    """
+    started = time.perf_counter()
+    symbols = [str(symbol).upper() for symbol in closes.columns]
+    timestamps = closes.index
+    matrix = closes.to_numpy(dtype=np.float64)
+    ledger = BacktestLedger(symbols, initial_cash)
+
+    prepare = getattr(strategy, 'prepare', None)
+    if prepare is not None:
+        prepare(matrix, symbols)
+
+    # Last known price per symbol, for valuing positions on bars where a symbol has no data
+    marks = pd.DataFrame(matrix).ffill().fillna(0).to_numpy()
+    equity = np.empty(len(matrix))
+    cash = np.empty(len(matrix))
+    for index, timestamp in enumerate(timestamps):
+        orders = strategy(Bar(index, timestamp, symbols, matrix, ledger))
+        for order in orders or ():
+            column = ledger.column.get(order.symbol)
+            ledger.place_order(order, matrix[index, column] if column is not None else np.nan, timestamp)
+        equity[index] = ledger.equity(marks[index])
+        cash[index] = ledger.cash
+
+    index = pd.DatetimeIndex(timestamps)
+    intraday = len(index) > 1 and not (index.normalize() == index).all()
+    if intraday:
+        # Annualize by bar spacing (the median skips overnight and weekend gaps), not calendar span
+        spacing = np.median(np.diff(index.values)) / np.timedelta64(1, 'm')
+        periods_per_year = TRADING_DAYS_PER_YEAR * TRADING_MINUTES_PER_DAY / spacing
+        dates = index.values.astype('datetime64[m]')
+    else:
+        periods_per_year = None
+        dates = index.values.astype('datetime64[D]')
+    metrics = compute_metrics(dates, equity, periods_per_year=periods_per_year) if len(equity) >= 2 else {}
+    metrics.pop('rolling_returns', None)
+    if intraday:
+        # Without external flows the IRR only restates the return, annualized over a calendar span of hours
+        metrics.pop('money_weighted_return', None)
+    time_format = '%Y-%m-%d %H:%M' if intraday else '%Y-%m-%d'
+
+    return {
+        "symbols": symbols,
+        "bars": len(matrix),
+        "initial_cash": initial_cash,
+        "final_equity": round(float(equity[-1]), 2) if len(equity) else initial_cash,
+        "realized_pnl": round(ledger.realized_pnl, 2),
+        "trades_count": len(ledger.trades),
+        "rejected_count": len(ledger.rejected),
+        "metrics": metrics,
+        "equity_curve": {
+            "timestamps": index.strftime(time_format).tolist(),
+            "equity": np.round(equity, 2).tolist(),
+            "cash": np.round(cash, 2).tolist()
+        },
+        "positions": {symbol: float(quantity) for symbol, quantity in zip(symbols, ledger.quantities) if quantity > 0},
+        "trades": ledger.trades,
+        "rejected": ledger.rejected,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+def load_closes(symbols: Sequence[str], interval: str = "1d", start: datetime.date = None,
+                end: datetime.date = None) -> pd.DataFrame:
+    """Stored closes as a (timestamp x symbol) matrix, read in one range scan (no network)"""
+    from .utils import db_connection
+    symbols = [symbol.upper() for symbol in symbols]
+    conditions = ["bar_interval = %s", f"stock_symbol IN ({', '.join(['%s'] * len(symbols))})"]
+    params = [interval] + symbols
+    if start is not None:
+        conditions.append("bar_time >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("bar_time < %s")
+        params.append(end + datetime.timedelta(days=1))
+
+    with db_connection() as db:
+        if not db:
+            raise RuntimeError("Database connection failed")
+        cursor = db.cursor()
+        cursor.execute(f"""
+            SELECT bar_time, stock_symbol, close_price
+            FROM price_history
+            WHERE {' AND '.join(conditions)}
+        """, params)
+        rows = cursor.fetchall()
+
+    frame = pd.DataFrame(rows, columns=['time', 'symbol', 'close'])
+    closes = frame.pivot_table(index='time', columns='symbol', values='close', aggfunc='last')
+    closes = closes.reindex(columns=[symbol for symbol in symbols if symbol in closes.columns])
+    closes.index = pd.to_datetime(closes.index)
+    return closes.sort_index().astype(float)
+
+# Built-in strategies, selectable by name from the API
+
+class BuyAndHold:
+    """Split the starting cash equally across the symbols on the first bar and hold"""
+
+    def __call__(self, bar: Bar) -> List[OrderRequest]:
+        if bar.index != 0:
+            return []
+        budget = bar.ledger.cash / len(bar.symbols)
+        return [bar.buy(symbol, int(budget // price))
+                for symbol, price in zip(bar.symbols, bar.prices)
+                if np.isfinite(price) and budget // price >= 1]
+
+class SmaCrossover:
+    """Hold a symbol while its fast moving average is above its slow one, sized to an equal cash slice"""
+
+    def __init__(self, fast: int = 20, slow: int = 50):
+        if not 0 < fast < slow:
+            raise ValueError("fast must be positive and smaller than slow")
+        self.fast = fast
+        self.slow = slow
+        self._signal = None
+
+    def prepare(self, closes: np.ndarray, symbols: List[str]):
+        # Moving averages of every symbol at every bar in one vectorized pass
+        filled = pd.DataFrame(closes).ffill().to_numpy()
+        fast = pd.DataFrame(filled).rolling(self.fast).mean().to_numpy()
+        slow = pd.DataFrame(filled).rolling(self.slow).mean().to_numpy()
+        self._signal = np.nan_to_num(fast) > np.nan_to_num(slow)
+        self._signal[np.isnan(slow)] = False
+
+    def __call__(self, bar: Bar) -> List[OrderRequest]:
+        want = self._signal[bar.index]
+        held = bar.ledger.quantities > 0
+        orders = [bar.sell(bar.symbols[column], bar.ledger.quantities[column])
+                  for column in np.flatnonzero(held & ~want)]
+        entries = np.flatnonzero(want & ~held)
+        if len(entries):
+            budget = bar.ledger.cash / max(1, len(bar.symbols) - int(held.sum()))
+            for column in entries:
+                price = bar.prices[column]
+                shares = int(budget // price) if np.isfinite(price) else 0
+                if shares >= 1:
+                    orders.append(bar.buy(bar.symbols[column], shares))
+        return orders
+
+STRATEGIES = {
+    "buy_and_hold": BuyAndHold,
+    "sma_crossover": SmaCrossover
+}
+
+def get_backtest(strategy: str, symbols: Sequence[str], interval: str = "1d", start: datetime.date = None,
+                 end: datetime.date = None, initial_cash: float = 100000.0, params: Dict = None) -> Dict:
+    """Run a built-in strategy over stored bars"""
+    factory = STRATEGIES.get(strategy)
+    if factory is None:
+        return {"error": f"Unknown strategy: {strategy}. Available: {', '.join(sorted(STRATEGIES))}"}
+    try:
+        closes = load_closes(symbols, interval, start, end)
+        if closes.empty:
+            return {"error": "No stored bars for the requested symbols and range"}
+        result = run_backtest(factory(**(params or {})), closes, initial_cash)
+        return {"strategy": strategy, "interval": interval, **result}
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid strategy parameters: {e}"}
+    except Exception as e:
+        print(f"Error running backtest: {e}")
+        return {"error": str(e)}
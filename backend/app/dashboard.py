@@ -0,0 +1,203 @@
+import datetime
+import hashlib
+from typing import Container, Dict, Optional, Tuple
+from .utils import db_connection
+from .pnl_kernels import cents, holding_columns, value_holdings
+
+def get_dashboard(user_id: str = 'default_user', days: int = 30,
+                  if_none_match: Container = None) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Portfolio, cash balance, P&L and performance from one snapshot on one connection.
+    Returns (document, etag); the document is None when the etag is in `if_none_match`
+    (nothing changed since the client's copy) or on error (etag None as well).
+    """
+    start_date = datetime.datetime.now() - datetime.timedelta(days=days)
+
+    with db_connection() as db:
+        if not db:
+            return {"error": "Database connection failed"}, None
+
+        # Every read below sees the same point-in-time snapshot
+        db.start_transaction(consistent_snapshot=True, readonly=True)
+        cursor = db.cursor(dictionary=True)
+
+        etag = _dashboard_etag(cursor, user_id, days, start_date)
+        if if_none_match is not None and etag in if_none_match:
+            return None, etag
+
+        # One holdings scan feeds the portfolio, unrealized P&L and totals
+        cursor.execute("""
+            SELECT h.stock_symbol, CAST(h.quantity AS DOUBLE) AS quantity,
+                   CAST(h.average_cost AS DOUBLE) AS average_cost,
+                   CAST(s.current_price AS DOUBLE) AS current_price
+            FROM holdings h
+            LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
+            ORDER BY h.stock_symbol
+        """)
+        holdings = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT cash_balance, updated_at FROM user_balance WHERE user_id = %s
+        """, (user_id,))
+        balance = cursor.fetchone()
+
+        # Realized P&L (all time and for the period) and trade volume, per side, in one pass
+        cursor.execute("""
+            SELECT trade_type,
+                   COUNT(*) AS trade_count,
+                   SUM(quantity * price_at_trade) AS total_value,
+                   SUM(COALESCE(realized_pnl, 0)) AS total_pnl,
+                   SUM(realized_pnl IS NOT NULL) AS realized_count,
+                   SUM(realized_pnl > 0) AS winning_trades,
+                   SUM(realized_pnl < 0) AS losing_trades,
+                   SUM(CASE WHEN realized_pnl > 0 THEN realized_pnl ELSE 0 END) AS total_wins,
+                   SUM(CASE WHEN realized_pnl < 0 THEN realized_pnl ELSE 0 END) AS total_losses
+            FROM trades
+            WHERE trade_date >= %s
+            GROUP BY trade_type
+        """, (start_date,))
+        period = {row['trade_type']: row for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT COALESCE(SUM(realized_pnl), 0) AS total_realized_pnl
+            FROM trades WHERE trade_type = 'SELL'
+        """)
+        all_time_realized = float(cursor.fetchone()['total_realized_pnl'])
+
+    portfolio, unrealized = _holdings_sections(holdings, all_time_realized)
+    realized = _realized_section(period.get('SELL'), days)
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    return {
+        "portfolio": portfolio,
+        "cash": {
+            "user_id": user_id,
+            "cash_balance": float(balance['cash_balance']),
+            "updated_at": balance['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
+        } if balance else {"error": "User not found"},
+        "pnl": {
+            "summary": {
+                "total_pnl": round(realized['total_realized_pnl'] + unrealized['unrealized_pnl'], 2),
+                "realized_pnl": realized['total_realized_pnl'],
+                "unrealized_pnl": unrealized['unrealized_pnl'],
+                "total_market_value": unrealized['total_market_value'],
+                "total_cost_basis": unrealized['total_cost_basis']
+            },
+            "realized": realized,
+            "unrealized": unrealized,
+            "report_date": now,
+            "period_days": days
+        },
+        "performance": _performance_section(period, days),
+        "generated_at": now
+    }, etag
+
+def _dashboard_etag(cursor, user_id: str, days: int, start_date: datetime.datetime) -> str:
+    # Cheap indexed reads that change whenever anything on the dashboard would
+    cursor.execute("""
+        SELECT
+            (SELECT COALESCE(MAX(trade_id), 0) FROM trades) AS last_trade_id,
+            (SELECT COUNT(*) FROM trades WHERE trade_date >= %s) AS period_trades,
+            (SELECT MAX(updated_at) FROM holdings) AS holdings_updated,
+            (SELECT COUNT(*) FROM holdings) AS holdings_count,
+            (SELECT MAX(s.updated_at) FROM holdings h
+             JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol) AS prices_updated,
+            (SELECT CONCAT(cash_balance, '@', updated_at) FROM user_balance WHERE user_id = %s) AS cash_version
+    """, (start_date, user_id))
+    version = cursor.fetchone()
+    fingerprint = "|".join([user_id, str(days)] + [str(version[key]) for key in sorted(version)])
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+def _holdings_sections(holdings, all_time_realized: float) -> Tuple[Dict, Dict]:
+    columns = holding_columns(holdings)
+    valued = value_holdings(**columns)
+    total_unrealized = valued['total_unrealized_pnl']
+    unrealized_percent = valued['unrealized_pnl_percent_total']
+
+    portfolio_holdings = []
+    unrealized_positions = []
+    for holding, quantity, avg_cost, current_price, market_value, cost_basis, unrealized_pnl, unrealized_pnl_percent in zip(
+            holdings, columns['quantity'].tolist(), columns['average_cost'].tolist(),
+            columns['current_price'].tolist(), cents(valued['market_value']), cents(valued['cost_basis']),
+            cents(valued['unrealized_pnl']), cents(valued['unrealized_pnl_percent'])):
+        portfolio_holdings.append({
+            'stock_symbol': holding['stock_symbol'],
+            'quantity': quantity,
+            'average_cost': avg_cost,
+            'current_price': current_price,
+            'market_value': market_value,
+            'cost_basis': cost_basis,
+            'unrealized_pnl': unrealized_pnl,
+            'unrealized_pnl_percent': unrealized_pnl_percent
+        })
+        if quantity > 0:
+            unrealized_positions.append({
+                "symbol": holding['stock_symbol'],
+                "quantity": quantity,
+                "average_cost": avg_cost,
+                "current_price": current_price,
+                "cost_basis": cost_basis,
+                "market_value": market_value,
+                "unrealized_pnl": unrealized_pnl,
+                "unrealized_pnl_percent": unrealized_pnl_percent
+            })
+
+    portfolio = {
+        "holdings": portfolio_holdings,
+        "summary": {
+            "total_portfolio_value": round(valued['total_market_value'], 2),
+            "total_cost_basis": round(valued['total_cost_basis'], 2),
+            "total_unrealized_pnl": round(total_unrealized, 2),
+            "total_realized_pnl": all_time_realized,
+            "total_pnl": round(total_unrealized + all_time_realized, 2),
+            "unrealized_pnl_percent": unrealized_percent,
+            "holdings_count": len(portfolio_holdings)
+        }
+    }
+    unrealized = {
+        "unrealized_pnl": round(total_unrealized, 2),
+        "total_market_value": round(valued['total_market_value'], 2),
+        "total_cost_basis": round(valued['total_cost_basis'], 2),
+        "unrealized_pnl_percent": unrealized_percent,
+        "holdings": unrealized_positions
+    }
+    return portfolio, unrealized
+
+def _realized_section(sells: Optional[Dict], days: int) -> Dict:
+    count = int(sells['realized_count'] or 0) if sells else 0
+    if not count:
+        return {
+            "total_realized_pnl": 0,
+            "trades_count": 0,
+            "winning_trades": 0,
+            "losing_trades": 0,
+            "win_rate": 0,
+            "average_win": 0,
+            "average_loss": 0,
+            "period_days": days
+        }
+
+    winning = int(sells['winning_trades'] or 0)
+    losing = int(sells['losing_trades'] or 0)
+    return {
+        "total_realized_pnl": round(float(sells['total_pnl']), 2),
+        "trades_count": count,
+        "winning_trades": winning,
+        "losing_trades": losing,
+        "win_rate": round(winning / count * 100, 2),
+        "average_win": round(float(sells['total_wins']) / winning, 2) if winning else 0,
+        "average_loss": round(float(sells['total_losses']) / losing, 2) if losing else 0,
+        "period_days": days
+    }
+
+def _performance_section(period: Dict, days: int) -> Dict:
+    buys = period.get('BUY')
+    sells = period.get('SELL')
+    return {
+        "period_days": days,
+        "buy_volume": float(buys['total_value']) if buys else 0,
+        "sell_volume": float(sells['total_value']) if sells else 0,
+        "buy_trades": buys['trade_count'] if buys else 0,
+        "sell_trades": sells['trade_count'] if sells else 0,
+        "realized_pnl": float(sells['total_pnl']) if sells else 0
+    }
@@ -0,0 +1,180 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+# Upper bounds (in milliseconds) of the checkout wait-time histogram buckets
+WAIT_TIME_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+    pass
+
+class _PooledConnection:
+    """Raw connection plus the bookkeeping needed for recycling"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+
+class ConnectionPool:
+    """Thread-safe, process-wide pool of database connections"""
+
+    def __init__(self, connect: Callable, size: int = 10, timeout: float = 10.0,
+                 recycle_seconds: float = 3600, health_check: bool = True):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle_seconds = recycle_seconds
+        self.health_check = health_check
+
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._total = 0
+        self._in_use = 0
+        self._waiters = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._wait_total_ms = 0.0
+        self._wait_max_ms = 0.0
+        self._wait_histogram = [0] * (len(WAIT_TIME_BUCKETS_MS) + 1)
+
+    def acquire(self, timeout: float = None):
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._lock:
+            pooled = None
+            while pooled is None:
+                if self._idle:
+                    pooled = self._idle.pop()
+                elif self._total < self.size:
+                    # Reserve a slot and open the connection outside the lock
+                    self._total += 1
+                    break
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {timeout:.1f}s "
+                            f"(pool size {self.size})"
+                        )
+                    self._waiters += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+            self._in_use += 1
+
+        try:
+            if pooled is not None and not self._is_usable(pooled):
+                self._close_quietly(pooled)
+                pooled = None
+                with self._lock:
+                    self._discarded += 1
+            if pooled is None:
+                pooled = _PooledConnection(self._connect())
+                with self._lock:
+                    self._created += 1
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._total -= 1
+                self._lock.notify()
+            raise
+
+        self._record_wait((time.monotonic() - started) * 1000)
+        return pooled
+
+    def release(self, pooled: _PooledConnection, discard: bool = False):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        if not discard:
+            try:
+                # End any open transaction so the next borrower gets a fresh snapshot
+                pooled.connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._total -= 1
+                self._discarded += 1
+            else:
+                self._idle.append(pooled)
+            self._lock.notify()
+
+        if discard:
+            self._close_quietly(pooled)
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Borrow a connection for the duration of a `with` block"""
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled.connection
+        finally:
+            self.release(pooled)
+
+    def close_all(self):
+        """Close every idle connection (connections in use are closed on release)"""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def metrics(self) -> Dict:
+        """Snapshot of pool usage for sizing under load"""
+        with self._lock:
+            histogram = {}
+            for i, count in enumerate(self._wait_histogram):
+                label = f"le_{WAIT_TIME_BUCKETS_MS[i]}ms" if i < len(WAIT_TIME_BUCKETS_MS) else "inf"
+                histogram[label] = count
+            return {
+                "size": self.size,
+                "open_connections": self._total,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "connections_created": self._created,
+                "connections_discarded": self._discarded,
+                "wait_time_avg_ms": round(self._wait_total_ms / self._checkouts, 3) if self._checkouts else 0,
+                "wait_time_max_ms": round(self._wait_max_ms, 3),
+                "wait_time_histogram": histogram
+            }
+
+    def _is_usable(self, pooled: _PooledConnection) -> bool:
+        if self.recycle_seconds and time.monotonic() - pooled.created_at > self.recycle_seconds:
+            return False
+        if self.health_check:
+            try:
+                pooled.connection.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _record_wait(self, wait_ms: float):
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total_ms += wait_ms
+            self._wait_max_ms = max(self._wait_max_ms, wait_ms)
+            self._wait_histogram[bisect.bisect_left(WAIT_TIME_BUCKETS_MS, wait_ms)] += 1
+
+    def _close_quietly(self, pooled: _PooledConnection):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Iterable
+
+class TokenBucket:
+    """Thread-safe token bucket that refills at `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Block until `tokens` are available; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class FetchEngine:
+    """Bounded thread-pool engine for upstream calls with a concurrency cap, per-host rate limits and retries"""
+
+    def __init__(self, max_concurrency: int = 8, rate: float = 5, burst: float = 10,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="fetch")
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "in_flight": 0, "rate_limited_seconds": 0.0}
+
+    def call(self, func: Callable, *args, host: str = "default", **kwargs):
+        """Run one upstream call under the concurrency cap and the host's rate limit, retrying on errors"""
+        attempt = 0
+        while True:
+            waited = self._bucket(host).acquire()
+            with self._semaphore:
+                with self._lock:
+                    self._stats["calls"] += 1
+                    self._stats["in_flight"] += 1
+                    self._stats["rate_limited_seconds"] += waited
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                finally:
+                    with self._lock:
+                        self._stats["in_flight"] -= 1
+
+            if attempt >= self.max_retries:
+                with self._lock:
+                    self._stats["failures"] += 1
+                raise error
+
+            # Exponential backoff with full jitter, slept outside the concurrency slot
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            attempt += 1
+            with self._lock:
+                self._stats["retries"] += 1
+            print(f"Upstream call failed ({error}); retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def map(self, func: Callable, items: Iterable[Hashable]) -> Dict:
+        """Run `func(item)` for every item in parallel and return {item: result}"""
+        items = list(dict.fromkeys(items))
+        if len(items) <= 1:
+            return {item: func(item) for item in items}
+        futures = {item: self._executor.submit(func, item) for item in items}
+        results = {}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                print(f"Parallel fetch failed for {item}: {e}")
+                results[item] = None
+        return results
+
+    def stats(self) -> Dict:
+        """Engine counters for monitoring"""
+        with self._lock:
+            return {
+                **self._stats,
+                "rate_limited_seconds": round(self._stats["rate_limited_seconds"], 3),
+                "max_concurrency": self.max_concurrency,
+                "rate_per_second": self.rate,
+                "burst": self.burst
+            }
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return bucket
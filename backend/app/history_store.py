@@ -0,0 +1,188 @@
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+import pandas as pd
+import yfinance as yf
+from .market import fetch_engine, YAHOO_HOST
+from .utils import db_connection
+
+# Per-interval settings: how far back to download on first use, how much history
+# to serve, and how long a synced series is considered fresh (seconds)
+INTERVAL_SPECS = {
+    "1m": {"period": "7d", "lookback": timedelta(days=7), "sync_ttl": 60},
+    "5m": {"period": "7d", "lookback": timedelta(days=7), "sync_ttl": 300},
+    "15m": {"period": "7d", "lookback": timedelta(days=7), "sync_ttl": 900},
+    "30m": {"period": "7d", "lookback": timedelta(days=7), "sync_ttl": 1800},
+    "1h": {"period": "7d", "lookback": timedelta(days=7), "sync_ttl": 3600},
+    "1d": {"period": "1y", "lookback": timedelta(days=365), "sync_ttl": 3600}
+}
+
+# Rows per multi-row INSERT when storing bars
+UPSERT_BATCH_SIZE = 1000
+
+_last_sync = {}
+_sync_locks = {}
+_sync_locks_guard = threading.Lock()
+
+def get_history(symbol: str, interval: str = "1d") -> pd.DataFrame:
+    """Get OHLCV bars for a symbol, syncing only the newest bars from yFinance when stale"""
+    symbol = symbol.upper()
+    spec = INTERVAL_SPECS.get(interval)
+    if spec is None:
+        raise ValueError(f"Unsupported interval: {interval}")
+
+    try:
+        _sync_if_stale(symbol, interval, spec)
+    except Exception as e:
+        print(f"History sync failed for {symbol} ({interval}): {e}")
+
+    try:
+        hist = load_history(symbol, interval, spec["lookback"])
+        if hist is not None and not hist.empty:
+            return hist
+    except Exception as e:
+        print(f"History store unavailable for {symbol} ({interval}): {e}")
+
+    # Nothing stored (or database unavailable): fall back to a direct download
+    return _download(symbol, interval, period=spec["period"])
+
+def load_history(symbol: str, interval: str = "1d", lookback: timedelta = None,
+                 start=None, end=None) -> Optional[pd.DataFrame]:
+    """Read stored bars with one indexed range scan (no network); None if the database is unavailable"""
+    with db_connection() as db:
+        if not db:
+            return None
+
+        cursor = db.cursor()
+        conditions = ["stock_symbol = %s", "bar_interval = %s"]
+        params = [symbol.upper(), interval]
+
+        if lookback is not None:
+            # Serve the window ending at the newest stored bar, like yFinance's period=
+            conditions.append("""bar_time >= (
+                SELECT MAX(bar_time) FROM price_history WHERE stock_symbol = %s AND bar_interval = %s
+            ) - INTERVAL %s SECOND""")
+            params += [symbol.upper(), interval, int(lookback.total_seconds())]
+        if start is not None:
+            conditions.append("bar_time >= %s")
+            params.append(start)
+        if end is not None:
+            conditions.append("bar_time <= %s")
+            params.append(end)
+
+        cursor.execute(f"""
+            SELECT bar_time, open_price, high_price, low_price, close_price, volume
+            FROM price_history
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bar_time
+        """, params)
+        rows = cursor.fetchall()
+
+    hist = pd.DataFrame(rows, columns=['Date', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    hist['Date'] = pd.to_datetime(hist['Date'])
+    hist = hist.set_index('Date')
+    hist[['Open', 'High', 'Low', 'Close']] = hist[['Open', 'High', 'Low', 'Close']].astype(float)
+    hist['Volume'] = hist['Volume'].astype('int64')
+    return hist
+
+def sync_history(symbol: str, interval: str = "1d") -> int:
+    """Download bars newer than the last stored one and store them; returns the number of bars written"""
+    symbol = symbol.upper()
+    spec = INTERVAL_SPECS[interval]
+
+    last_bar = _last_bar_time(symbol, interval)
+    if last_bar is None or pd.Timestamp.now() - pd.Timestamp(last_bar) > spec["lookback"]:
+        hist = _download(symbol, interval, period=spec["period"])
+    else:
+        # Re-fetch from the start of the last stored day so a partial last bar is completed
+        hist = _download(symbol, interval, start=last_bar.strftime('%Y-%m-%d'))
+
+    written = _store_bars(symbol, interval, hist)
+    print(f"History sync for {symbol} ({interval}): {written} bars stored")
+    return written
+
+def ensure_synced(symbol: str, interval: str = "1d"):
+    """Sync stored bars from yFinance unless they were synced within the interval's sync_ttl"""
+    _sync_if_stale(symbol.upper(), interval, INTERVAL_SPECS[interval])
+
+def _sync_if_stale(symbol: str, interval: str, spec: Dict):
+    key = (symbol, interval)
+    if time.monotonic() - _last_sync.get(key, float('-inf')) < spec["sync_ttl"]:
+        return
+
+    # One sync per series at a time; concurrent callers wait and then read the result
+    with _sync_locks_guard:
+        lock = _sync_locks.setdefault(key, threading.Lock())
+    with lock:
+        if time.monotonic() - _last_sync.get(key, float('-inf')) < spec["sync_ttl"]:
+            return
+        sync_history(symbol, interval)
+        _last_sync[key] = time.monotonic()
+
+def _last_bar_time(symbol: str, interval: str):
+    with db_connection() as db:
+        if not db:
+            raise RuntimeError("Database connection failed")
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT MAX(bar_time) FROM price_history
+            WHERE stock_symbol = %s AND bar_interval = %s
+        """, (symbol, interval))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+def _download(symbol: str, interval: str, period: str = None, start: str = None) -> pd.DataFrame:
+    print(f"Downloading {interval} history for {symbol} using yFinance...")
+    ticker = yf.Ticker(symbol)
+    if start is not None:
+        hist = fetch_engine.call(ticker.history, start=start, interval=interval, host=YAHOO_HOST)
+    else:
+        hist = fetch_engine.call(ticker.history, period=period, interval=interval, host=YAHOO_HOST)
+
+    if hist.empty:
+        return hist
+
+    hist = hist.dropna(subset=['Open', 'High', 'Low', 'Close'])
+    # Store exchange-local wall-clock times, which is what the API responses display
+    if hist.index.tz is not None:
+        hist.index = hist.index.tz_localize(None)
+    return hist
+
+def _store_bars(symbol: str, interval: str, hist: pd.DataFrame) -> int:
+    if hist is None or hist.empty:
+        return 0
+
+    rows = list(zip(
+        [symbol] * len(hist),
+        [interval] * len(hist),
+        hist.index.to_pydatetime(),
+        hist['Open'].astype(float).tolist(),
+        hist['High'].astype(float).tolist(),
+        hist['Low'].astype(float).tolist(),
+        hist['Close'].astype(float).tolist(),
+        hist['Volume'].fillna(0).astype('int64').tolist()
+    ))
+
+    with db_connection() as db:
+        if not db:
+            raise RuntimeError("Database connection failed")
+
+        cursor = db.cursor()
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[i:i + UPSERT_BATCH_SIZE]
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+            cursor.execute(f"""
+                INSERT INTO price_history
+                (stock_symbol, bar_interval, bar_time, open_price, high_price, low_price, close_price, volume)
+                VALUES {placeholders}
+                ON DUPLICATE KEY UPDATE
+                open_price = VALUES(open_price),
+                high_price = VALUES(high_price),
+                low_price = VALUES(low_price),
+                close_price = VALUES(close_price),
+                volume = VALUES(volume)
+            """, [value for row in batch for value in row])
+        db.commit()
+
+    return len(rows)
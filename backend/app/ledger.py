@@ -0,0 +1,606 @@
+import atexit
+import bisect
+import datetime
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from .lots import ensure_lots, get_open_lots, QUANTITY_EPSILON
+from .utils import db_connection
+from .valuation import portfolio_valuation
+
+# Upper bounds of the group-commit histograms: changes per commit, and commit time in milliseconds
+BATCH_SIZE_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250]
+COMMIT_TIME_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+# With durable acks, orders are refused while flushes fail, and flagged when their commit times out
+NOT_PERSISTING_ERROR = "Trades cannot be saved to the database right now; order not accepted, try again later"
+NOT_DURABLE_WARNING = "Executed but not yet saved to the database; it will be written once the database recovers"
+# Outcomes of a cash change: refused, applied, or applied but its commit did not land within ack_timeout
+CASH_REFUSED, CASH_APPLIED, CASH_PENDING = "refused", "applied", "pending"
+
+class Account:
+    __slots__ = ('cash_balance', 'updated_at')
+
+    def __init__(self, cash_balance: float, updated_at: datetime.datetime):
+        self.cash_balance = cash_balance
+        self.updated_at = updated_at
+
+class Lot:
+    __slots__ = ('trade_id', 'symbol', 'quantity', 'price', 'opened_at')
+
+    def __init__(self, trade_id: int, symbol: str, quantity: float, price: float, opened_at: datetime.datetime):
+        self.trade_id = trade_id
+        self.symbol = symbol
+        self.quantity = quantity
+        self.price = price
+        self.opened_at = opened_at
+
+class Position:
+    __slots__ = ('quantity', 'average_cost', 'lots')
+
+    def __init__(self, quantity: float = 0.0, average_cost: float = 0.0):
+        self.quantity = quantity
+        self.average_cost = average_cost
+        self.lots = deque()       # open FIFO lots, oldest first
+
+class TradeLedger:
+    """
+    Authoritative in-process copy of cash balances, holdings and open lots. Once loaded,
+    buys, sells and cash movements are applied here under one lock and persisted by a
+    background writer that group-commits: everything applied within `flush_interval`
+    seconds goes to MySQL in one transaction. With `durable_acks` each caller is
+    acknowledged only once the commit holding its change is done: results carry
+    durable=False (and cash changes return False) if `ack_timeout` passes first, and
+    new orders are refused while flushes are failing. Without it results carry
+    durable=None and changes not yet flushed when the process dies are lost.
+    Trade ids are allocated here, so the ledger must be the only writer of trades
+    while it is loaded.
+    """
+
+    def __init__(self, flush_interval: float = 0.05, durable_acks: bool = True, ack_timeout: float = 5.0):
+        self.flush_interval = flush_interval
+        self.durable_acks = durable_acks
+        self.ack_timeout = ack_timeout
+
+        self._lock = threading.Lock()
+        self._accounts = {}       # user_id -> Account
+        self._positions = {}      # symbol -> Position
+        self._next_trade_id = None
+        # Every change gets a sequence number; commits advance the durable one
+        self._applied_seq = 0
+        self._durable_seq = 0
+        self._durable = threading.Condition(self._lock)
+        self._flush_failing = False
+
+        # Write-behind state: rows to insert, and keys whose current state must be written
+        self._pending_trades = []
+        self._pending_pnl = []
+        self._pending_orders = []     # resting_orders FILLED updates, committed with their trades
+        self._dirty_lots = {}     # trade_id -> Lot (upsert) or None (delete)
+        self._dirty_holdings = set()
+        self._dirty_cash = set()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+        self._stats = {"trades": 0, "flushes": 0, "rows_written": 0, "flush_failures": 0,
+                       "last_flush_ms": None, "apply_us_total": 0.0, "changes_committed": 0,
+                       "max_batch_size": 0, "commit_ms_total": 0.0, "ack_timeouts": 0}
+        self._batch_histogram = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._commit_histogram = [0] * (len(COMMIT_TIME_BUCKETS_MS) + 1)
+
+    @property
+    def loaded(self) -> bool:
+        return self._next_trade_id is not None
+
+    def load(self) -> bool:
+        """Recover cash, holdings and open lots from the database and start the writer"""
+        try:
+            with db_connection() as db:
+                if not db:
+                    return False
+                db.start_transaction()
+                cursor = db.cursor(dictionary=True)
+                cursor.execute("SELECT user_id, cash_balance, updated_at FROM user_balance")
+                accounts = {row['user_id']: Account(float(row['cash_balance']), row['updated_at'])
+                            for row in cursor.fetchall()}
+
+                cursor.execute("SELECT stock_symbol, quantity, average_cost FROM holdings WHERE quantity > 0")
+                positions = {}
+                for holding in cursor.fetchall():
+                    symbol = holding['stock_symbol']
+                    quantity = float(holding['quantity'])
+                    position = Position(quantity, float(holding['average_cost']))
+                    # Rebuilds the lots from trade history if they do not cover the holding
+                    ensure_lots(cursor, symbol, quantity)
+                    for lot in get_open_lots(cursor, symbol):
+                        position.lots.append(Lot(lot['trade_id'], symbol, lot['available_quantity'],
+                                                 lot['price_at_trade'], lot['trade_date']))
+                    positions[symbol] = position
+
+                cursor.execute("SELECT COALESCE(MAX(trade_id), 0) AS last_trade_id FROM trades")
+                next_trade_id = int(cursor.fetchone()['last_trade_id']) + 1
+                db.commit()
+        except Exception as e:
+            print(f"Error loading trade ledger: {e}")
+            return False
+
+        with self._lock:
+            self._accounts = accounts
+            self._positions = positions
+            self._next_trade_id = next_trade_id
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True, name="ledger-writer")
+            self._writer.start()
+            atexit.register(self.flush)
+        print(f"Trade ledger loaded: {len(accounts)} account(s), {len(positions)} holding(s)")
+        return True
+
+    def buy(self, symbol: str, quantity: float, price: float, user_id: str = 'default_user',
+            cash: float = None) -> Dict:
+        """Same checks, effects and result as trade_executor.execute_buy, applied in memory"""
+        started = time.perf_counter()
+        with self._lock:
+            if self._refusing():
+                return {"error": NOT_PERSISTING_ERROR}
+            result, holding = self._apply_buy(symbol.upper(), quantity, price, user_id, cash)
+            if holding is None:
+                return result
+            self._record_apply(started)
+            seq = self._next_seq()
+        return self._acknowledge(seq, [result], [holding])[0]
+
+    def sell(self, symbol: str, quantity: float, price: float, user_id: str = 'default_user') -> Dict:
+        """Same checks, effects and result as trade_executor.execute_sell, applied in memory"""
+        started = time.perf_counter()
+        with self._lock:
+            if self._refusing():
+                return {"error": NOT_PERSISTING_ERROR}
+            result, holding = self._apply_sell(symbol.upper(), quantity, price, user_id)
+            if holding is None:
+                return result
+            self._record_apply(started)
+            seq = self._next_seq()
+        return self._acknowledge(seq, [result], [holding])[0]
+
+    def execute_batch(self, trades: List[Tuple[str, str, float, float]], user_id: str = 'default_user') -> Dict:
+        """Same checks, effects and result as trade_executor.execute_batch, applied in memory"""
+        started = time.perf_counter()
+        with self._lock:
+            if self._refusing():
+                return {"error": NOT_PERSISTING_ERROR}
+            # Check the whole batch against running totals first, so it applies all or nothing
+            failure = self._check_batch(trades, user_id)
+            if failure:
+                return failure
+            results, holdings = [], []
+            for side, symbol, quantity, price in trades:
+                started = time.perf_counter()
+                if side == "BUY":
+                    result, holding = self._apply_buy(symbol.upper(), quantity, price, user_id)
+                else:
+                    result, holding = self._apply_sell(symbol.upper(), quantity, price, user_id)
+                results.append(result)
+                holdings.append(holding)
+                self._record_apply(started)
+            seq = self._next_seq()
+        results = self._acknowledge(seq, results, holdings)
+        return {"success": True, "results": results, "cash_balance": results[-1]['cash_balance'] if results else None,
+                "durable": results[0]['durable'] if results else True}
+
+    def fill_orders(self, fills: List[Tuple[int, str, str, str, float, float]]) -> List[Dict]:
+        """Same checks, effects and results as trade_executor.fill_orders, applied in memory"""
+        from .trade_executor import filled_order_row
+        with self._lock:
+            if self._refusing():
+                return [{"error": NOT_PERSISTING_ERROR, "retryable": True} for _ in fills]
+            results, filled, holdings = [], [], []
+            for order_id, user_id, side, symbol, quantity, price in fills:
+                started = time.perf_counter()
+                if side == "BUY":
+                    result, holding = self._apply_buy(symbol.upper(), quantity, price, user_id)
+                else:
+                    result, holding = self._apply_sell(symbol.upper(), quantity, price, user_id)
+                results.append(result)
+                if holding is None:
+                    continue
+                # The FILLED status is flushed in the same transaction as the trade
+                self._pending_orders.append(filled_order_row(order_id, result))
+                filled.append(result)
+                holdings.append(holding)
+                self._record_apply(started)
+            if not filled:
+                return results
+            seq = self._next_seq()
+        self._acknowledge(seq, filled, holdings)
+        return results
+
+    def cash_balance(self, user_id: str) -> Optional[Account]:
+        with self._lock:
+            account = self._accounts.get(user_id)
+            return Account(account.cash_balance, account.updated_at) if account else None
+
+    def adjust_cash(self, user_id: str, amount: float, create: bool = False) -> str:
+        """
+        Add `amount` (negative to withdraw); withdrawals never overdraw, deposits may open the
+        account. CASH_PENDING means it is applied and will be written, so it must not be retried.
+        """
+        with self._lock:
+            if self._refusing():
+                return CASH_REFUSED
+            account = self._accounts.get(user_id)
+            if account is None:
+                if not create:
+                    return CASH_REFUSED
+                account = self._accounts[user_id] = Account(0.0, None)
+            if account.cash_balance + amount < 0:
+                return CASH_REFUSED
+            account.cash_balance += amount
+            account.updated_at = datetime.datetime.now()
+            self._dirty_cash.add(user_id)
+            seq = self._next_seq()
+        self._wakeup.set()
+        return CASH_PENDING if self._await_commit(seq) is False else CASH_APPLIED
+
+    def set_cash(self, user_id: str, balance: float) -> str:
+        """Same outcomes as adjust_cash"""
+        with self._lock:
+            if self._refusing():
+                return CASH_REFUSED
+            account = self._accounts.get(user_id)
+            if account is None:
+                return CASH_REFUSED
+            account.cash_balance = balance
+            account.updated_at = datetime.datetime.now()
+            self._dirty_cash.add(user_id)
+            seq = self._next_seq()
+        self._wakeup.set()
+        return CASH_PENDING if self._await_commit(seq) is False else CASH_APPLIED
+
+    def flush(self) -> int:
+        """Write everything pending in one transaction; returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                seq = self._applied_seq
+                trades, self._pending_trades = self._pending_trades, []
+                pnl, self._pending_pnl = self._pending_pnl, []
+                orders, self._pending_orders = self._pending_orders, []
+                lots, self._dirty_lots = self._dirty_lots, {}
+                holdings, self._dirty_holdings = self._dirty_holdings, set()
+                cash, self._dirty_cash = self._dirty_cash, set()
+                # Current state of every dirty key, read under the lock
+                lot_rows = [(lot.trade_id, lot.symbol, lot.quantity, lot.price, lot.opened_at)
+                            for lot in lots.values() if lot is not None]
+                closed_lots = [trade_id for trade_id, lot in lots.items() if lot is None]
+                holding_rows = [(symbol, self._positions[symbol].quantity, self._positions[symbol].average_cost)
+                                for symbol in holdings if symbol in self._positions]
+                closed_holdings = [symbol for symbol in holdings if symbol not in self._positions]
+                cash_rows = [(user_id, self._accounts[user_id].cash_balance) for user_id in cash]
+
+            rows = len(trades) + len(pnl) + len(orders) + len(lot_rows) + len(closed_lots) + len(holding_rows) + \
+                len(closed_holdings) + len(cash_rows)
+            if not rows:
+                self._mark_durable(seq, 0)
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._write(trades, pnl, orders, lot_rows, closed_lots, holding_rows, closed_holdings, cash_rows)
+            except Exception:
+                with self._lock:
+                    # Put the batch back in front of anything applied since; newer state wins
+                    self._pending_trades = trades + self._pending_trades
+                    self._pending_pnl = pnl + self._pending_pnl
+                    self._pending_orders = orders + self._pending_orders
+                    for trade_id, lot in lots.items():
+                        self._dirty_lots.setdefault(trade_id, lot)
+                    self._dirty_holdings |= holdings
+                    self._dirty_cash |= cash
+                    self._stats["flush_failures"] += 1
+                    self._flush_failing = True
+                raise
+
+            self._mark_durable(seq, rows, (time.perf_counter() - started) * 1000)
+            return rows
+
+    def stats(self) -> Dict:
+        """Ledger counters for monitoring, including group-commit batch sizes and commit latency"""
+        with self._lock:
+            trades = self._stats["trades"]
+            flushes = self._stats["flushes"]
+            batch_histogram = {}
+            for i, count in enumerate(self._batch_histogram):
+                label = f"le_{BATCH_SIZE_BUCKETS[i]}" if i < len(BATCH_SIZE_BUCKETS) else "inf"
+                batch_histogram[label] = count
+            commit_histogram = {}
+            for i, count in enumerate(self._commit_histogram):
+                label = f"le_{COMMIT_TIME_BUCKETS_MS[i]}ms" if i < len(COMMIT_TIME_BUCKETS_MS) else "inf"
+                commit_histogram[label] = count
+            return {
+                "loaded": self.loaded,
+                "accounts": len(self._accounts),
+                "holdings": len(self._positions),
+                "pending_trades": len(self._pending_trades),
+                "pending_keys": len(self._dirty_lots) + len(self._dirty_holdings) + len(self._dirty_cash),
+                "trades": trades,
+                "average_apply_us": round(self._stats["apply_us_total"] / trades, 1) if trades else None,
+                "flushes": flushes,
+                "rows_written": self._stats["rows_written"],
+                "flush_failures": self._stats["flush_failures"],
+                "last_flush_ms": self._stats["last_flush_ms"],
+                "flush_interval_ms": self.flush_interval * 1000,
+                "durable_acks": self.durable_acks,
+                "flush_failing": self._flush_failing,
+                "ack_timeouts": self._stats["ack_timeouts"],
+                "uncommitted_changes": self._applied_seq - self._durable_seq,
+                "average_batch_size": round(self._stats["changes_committed"] / flushes, 2) if flushes else None,
+                "max_batch_size": self._stats["max_batch_size"],
+                "batch_size_histogram": batch_histogram,
+                "average_commit_ms": round(self._stats["commit_ms_total"] / flushes, 2) if flushes else None,
+                "commit_time_histogram": commit_histogram
+            }
+
+    def _allocate_trade_id(self) -> int:
+        trade_id = self._next_trade_id
+        self._next_trade_id += 1
+        return trade_id
+
+    def _apply_buy(self, symbol: str, quantity: float, price: float, user_id: str,
+                   cash: float = None) -> Tuple[Dict, Optional[Tuple]]:
+        """Apply a buy (lock held); returns the result and the new holding, or an error and None"""
+        total_cost = price * quantity
+        account = self._accounts.get(user_id)
+        if account is None:
+            return {"error": "User not found"}, None
+        available = account.cash_balance if cash is None else min(account.cash_balance, cash)
+        if total_cost > available:
+            return {"error": f"Insufficient funds. Required: ${total_cost:.2f}, Available: ${available:.2f}"}, None
+
+        now = datetime.datetime.now()
+        trade_id = self._allocate_trade_id()
+        position = self._positions.get(symbol)
+        if position is None:
+            position = self._positions[symbol] = Position()
+        # Weighted average cost of the combined position
+        new_quantity = position.quantity + quantity
+        position.average_cost = (position.quantity * position.average_cost + total_cost) / new_quantity
+        position.quantity = new_quantity
+        lot = Lot(trade_id, symbol, quantity, price, now)
+        position.lots.append(lot)
+        account.cash_balance -= total_cost
+        account.updated_at = now
+
+        self._pending_trades.append((trade_id, symbol, "BUY", price, quantity, now, None))
+        self._dirty_lots[trade_id] = lot
+        self._dirty_holdings.add(symbol)
+        self._dirty_cash.add(user_id)
+        # Valued under the lock, so the live valuation sees holdings in the order trades applied
+        portfolio_valuation.apply_trade(symbol, new_quantity, position.average_cost)
+        return {
+            "success": True,
+            "trade_id": trade_id,
+            "symbol": symbol,
+            "side": "BUY",
+            "filled_price": price,
+            "filled_quantity": quantity,
+            "total_cost": total_cost,
+            "cash_balance": account.cash_balance
+        }, (new_quantity, position.average_cost, None)
+
+    def _apply_sell(self, symbol: str, quantity: float, price: float, user_id: str) -> Tuple[Dict, Optional[Tuple]]:
+        """Apply a sell against the oldest lots (lock held); returns the result and the new holding, or an error and None"""
+        proceeds = price * quantity
+        account = self._accounts.get(user_id)
+        if account is None:
+            return {"error": "User not found"}, None
+
+        position = self._positions.get(symbol)
+        holding_quantity = position.quantity if position else 0
+        if holding_quantity < quantity:
+            return {"error": f"Insufficient shares. Available: {holding_quantity}, Requested: {quantity}"}, None
+        open_quantity = sum(lot.quantity for lot in position.lots)
+        if open_quantity + QUANTITY_EPSILON < quantity:
+            return {"error": f"Insufficient shares. Available: {open_quantity}, Requested: {quantity}"}, None
+
+        # Consume the oldest open lots; what is left keeps the position's cost
+        cost_basis = 0.0
+        remaining_to_sell = quantity
+        while remaining_to_sell > 0 and position.lots:
+            lot = position.lots[0]
+            sold = min(remaining_to_sell, lot.quantity)
+            cost_basis += sold * lot.price
+            remaining_to_sell -= sold
+            lot.quantity -= sold
+            if lot.quantity < QUANTITY_EPSILON:
+                position.lots.popleft()
+                self._dirty_lots[lot.trade_id] = None
+            else:
+                self._dirty_lots[lot.trade_id] = lot
+        realized_pnl = proceeds - cost_basis
+
+        now = datetime.datetime.now()
+        trade_id = self._allocate_trade_id()
+        new_quantity = holding_quantity - quantity
+        if new_quantity <= 0:
+            for lot in position.lots:
+                self._dirty_lots[lot.trade_id] = None
+            del self._positions[symbol]
+            new_avg_cost = 0
+        else:
+            remaining_quantity = sum(lot.quantity for lot in position.lots)
+            remaining_cost = sum(lot.quantity * lot.price for lot in position.lots)
+            new_avg_cost = round(remaining_cost / remaining_quantity, 4) if remaining_quantity > 0 else 0
+            position.quantity = new_quantity
+            position.average_cost = new_avg_cost
+        account.cash_balance += proceeds
+        account.updated_at = now
+
+        self._pending_trades.append((trade_id, symbol, "SELL", price, quantity, now, realized_pnl))
+        self._pending_pnl.append((symbol, trade_id, realized_pnl, now))
+        self._dirty_holdings.add(symbol)
+        self._dirty_cash.add(user_id)
+        portfolio_valuation.apply_trade(symbol, new_quantity, new_avg_cost, realized_pnl)
+        return {
+            "success": True,
+            "trade_id": trade_id,
+            "symbol": symbol,
+            "side": "SELL",
+            "filled_price": price,
+            "filled_quantity": quantity,
+            "proceeds": proceeds,
+            "realized_pnl": round(realized_pnl, 2),
+            "cash_balance": account.cash_balance
+        }, (new_quantity, new_avg_cost, realized_pnl)
+
+    def _check_batch(self, trades: List[Tuple[str, str, float, float]], user_id: str) -> Optional[Dict]:
+        """The error and failed_index of the first trade _apply_buy/_apply_sell would reject, if any (lock held)"""
+        account = self._accounts.get(user_id)
+        if account is None:
+            return {"error": "User not found"}
+        cash = account.cash_balance
+        held, in_lots = {}, {}
+        for index, (side, symbol, quantity, price) in enumerate(trades):
+            symbol = symbol.upper()
+            if symbol not in held:
+                position = self._positions.get(symbol)
+                held[symbol] = position.quantity if position else 0
+                in_lots[symbol] = sum(lot.quantity for lot in position.lots) if position else 0
+            if side == "BUY":
+                if price * quantity > cash:
+                    error = f"Insufficient funds. Required: ${price * quantity:.2f}, Available: ${cash:.2f}"
+                    return {"error": error, "failed_index": index}
+                cash -= price * quantity
+                held[symbol] += quantity
+                in_lots[symbol] += quantity
+            else:
+                available = held[symbol] if held[symbol] < quantity else in_lots[symbol]
+                if held[symbol] < quantity or in_lots[symbol] + QUANTITY_EPSILON < quantity:
+                    error = f"Insufficient shares. Available: {available}, Requested: {quantity}"
+                    return {"error": error, "failed_index": index}
+                cash += price * quantity
+                # A sell that empties the position closes whatever lots are left
+                held[symbol] -= quantity
+                in_lots[symbol] = in_lots[symbol] - quantity if held[symbol] > 0 else 0
+                held[symbol] = max(held[symbol], 0)
+        return None
+
+    def _acknowledge(self, seq: int, results: List[Dict], holdings: List[Tuple]) -> List[Dict]:
+        """Wait for the commit holding change `seq`, then log the fills (already valued when applied)"""
+        from .trade_executor import log_fill
+        self._wakeup.set()
+        durable = self._await_commit(seq)
+        for result, holding in zip(results, holdings):
+            result["durable"] = durable
+            if durable is False:
+                result["warning"] = NOT_DURABLE_WARNING
+            log_fill(result, holding)
+        return results
+
+    def _record_apply(self, started: float):
+        self._stats["trades"] += 1
+        self._stats["apply_us_total"] += (time.perf_counter() - started) * 1e6
+
+    def _next_seq(self) -> int:
+        self._applied_seq += 1
+        return self._applied_seq
+
+    def _refusing(self) -> bool:
+        """New changes are refused while durable acks are on and the last flush failed (lock held)"""
+        return self.durable_acks and self._flush_failing
+
+    def _await_commit(self, seq: int) -> Optional[bool]:
+        """Block until the commit holding change `seq` is done; False if it timed out, None without durable acks"""
+        if not self.durable_acks:
+            return None
+        with self._durable:
+            if self._durable.wait_for(lambda: self._durable_seq >= seq, timeout=self.ack_timeout):
+                return True
+            self._stats["ack_timeouts"] += 1
+            return False
+
+    def _mark_durable(self, seq: int, rows: int, commit_ms: float = None):
+        """Changes up to `seq` are in MySQL: record the batch and wake their callers"""
+        with self._durable:
+            batch = seq - self._durable_seq
+            self._durable_seq = max(self._durable_seq, seq)
+            self._flush_failing = False
+            if rows:
+                self._stats["flushes"] += 1
+                self._stats["rows_written"] += rows
+                self._stats["changes_committed"] += batch
+                self._stats["max_batch_size"] = max(self._stats["max_batch_size"], batch)
+                self._stats["last_flush_ms"] = round(commit_ms, 2)
+                self._stats["commit_ms_total"] += commit_ms
+                self._batch_histogram[bisect.bisect_left(BATCH_SIZE_BUCKETS, batch)] += 1
+                self._commit_histogram[bisect.bisect_left(COMMIT_TIME_BUCKETS_MS, commit_ms)] += 1
+            self._durable.notify_all()
+
+    def _write(self, trades, pnl, orders, lot_rows, closed_lots, holding_rows, closed_holdings, cash_rows):
+        with db_connection() as db:
+            if not db:
+                raise RuntimeError("Database connection failed")
+            cursor = db.cursor()
+            db.start_transaction()
+            # Parents before children: trades, then the P&L rows and lots that reference them
+            if trades:
+                cursor.executemany("""
+                    INSERT INTO trades (trade_id, stock_symbol, trade_type, price_at_trade, quantity, trade_date, realized_pnl)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, trades)
+            if pnl:
+                cursor.executemany("""
+                    INSERT INTO profit_and_loss (stock_symbol, trade_id, realized_pnl, calculation_date)
+                    VALUES (%s, %s, %s, %s)
+                """, pnl)
+            if orders:
+                cursor.executemany("""
+                    UPDATE resting_orders SET status = 'FILLED', fill_price = %s, trade_id = %s, message = %s
+                    WHERE order_id = %s
+                """, orders)
+            if closed_lots:
+                placeholders = ", ".join(["%s"] * len(closed_lots))
+                cursor.execute(f"DELETE FROM open_lots WHERE trade_id IN ({placeholders})", closed_lots)
+            if lot_rows:
+                cursor.executemany("""
+                    INSERT INTO open_lots (trade_id, stock_symbol, remaining_quantity, cost_per_share, opened_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE remaining_quantity = VALUES(remaining_quantity)
+                """, lot_rows)
+            if closed_holdings:
+                placeholders = ", ".join(["%s"] * len(closed_holdings))
+                cursor.execute(f"DELETE FROM holdings WHERE stock_symbol IN ({placeholders})", closed_holdings)
+            if holding_rows:
+                cursor.executemany("""
+                    INSERT INTO holdings (stock_symbol, quantity, average_cost) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), average_cost = VALUES(average_cost)
+                """, holding_rows)
+            if cash_rows:
+                cursor.executemany("""
+                    INSERT INTO user_balance (user_id, cash_balance) VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE cash_balance = VALUES(cash_balance)
+                """, cash_rows)
+            db.commit()
+
+    def _write_loop(self):
+        backoff = self.flush_interval
+        while True:
+            self._wakeup.wait()
+            # Group commit: orders arriving within the window share one transaction
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                backoff = self.flush_interval
+            except Exception as e:
+                print(f"[XXXXXXXXX] Ledger write-behind failed, retrying in {backoff:.2f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+                self._wakeup.set()
+
+# Shared ledger behind trade_executor and the cash balance functions
+trade_ledger = TradeLedger(
+    flush_interval=float(os.getenv('LEDGER_FLUSH_MS', 50)) / 1000,
+    durable_acks=os.getenv('LEDGER_DURABLE_ACKS', 'true').lower() != 'false',
+    ack_timeout=float(os.getenv('LEDGER_ACK_TIMEOUT', 5))
+)
@@ -0,0 +1,128 @@
+from typing import Dict, List, Tuple
+
+# Quantities are DECIMAL(10, 2); differences below this are rounding, not missing lots
+QUANTITY_EPSILON = 0.005
+
+def open_lot(cursor, trade_id: int, symbol: str, quantity: float, price: float, opened_at):
+    """Record the lot created by a BUY trade"""
+    cursor.execute("""
+        INSERT INTO open_lots (trade_id, stock_symbol, remaining_quantity, cost_per_share, opened_at)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (trade_id, symbol, quantity, price, opened_at))
+
+def lot_totals(cursor, symbol: str) -> Tuple[float, float]:
+    """(open quantity, open cost) for a symbol from its open lots"""
+    cursor.execute("""
+        SELECT COALESCE(SUM(remaining_quantity), 0) AS quantity,
+               COALESCE(SUM(remaining_quantity * cost_per_share), 0) AS cost
+        FROM open_lots
+        WHERE stock_symbol = %s
+    """, (symbol,))
+    row = cursor.fetchone()
+    return float(row['quantity']), float(row['cost'])
+
+def ensure_lots(cursor, symbol: str, holding_quantity: float) -> Tuple[float, float]:
+    """
+    Make sure the open lots cover the holding, rebuilding them once from trade
+    history when they do not (trades recorded before open_lots existed).
+    Returns (open quantity, open cost).
+    """
+    quantity, cost = lot_totals(cursor, symbol)
+    if abs(quantity - holding_quantity) < QUANTITY_EPSILON:
+        return quantity, cost
+
+    print(f"Open lots for {symbol} cover {quantity} of {holding_quantity} shares; rebuilding from trade history")
+    cursor.execute("DELETE FROM open_lots WHERE stock_symbol = %s", (symbol,))
+    for lot in replay_lots(cursor, symbol):
+        open_lot(cursor, lot['trade_id'], symbol, lot['available_quantity'],
+                 lot['price_at_trade'], lot['trade_date'])
+    return lot_totals(cursor, symbol)
+
+def consume_lots(cursor, symbol: str, quantity: float) -> float:
+    """
+    Sell `quantity` shares from the oldest open lots; returns their cost basis.
+    Only the lots needed to cover the sale are read (running total over the FIFO index).
+    """
+    cursor.execute("""
+        SELECT lot_id, remaining_quantity, cost_per_share
+        FROM (
+            SELECT lot_id, remaining_quantity, cost_per_share, opened_at,
+                   SUM(remaining_quantity) OVER (ORDER BY opened_at, lot_id) - remaining_quantity AS quantity_before
+            FROM open_lots
+            WHERE stock_symbol = %s
+        ) fifo
+        WHERE quantity_before < %s
+        ORDER BY opened_at, lot_id
+    """, (symbol, quantity))
+    lots = cursor.fetchall()
+
+    cost_basis = 0.0
+    remaining_to_sell = quantity
+    closed = []
+    for lot in lots:
+        lot_quantity = float(lot['remaining_quantity'])
+        sold = min(remaining_to_sell, lot_quantity)
+        cost_basis += sold * float(lot['cost_per_share'])
+        remaining_to_sell -= sold
+        if lot_quantity - sold < QUANTITY_EPSILON:
+            closed.append(lot['lot_id'])
+        else:
+            cursor.execute("""
+                UPDATE open_lots SET remaining_quantity = %s WHERE lot_id = %s
+            """, (lot_quantity - sold, lot['lot_id']))
+
+    if closed:
+        placeholders = ", ".join(["%s"] * len(closed))
+        cursor.execute(f"DELETE FROM open_lots WHERE lot_id IN ({placeholders})", closed)
+
+    return cost_basis
+
+def get_open_lots(cursor, symbol: str) -> List[Dict]:
+    """Open lots for a symbol, oldest first, in the shape of replay_lots()"""
+    cursor.execute("""
+        SELECT trade_id, remaining_quantity, cost_per_share, opened_at
+        FROM open_lots
+        WHERE stock_symbol = %s
+        ORDER BY opened_at, lot_id
+    """, (symbol,))
+    return [
+        {
+            'trade_id': lot['trade_id'],
+            'available_quantity': float(lot['remaining_quantity']),
+            'price_at_trade': float(lot['cost_per_share']),
+            'trade_date': lot['opened_at']
+        }
+        for lot in cursor.fetchall()
+    ]
+
+def replay_lots(cursor, symbol: str) -> List[Dict]:
+    """Open BUY lots for a symbol, oldest first, by netting all SELL trades against the BUY history"""
+    cursor.execute("""
+        SELECT trade_id, quantity, price_at_trade, trade_date
+        FROM trades
+        WHERE stock_symbol = %s AND trade_type = 'BUY'
+        ORDER BY trade_date ASC, trade_id ASC
+    """, (symbol,))
+    buy_trades = cursor.fetchall()
+
+    cursor.execute("""
+        SELECT COALESCE(SUM(quantity), 0) AS total_sold
+        FROM trades
+        WHERE stock_symbol = %s AND trade_type = 'SELL'
+    """, (symbol,))
+    remaining_to_reduce = float(cursor.fetchone()['total_sold'])
+
+    lots = []
+    for trade in buy_trades:
+        buy_quantity = float(trade['quantity'])
+        if remaining_to_reduce >= buy_quantity:
+            remaining_to_reduce -= buy_quantity
+            continue
+        lots.append({
+            'trade_id': trade['trade_id'],
+            'available_quantity': buy_quantity - remaining_to_reduce,
+            'price_at_trade': float(trade['price_at_trade']),
+            'trade_date': trade['trade_date']
+        })
+        remaining_to_reduce = 0
+    return lots
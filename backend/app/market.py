@@ -1,68 +1,173 @@
+import os
 import yfinance as yf
 import pandas as pd
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import numpy as np
+from .quote_cache import QuoteCache
+from .fetch_engine import FetchEngine
 
-def get_quote(symbol: str) -> Dict:
-    """Get real-time stock quote data using yFinance"""
+# All yFinance requests share one rate limit bucket
+YAHOO_HOST = "finance.yahoo.com"
+
+# Shared engine for upstream market data calls (concurrency cap, rate limit, retries)
+fetch_engine = FetchEngine(
+    max_concurrency=int(os.getenv('YF_MAX_CONCURRENCY', 8)),
+    rate=float(os.getenv('YF_RATE_LIMIT', 5)),
+    burst=float(os.getenv('YF_RATE_BURST', 10)),
+    max_retries=int(os.getenv('YF_MAX_RETRIES', 3))
+)
+
+# Shared in-memory quote cache used by get_quote, utils.get_current_price and the price updater
+quote_cache = QuoteCache(
+    ttl=float(os.getenv('QUOTE_CACHE_TTL', 15)),
+    stale_ttl=float(os.getenv('QUOTE_CACHE_STALE_TTL', 60)),
+    max_size=int(os.getenv('QUOTE_CACHE_MAX_SIZE', 1024))
+)
+
+def get_quote(symbol: str, force_refresh: bool = False) -> Dict:
+    """Get real-time stock quote data (served from the shared quote cache)"""
+    if force_refresh:
+        return quote_cache.refresh(symbol.upper(), _fetch_quote)
+    return quote_cache.get(symbol.upper(), _fetch_quote)
+
+def get_quote_with_status(symbol: str) -> Tuple[Dict, str]:
+    """Get a quote plus how the cache served it (hit, stale, miss or coalesced)"""
+    return quote_cache.lookup(symbol.upper(), _fetch_quote)
+
+def get_quotes(symbols: List[str], force_refresh: bool = False) -> Dict[str, Dict]:
+    """Get quotes for many symbols, fetching all cache misses in one multi-ticker download"""
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols if symbol))
+    quotes = {}
+    to_fetch = []
+    
+    for symbol in symbols:
+        cached = None if force_refresh else quote_cache.get_if_fresh(symbol)
+        if cached:
+            quotes[symbol] = cached
+        else:
+            to_fetch.append(symbol)
+    
+    if to_fetch:
+        fetched = _fetch_quotes(to_fetch)
+        for symbol, quote in fetched.items():
+            quote_cache.put(symbol, quote)
+        quotes.update(fetched)
+        
+        # Symbols the batch download could not resolve fall back to the single-symbol path, in parallel
+        missing = [symbol for symbol in to_fetch if symbol not in quotes]
+        if missing:
+            fallback = fetch_engine.map(lambda symbol: get_quote(symbol, force_refresh=True), missing)
+            quotes.update({symbol: quote for symbol, quote in fallback.items() if quote})
+    
+    return quotes
+
+def fetch_many(fetcher: Callable[[str], Dict], symbols: List[str]) -> Dict[str, Dict]:
+    """Run a per-symbol market data function (get_quote, get_daily_data, ...) for many symbols in parallel"""
+    results = fetch_engine.map(fetcher, [symbol.upper() for symbol in symbols if symbol])
+    return {symbol: result or {} for symbol, result in results.items()}
+
+def _fetch_quote(symbol: str) -> Dict:
+    """Fetch real-time stock quote data upstream using yFinance"""
     print(f"Fetching quote data for {symbol} using yFinance...")
     try:
         ticker = yf.Ticker(symbol)
         
-        # Get current quote info
-        info = ticker.info
-        hist = ticker.history(period="2d")  # Get last 2 days for change calculation
-        
-        if hist.empty or len(hist) < 1:
-            print(f"No data found for symbol: {symbol}")
-            return {}
+        # The quote is derived from price history alone; ticker.info is slow and rate limited
+        hist = fetch_engine.call(ticker.history, period="2d", host=YAHOO_HOST)  # Get last 2 days for change calculation
         
-        # Get current and previous close prices
-        current_price = float(hist['Close'].iloc[-1])
-        previous_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
-        
-        # Calculate change
-        change_amount = current_price - previous_close
-        change_percent = (change_amount / previous_close * 100) if previous_close != 0 else 0
-        
-        # Get other data from the latest day
-        latest_data = hist.iloc[-1]
-        open_price = float(latest_data['Open'])
-        high_price = float(latest_data['High'])
-        low_price = float(latest_data['Low'])
-        volume = int(latest_data['Volume'])
-        
-        # Get the latest trading day
-        latest_trading_day = hist.index[-1].strftime('%Y-%m-%d')
-        
-        # Format data for API compatibility
-        result = {
-            "01. symbol": symbol.upper(),
-            "02. open": str(open_price),
-            "03. high": str(high_price),
-            "04. low": str(low_price),
-            "05. price": str(current_price),
-            "06. volume": str(volume),
-            "07. latest trading day": latest_trading_day,
-            "08. previous close": str(previous_close),
-            "09. change": str(change_amount),
-            "10. change percent": f"{change_percent:.2f}%"
-        }
-        
-        print(f"Quote data retrieved for {symbol}: ${current_price:.2f}")
+        result = _quote_from_history(symbol, hist)
+        if result:
+            print(f"Quote data retrieved for {symbol}: ${float(result['05. price']):.2f}")
         return result
         
     except Exception as e:
         print(f"Error fetching quote for {symbol}: {str(e)}")
         return {}
 
+def _fetch_quotes(symbols: List[str]) -> Dict[str, Dict]:
+    """Fetch quotes for several symbols with a single multi-ticker yFinance download"""
+    print(f"Fetching quote data for {len(symbols)} symbols using yFinance batch download...")
+    try:
+        data = fetch_engine.call(
+            yf.download,
+            symbols,
+            period="2d",
+            group_by="ticker",
+            auto_adjust=True,
+            threads=True,
+            progress=False,
+            host=YAHOO_HOST
+        )
+    except Exception as e:
+        print(f"Error fetching batch quotes: {str(e)}")
+        return {}
+    
+    if data is None or data.empty:
+        return {}
+    
+    quotes = {}
+    for symbol in symbols:
+        try:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                hist = data[symbol]
+            else:
+                hist = data
+            quote = _quote_from_history(symbol, hist.dropna(subset=['Close']))
+            if quote:
+                quotes[symbol] = quote
+        except Exception as e:
+            print(f"Error parsing batch quote for {symbol}: {str(e)}")
+    
+    print(f"Batch quote data retrieved for {len(quotes)}/{len(symbols)} symbols")
+    return quotes
+
+def _quote_from_history(symbol: str, hist: pd.DataFrame) -> Dict:
+    """Build an Alpha-Vantage-style quote from the last two daily bars"""
+    if hist.empty or len(hist) < 1:
+        print(f"No data found for symbol: {symbol}")
+        return {}
+    
+    # Get current and previous close prices
+    current_price = float(hist['Close'].iloc[-1])
+    previous_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else current_price
+    
+    # Calculate change
+    change_amount = current_price - previous_close
+    change_percent = (change_amount / previous_close * 100) if previous_close != 0 else 0
+    
+    # Get other data from the latest day
+    latest_data = hist.iloc[-1]
+    open_price = float(latest_data['Open'])
+    high_price = float(latest_data['High'])
+    low_price = float(latest_data['Low'])
+    volume = int(latest_data['Volume'])
+    
+    # Get the latest trading day
+    latest_trading_day = hist.index[-1].strftime('%Y-%m-%d')
+    
+    # Format data for API compatibility
+    return {
+        "01. symbol": symbol.upper(),
+        "02. open": str(open_price),
+        "03. high": str(high_price),
+        "04. low": str(low_price),
+        "05. price": str(current_price),
+        "06. volume": str(volume),
+        "07. latest trading day": latest_trading_day,
+        "08. previous close": str(previous_close),
+        "09. change": str(change_amount),
+        "10. change percent": f"{change_percent:.2f}%"
+    }
+
 def get_stock_overview(symbol: str) -> Dict:
     """Get essential company overview and key fundamentals using yFinance"""
     print(f"Fetching company overview for {symbol} using yFinance...")
     try:
         ticker = yf.Ticker(symbol)
-        info = ticker.info
+        info = fetch_engine.call(lambda: ticker.info, host=YAHOO_HOST)
         
         # Helper function to format large numbers
         def format_large_number(value):
@@ -181,12 +286,10 @@ def get_stock_overview(symbol: str) -> Dict:
         print(f"Error fetching overview for {symbol}: {str(e)}")
         return {}
 
-def get_intraday_data(symbol: str, interval: str = "5min") -> Dict:
-    """Get intraday stock data with specified interval using yFinance"""
+def get_intraday_data(symbol: str, interval: str = "5min", columnar: bool = False) -> Dict:
+    """Get intraday stock data with specified interval (stored bars, synced from yFinance)"""
     print(f"Fetching intraday data for {symbol} ({interval} intervals) using yFinance...")
     try:
-        ticker = yf.Ticker(symbol)
-        
         # Map interval to yFinance format
         yf_interval_map = {
             "1min": "1m",
@@ -198,36 +301,29 @@ def get_intraday_data(symbol: str, interval: str = "5min") -> Dict:
         
         yf_interval = yf_interval_map.get(interval, "5m")
         
-        # Get intraday data for the last 7 days (yFinance limit for minute data)
-        hist = ticker.history(period="7d", interval=yf_interval)
+        # Get intraday data for the last 7 days (yFinance limit for minute data) from the local bar store
+        from .history_store import get_history
+        hist = get_history(symbol, yf_interval)
         
         if hist.empty:
             print(f"No intraday data found for symbol: {symbol}")
             return {}
         
-        # Convert to API format
-        time_series = {}
-        for timestamp, row in hist.iterrows():
-            time_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            time_series[time_str] = {
-                "1. open": str(float(row['Open'])),
-                "2. high": str(float(row['High'])),
-                "3. low": str(float(row['Low'])),
-                "4. close": str(float(row['Close'])),
-                "5. volume": str(int(row['Volume']))
-            }
-        
-        result = {
-            f"Time Series ({interval})": time_series,
-            "Meta Data": {
-                "1. Information": f"Intraday ({interval}) open, high, low, close prices and volume",
-                "2. Symbol": symbol.upper(),
-                "3. Last Refreshed": hist.index[-1].strftime('%Y-%m-%d %H:%M:%S'),
-                "4. Interval": interval,
-                "5. Output Size": "Compact",
-                "6. Time Zone": "US/Eastern"
+        if columnar:
+            result = _history_to_columns(hist, '%Y-%m-%d %H:%M:%S')
+            result.update({"symbol": symbol.upper(), "interval": interval})
+        else:
+            result = {
+                f"Time Series ({interval})": _history_to_time_series(hist, '%Y-%m-%d %H:%M:%S'),
+                "Meta Data": {
+                    "1. Information": f"Intraday ({interval}) open, high, low, close prices and volume",
+                    "2. Symbol": symbol.upper(),
+                    "3. Last Refreshed": hist.index[-1].strftime('%Y-%m-%d %H:%M:%S'),
+                    "4. Interval": interval,
+                    "5. Output Size": "Compact",
+                    "6. Time Zone": "US/Eastern"
+                }
             }
-        }
         
         print(f"Intraday data retrieved for {symbol}")
         return result
@@ -236,41 +332,32 @@ def get_intraday_data(symbol: str, interval: str = "5min") -> Dict:
         print(f"Error fetching intraday data for {symbol}: {str(e)}")
         return {}
 
-def get_daily_data(symbol: str) -> Dict:
-    """Get daily stock data using yFinance"""
+def get_daily_data(symbol: str, columnar: bool = False) -> Dict:
+    """Get daily stock data (stored bars, synced from yFinance)"""
     print(f"Fetching daily data for {symbol} using yFinance...")
     try:
-        ticker = yf.Ticker(symbol)
-        
-        # Get daily data for the last year
-        hist = ticker.history(period="1y", interval="1d")
+        # Get daily data for the last year from the local bar store
+        from .history_store import get_history
+        hist = get_history(symbol, "1d")
         
         if hist.empty:
             print(f"No daily data found for symbol: {symbol}")
             return {}
         
-        # Convert to API format
-        time_series = {}
-        for date, row in hist.iterrows():
-            date_str = date.strftime('%Y-%m-%d')
-            time_series[date_str] = {
-                "1. open": str(float(row['Open'])),
-                "2. high": str(float(row['High'])),
-                "3. low": str(float(row['Low'])),
-                "4. close": str(float(row['Close'])),
-                "5. volume": str(int(row['Volume']))
-            }
-        
-        result = {
-            "Time Series (Daily)": time_series,
-            "Meta Data": {
-                "1. Information": "Daily Prices (open, high, low, close) and Volume",
-                "2. Symbol": symbol.upper(),
-                "3. Last Refreshed": hist.index[-1].strftime('%Y-%m-%d'),
-                "4. Output Size": "Compact",
-                "5. Time Zone": "US/Eastern"
+        if columnar:
+            result = _history_to_columns(hist, '%Y-%m-%d')
+            result.update({"symbol": symbol.upper(), "interval": "daily"})
+        else:
+            result = {
+                "Time Series (Daily)": _history_to_time_series(hist, '%Y-%m-%d'),
+                "Meta Data": {
+                    "1. Information": "Daily Prices (open, high, low, close) and Volume",
+                    "2. Symbol": symbol.upper(),
+                    "3. Last Refreshed": hist.index[-1].strftime('%Y-%m-%d'),
+                    "4. Output Size": "Compact",
+                    "5. Time Zone": "US/Eastern"
+                }
             }
-        }
         
         print(f"Daily data retrieved for {symbol}")
         return result
@@ -279,6 +366,39 @@ def get_daily_data(symbol: str) -> Dict:
         print(f"Error fetching daily data for {symbol}: {str(e)}")
         return {}
 
+def _history_to_time_series(hist: pd.DataFrame, time_format: str) -> Dict:
+    """Convert OHLCV bars to the Alpha-Vantage dict-of-dicts, formatting whole columns at once"""
+    timestamps = hist.index.strftime(time_format).tolist()
+    opens = list(map(str, hist['Open'].to_numpy(dtype=float).tolist()))
+    highs = list(map(str, hist['High'].to_numpy(dtype=float).tolist()))
+    lows = list(map(str, hist['Low'].to_numpy(dtype=float).tolist()))
+    closes = list(map(str, hist['Close'].to_numpy(dtype=float).tolist()))
+    volumes = list(map(str, hist['Volume'].to_numpy(dtype='int64').tolist()))
+    
+    return {
+        timestamp: {
+            "1. open": open_price,
+            "2. high": high_price,
+            "3. low": low_price,
+            "4. close": close_price,
+            "5. volume": volume
+        }
+        for timestamp, open_price, high_price, low_price, close_price, volume
+        in zip(timestamps, opens, highs, lows, closes, volumes)
+    }
+
+def _history_to_columns(hist: pd.DataFrame, time_format: str) -> Dict:
+    """Convert OHLCV bars to compact parallel arrays (the ?format=columnar response)"""
+    return {
+        "format": "columnar",
+        "last_refreshed": hist.index[-1].strftime(time_format),
+        "timestamps": hist.index.strftime(time_format).tolist(),
+        "open": hist['Open'].to_numpy(dtype=float).tolist(),
+        "high": hist['High'].to_numpy(dtype=float).tolist(),
+        "low": hist['Low'].to_numpy(dtype=float).tolist(),
+        "close": hist['Close'].to_numpy(dtype=float).tolist(),
+        "volume": hist['Volume'].to_numpy(dtype='int64').tolist()
+    }
 
 def test_api_connection() -> bool:
     """Test if yFinance is working"""
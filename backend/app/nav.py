@@ -0,0 +1,280 @@
+import datetime
+import os
+import time
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from .utils import db_connection
+from .portfolio import get_portfolio_summary
+from .ledger import trade_ledger
+from .performance import analytics_cache
+
+# Load environment variables from .env file
+load_dotenv()
+
+# End-of-day snapshots are taken once a day after this local time (HH:MM)
+NAV_EOD_TIME = os.getenv('NAV_EOD_TIME', '16:10')
+# Minutes between intraday snapshots; 0 disables them
+NAV_INTRADAY_MINUTES = float(os.getenv('NAV_INTRADAY_MINUTES', 0))
+
+SNAPSHOT_COLUMNS = ('cash_balance', 'market_value', 'cost_basis', 'realized_pnl', 'unrealized_pnl', 'nav')
+ROLLUP_PERIODS = ('WEEK', 'MONTH')
+
+def take_nav_snapshot(snapshot_type: str = 'INTRADAY', now: datetime.datetime = None) -> int:
+    """
+    Write one NAV snapshot per user (cash, market value, cost basis, realized and unrealized P&L)
+    and refresh the weekly and monthly rollups for end-of-day snapshots.
+    An EOD snapshot is keyed by its date, so re-running it the same day overwrites it.
+    Returns the number of users snapshotted.
+    """
+    now = now or datetime.datetime.now()
+    if snapshot_type == 'EOD':
+        snapshot_time = datetime.datetime.combine(now.date(), datetime.time(23, 59, 59))
+    else:
+        snapshot_time = now.replace(second=0, microsecond=0)
+
+    # Holdings are shared by every user; only the cash balance differs. Both come from memory
+    # when the ledger is loaded: the user_balance table lags it by up to one flush.
+    summary = get_portfolio_summary()
+    if 'error' in summary:
+        print(f"NAV snapshot skipped: {summary['error']}")
+        return 0
+    totals = summary['summary']
+
+    with db_connection() as db:
+        if not db:
+            print("NAV snapshot skipped: database connection failed")
+            return 0
+
+        cursor = db.cursor(dictionary=True)
+        cursor.execute("SELECT user_id, cash_balance FROM user_balance")
+        balances = cursor.fetchall()
+
+        rows = []
+        for balance in balances:
+            account = trade_ledger.cash_balance(balance['user_id']) if trade_ledger.loaded else None
+            cash = account.cash_balance if account else float(balance['cash_balance'])
+            rows.append((
+                balance['user_id'], snapshot_type, snapshot_time, cash,
+                totals['total_portfolio_value'], totals['total_cost_basis'],
+                totals['total_realized_pnl'], totals['total_unrealized_pnl'],
+                round(cash + totals['total_portfolio_value'], 2)
+            ))
+
+        cursor.executemany("""
+            INSERT INTO nav_snapshots (user_id, snapshot_type, snapshot_time, cash_balance, market_value,
+                                       cost_basis, realized_pnl, unrealized_pnl, nav)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE cash_balance = VALUES(cash_balance), market_value = VALUES(market_value),
+                                    cost_basis = VALUES(cost_basis), realized_pnl = VALUES(realized_pnl),
+                                    unrealized_pnl = VALUES(unrealized_pnl), nav = VALUES(nav)
+        """, rows)
+
+        if snapshot_type == 'EOD':
+            for balance in balances:
+                _refresh_rollups(cursor, balance['user_id'], snapshot_time.date())
+
+        db.commit()
+
+    if snapshot_type == 'EOD':
+        # Cached analytics are computed from EOD snapshots
+        for balance in balances:
+            analytics_cache.invalidate(balance['user_id'])
+
+    print(f"NAV {snapshot_type} snapshot written for {len(rows)} user(s) at {snapshot_time:%Y-%m-%d %H:%M}")
+    return len(rows)
+
+def is_trading_day(day: datetime.date) -> bool:
+    """Weekdays that are not NYSE full-day holidays (EOD snapshots are only taken on these)"""
+    return day.weekday() < 5 and day not in _market_holidays(day.year)
+
+def _market_holidays(year: int) -> set:
+    def nth_weekday(month: int, weekday: int, n: int) -> datetime.date:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+    def last_weekday(month: int, weekday: int) -> datetime.date:
+        last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+        return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+
+    def observed(day: datetime.date) -> datetime.date:
+        # Saturday holidays close the Friday before, Sunday ones the Monday after
+        if day.weekday() == 5:
+            return day - datetime.timedelta(days=1)
+        return day + datetime.timedelta(days=1) if day.weekday() == 6 else day
+
+    # Easter Sunday (anonymous Gregorian algorithm), for Good Friday
+    a, b, c = year % 19, year // 100, year % 100
+    h = (19 * a + b - b // 4 - (b - (b + 8) // 25 + 1) // 3 + 15) % 30
+    l = (32 + 2 * (b % 4) + 2 * (c // 4) - h - c % 4) % 7
+    n = h + l - 7 * ((a + 11 * h + 22 * l) // 451) + 114
+    easter = datetime.date(year, n // 31, n % 31 + 1)
+
+    holidays = {
+        nth_weekday(1, 0, 3),                       # Martin Luther King Jr. Day
+        nth_weekday(2, 0, 3),                       # Washington's Birthday
+        easter - datetime.timedelta(days=2),        # Good Friday
+        last_weekday(5, 0),                         # Memorial Day
+        observed(datetime.date(year, 7, 4)),        # Independence Day
+        nth_weekday(9, 0, 1),                       # Labor Day
+        nth_weekday(11, 3, 4),                      # Thanksgiving
+        observed(datetime.date(year, 12, 25))       # Christmas
+    }
+    # New Year's Day on a Saturday is not moved back into the previous year
+    if datetime.date(year, 1, 1).weekday() != 5:
+        holidays.add(observed(datetime.date(year, 1, 1)))
+    if year >= 2022:
+        holidays.add(observed(datetime.date(year, 6, 19)))    # Juneteenth
+    return holidays
+
+def _period_start(day: datetime.date, period: str) -> datetime.date:
+    if period == 'WEEK':
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def _refresh_rollups(cursor, user_id: str, day: datetime.date):
+    """Recompute the week and month containing `day` from that month's (at most ~31) EOD rows"""
+    # The week may start in the previous month, so read from whichever start is earlier
+    start = min(_period_start(day, 'WEEK'), _period_start(day, 'MONTH'))
+    cursor.execute(f"""
+        SELECT snapshot_time, {', '.join(SNAPSHOT_COLUMNS)}
+        FROM nav_snapshots
+        WHERE user_id = %s AND snapshot_type = 'EOD'
+        AND snapshot_time >= %s AND snapshot_time < %s
+        ORDER BY snapshot_time
+    """, (user_id, start, day + datetime.timedelta(days=1)))
+    snapshots = cursor.fetchall()
+
+    for period in ROLLUP_PERIODS:
+        period_start = _period_start(day, period)
+        in_period = [row for row in snapshots if row['snapshot_time'].date() >= period_start]
+        if not in_period:
+            continue
+
+        navs = [float(row['nav']) for row in in_period]
+        close = in_period[-1]
+        cursor.execute("""
+            INSERT INTO nav_rollups (user_id, period, period_start, open_nav, high_nav, low_nav, close_nav,
+                                     cash_balance, market_value, cost_basis, realized_pnl, unrealized_pnl, days_count)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE open_nav = VALUES(open_nav), high_nav = VALUES(high_nav),
+                                    low_nav = VALUES(low_nav), close_nav = VALUES(close_nav),
+                                    cash_balance = VALUES(cash_balance), market_value = VALUES(market_value),
+                                    cost_basis = VALUES(cost_basis), realized_pnl = VALUES(realized_pnl),
+                                    unrealized_pnl = VALUES(unrealized_pnl), days_count = VALUES(days_count)
+        """, (user_id, period, period_start, navs[0], max(navs), min(navs), navs[-1],
+              close['cash_balance'], close['market_value'], close['cost_basis'],
+              close['realized_pnl'], close['unrealized_pnl'], len(in_period)))
+
+def get_nav_history(user_id: str = 'default_user', period: str = 'DAY', start: datetime.date = None,
+                    end: datetime.date = None) -> Dict:
+    """
+    Stored NAV history for a date range as one indexed range read.
+    period: DAY (end-of-day snapshots), INTRADAY, WEEK or MONTH (rollups).
+    """
+    period = period.upper()
+    end = end or datetime.date.today()
+    start = start or end - datetime.timedelta(days=30)
+    try:
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+
+            cursor = db.cursor(dictionary=True)
+
+            if period in ROLLUP_PERIODS:
+                cursor.execute(f"""
+                    SELECT period_start, open_nav, high_nav, low_nav, close_nav, days_count,
+                           {', '.join(SNAPSHOT_COLUMNS[:-1])}
+                    FROM nav_rollups
+                    WHERE user_id = %s AND period = %s AND period_start BETWEEN %s AND %s
+                    ORDER BY period_start
+                """, (user_id, period, _period_start(start, period), end))
+                points = [
+                    {
+                        "period_start": row['period_start'].strftime('%Y-%m-%d'),
+                        "open_nav": float(row['open_nav']),
+                        "high_nav": float(row['high_nav']),
+                        "low_nav": float(row['low_nav']),
+                        "close_nav": float(row['close_nav']),
+                        "days_count": row['days_count'],
+                        **{column: float(row[column]) for column in SNAPSHOT_COLUMNS[:-1]}
+                    }
+                    for row in cursor.fetchall()
+                ]
+            else:
+                snapshot_type = 'INTRADAY' if period == 'INTRADAY' else 'EOD'
+                cursor.execute(f"""
+                    SELECT snapshot_time, {', '.join(SNAPSHOT_COLUMNS)}
+                    FROM nav_snapshots
+                    WHERE user_id = %s AND snapshot_type = %s
+                    AND snapshot_time >= %s AND snapshot_time < %s
+                    ORDER BY snapshot_time
+                """, (user_id, snapshot_type, start, end + datetime.timedelta(days=1)))
+                time_format = '%Y-%m-%d %H:%M' if snapshot_type == 'INTRADAY' else '%Y-%m-%d'
+                points = [
+                    {
+                        "time": row['snapshot_time'].strftime(time_format),
+                        **{column: float(row[column]) for column in SNAPSHOT_COLUMNS}
+                    }
+                    for row in cursor.fetchall()
+                ]
+
+            return {
+                "user_id": user_id,
+                "period": period,
+                "start": start.strftime('%Y-%m-%d'),
+                "end": end.strftime('%Y-%m-%d'),
+                "points": points
+            }
+
+    except Exception as e:
+        print(f"Error getting NAV history: {e}")
+        return {"error": str(e)}
+
+def _last_eod_date() -> Optional[datetime.date]:
+    with db_connection() as db:
+        if not db:
+            return None
+        cursor = db.cursor()
+        cursor.execute("SELECT MAX(snapshot_time) FROM nav_snapshots WHERE snapshot_type = 'EOD'")
+        last = cursor.fetchone()[0]
+        return last.date() if last else None
+
+def start_background_nav_snapshots():
+    """Start background thread that writes the daily (and optional intraday) NAV snapshots"""
+    eod_hour, eod_minute = (int(part) for part in NAV_EOD_TIME.split(':'))
+
+    def nav_snapshot_loop():
+        print(f"Background NAV snapshots started (EOD after {NAV_EOD_TIME}"
+              f"{f', intraday every {NAV_INTRADAY_MINUTES:g} minute(s)' if NAV_INTRADAY_MINUTES else ''})")
+        last_eod = _last_eod_date()
+        last_intraday = 0.0
+
+        while True:
+            try:
+                now = datetime.datetime.now()
+                if not is_trading_day(now.date()):
+                    # No EOD rows for weekends and holidays: they would count as flat days in the
+                    # rollups and the return series
+                    time.sleep(30)
+                    continue
+
+                # Also catches up today's snapshot after a restart past the EOD time
+                if last_eod != now.date() and (now.hour, now.minute) >= (eod_hour, eod_minute):
+                    take_nav_snapshot('EOD', now)
+                    last_eod = now.date()
+
+                if NAV_INTRADAY_MINUTES and time.monotonic() - last_intraday >= NAV_INTRADAY_MINUTES * 60:
+                    take_nav_snapshot('INTRADAY', now)
+                    last_intraday = time.monotonic()
+
+                time.sleep(30)
+
+            except Exception as e:
+                print(f"[XXXXXXXXX] Error in NAV snapshot loop: {e}")
+                time.sleep(60)
+
+    snapshot_thread = threading.Thread(target=nav_snapshot_loop, daemon=True)
+    snapshot_thread.start()
+    return snapshot_thread
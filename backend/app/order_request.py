@@ -1,8 +1,12 @@
 from enum import Enum
 from dataclasses import dataclass
+from typing import Optional
 
 class OrderType(Enum):
     MARKET = "MARKET"
+    LIMIT = "LIMIT"
+    STOP = "STOP"
+    STOP_LIMIT = "STOP_LIMIT"
 
 class OrderSide(Enum):
     BUY = "BUY"
@@ -10,18 +14,22 @@ class OrderSide(Enum):
 
 class OrderStatus(Enum):
     PENDING = "PENDING"
+    TRIGGERED = "TRIGGERED"
     FILLED = "FILLED"
+    REJECTED = "REJECTED"
     CANCELLED = "CANCELLED"
     EXPIRED = "EXPIRED"
 
 @dataclass
 class OrderRequest:
-    """Simplified order request for market orders only"""
+    """Order request: market orders execute immediately, limit/stop orders rest until triggered"""
     symbol: str
     side: OrderSide
     quantity: int
     order_type: OrderType = OrderType.MARKET
     user_id: str = 'default_user'
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
 
     def __post_init__(self):
         """Validate order parameters"""
@@ -29,6 +37,13 @@ class OrderRequest:
         
         if self.quantity <= 0:
             raise ValueError("Quantity must be positive")
+        
+        if self.order_type in (OrderType.LIMIT, OrderType.STOP_LIMIT):
+            if self.limit_price is None or self.limit_price <= 0:
+                raise ValueError(f"{self.order_type.value} orders need a positive limit_price")
+        if self.order_type in (OrderType.STOP, OrderType.STOP_LIMIT):
+            if self.stop_price is None or self.stop_price <= 0:
+                raise ValueError(f"{self.order_type.value} orders need a positive stop_price")
 
     def to_dict(self):
         """Convert to dictionary for database storage"""
@@ -37,7 +52,9 @@ class OrderRequest:
             'stock_symbol': self.symbol,
             'order_type': self.order_type.value,
             'side': self.side.value,
-            'quantity': self.quantity
+            'quantity': self.quantity,
+            'limit_price': self.limit_price,
+            'stop_price': self.stop_price
         }
 
     def __repr__(self):
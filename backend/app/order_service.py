@@ -1,29 +1,438 @@
-import time
+import datetime
+import heapq
+import itertools
+import os
+import queue
 import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from .order_request import OrderRequest, OrderType, OrderSide, OrderStatus
+from .trade_executor import fill_orders
+from .utils import db_connection
+
+# Books holding this many cancelled entries (and more cancelled than live) are compacted
+COMPACT_THRESHOLD = 64
+# Most triggered orders the worker fills in one transaction
+MAX_FILL_BATCH = 500
+
+def _ids(orders) -> str:
+    return ", ".join(str(order.order_id) for order in orders)
+
+class RestingOrder:
+    __slots__ = ('order_id', 'user_id', 'symbol', 'side', 'order_type', 'quantity',
+                 'limit_price', 'stop_price', 'activated', 'created_at')
+
+    def __init__(self, order_id: int, user_id: str, symbol: str, side: OrderSide, order_type: OrderType,
+                 quantity: int, limit_price: Optional[float], stop_price: Optional[float],
+                 activated: bool = False, created_at: datetime.datetime = None):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.activated = activated    # a STOP_LIMIT whose stop has fired now rests as a limit
+        self.created_at = created_at
+
+    def placement(self) -> Tuple[bool, float]:
+        """(fires on a falling price?, trigger price) for where the order currently rests"""
+        if self.order_type == OrderType.LIMIT or self.activated:
+            return self.side == OrderSide.BUY, self.limit_price
+        return self.side == OrderSide.SELL, self.stop_price
+
+    def to_dict(self) -> Dict:
+        return {
+            "order_id": self.order_id,
+            "user_id": self.user_id,
+            "symbol": self.symbol,
+            "side": self.side.value,
+            "order_type": self.order_type.value,
+            "quantity": self.quantity,
+            "limit_price": self.limit_price,
+            "stop_price": self.stop_price,
+            "status": OrderStatus.TRIGGERED.value if self.activated else OrderStatus.PENDING.value,
+            "created_at": self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None
+        }
+
+class _SymbolBook:
+    __slots__ = ('falling', 'rising', 'live', 'stale')
+
+    def __init__(self):
+        self.falling = []   # max-heap of (-trigger, seq, order_id): fires once price <= trigger
+        self.rising = []    # min-heap of (trigger, seq, order_id): fires once price >= trigger
+        self.live = 0
+        self.stale = 0      # entries of cancelled orders, dropped when popped or compacted
+
+class TriggerIndex:
+    """
+    Resting orders per symbol in two heaps keyed by trigger price: buy limits and sell
+    stops fire when the price falls to their trigger, sell limits and buy stops when it
+    rises to it. A price update pops only the orders it triggers, O(k log n) for k of n
+    resting orders, earliest first at each price. Cancellations are dropped lazily.
+    Not thread-safe: the owner serializes access.
+    """
+
+    def __init__(self):
+        self._orders = {}     # order_id -> RestingOrder
+        self._books = {}      # symbol -> _SymbolBook
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def get(self, order_id: int) -> Optional[RestingOrder]:
+        return self._orders.get(order_id)
+
+    def orders(self, user_id: str = None, symbol: str = None) -> List[RestingOrder]:
+        return [order for order in self._orders.values()
+                if (user_id is None or order.user_id == user_id) and (symbol is None or order.symbol == symbol)]
+
+    def symbols(self) -> List[str]:
+        return [symbol for symbol, book in self._books.items() if book.live]
+
+    def add(self, order: RestingOrder):
+        self._orders[order.order_id] = order
+        book = self._books.get(order.symbol)
+        if book is None:
+            book = self._books[order.symbol] = _SymbolBook()
+        book.live += 1
+        self._push(book, order)
+
+    def remove(self, order_id: int) -> Optional[RestingOrder]:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        book = self._books[order.symbol]
+        book.live -= 1
+        book.stale += 1
+        if book.stale > COMPACT_THRESHOLD and book.stale > book.live:
+            self._compact(order.symbol, book)
+        return order
+
+    def trigger(self, symbol: str, price: float) -> Tuple[List[RestingOrder], List[RestingOrder]]:
+        """
+        Take the orders `price` triggers out of the index. Returns (orders to fill now,
+        stop-limits whose stop fired); an activated stop-limit whose limit is not yet
+        reached goes back in as a limit order.
+        """
+        book = self._books.get(symbol)
+        if book is None:
+            return [], []
+
+        popped = []
+        while book.falling and -book.falling[0][0] >= price:
+            popped.append(heapq.heappop(book.falling)[2])
+        while book.rising and book.rising[0][0] <= price:
+            popped.append(heapq.heappop(book.rising)[2])
+
+        fills, activated = [], []
+        for order_id in popped:
+            order = self._orders.get(order_id)
+            if order is None:
+                book.stale -= 1
+                continue
+            if order.order_type == OrderType.STOP_LIMIT and not order.activated:
+                order.activated = True
+                activated.append(order)
+                falling, limit = order.placement()
+                if not (price <= limit if falling else price >= limit):
+                    self._push(book, order)
+                    continue
+            del self._orders[order_id]
+            book.live -= 1
+            fills.append(order)
+
+        if not book.live and not book.falling and not book.rising:
+            del self._books[symbol]
+        return fills, activated
+
+    def _push(self, book: _SymbolBook, order: RestingOrder):
+        falling, trigger = order.placement()
+        if falling:
+            heapq.heappush(book.falling, (-trigger, next(self._seq), order.order_id))
+        else:
+            heapq.heappush(book.rising, (trigger, next(self._seq), order.order_id))
+
+    def _compact(self, symbol: str, book: _SymbolBook):
+        book.falling = [entry for entry in book.falling if entry[2] in self._orders]
+        book.rising = [entry for entry in book.rising if entry[2] in self._orders]
+        heapq.heapify(book.falling)
+        heapq.heapify(book.rising)
+        book.stale = 0
+        if not book.live:
+            del self._books[symbol]
 
 class OrderExecutionService:
-    """Background service (disabled since we only support market orders that execute immediately)"""
-    
-    def __init__(self, check_interval=30):
-        self.check_interval = check_interval
+    """
+    Resting LIMIT, STOP and STOP_LIMIT orders. They are stored in resting_orders and
+    indexed in memory by trigger price; every cached price update is checked against
+    the index, and the orders it triggers are filled at that price by a background
+    worker, so price updates never wait on trades. A fill and its FILLED status commit
+    together, so after a crash an order is either filled or still open, never both.
+    """
+
+    def __init__(self, max_price_age: float = 30):
+        # A new order is checked against the last cached price only if it is at most this many
+        # seconds old; otherwise it waits for the next update (the price updater runs every ~18s)
+        self.max_price_age = max_price_age
+
         self.running = False
         self.thread = None
-    
+        self._lock = threading.Lock()
+        self._index = TriggerIndex()
+        self._last_prices = {}    # symbol -> (last cached price, monotonic time), to fill orders marketable on arrival
+        self._queue = queue.Queue()
+        self._stats = {"placed": 0, "cancelled": 0, "triggered": 0, "filled": 0, "rejected": 0,
+                       "price_checks": 0, "check_us_total": 0.0}
+
     def start(self):
-        """Start the background order execution service (no-op since market orders execute immediately)"""
-        print("Order execution service started (no-op for market orders)")
-    
+        """Reload open orders from the database and start the execution worker"""
+        if self.running:
+            return
+        loaded = self._load()
+        self.running = True
+        self.thread = threading.Thread(target=self._run_service, daemon=True, name="order-executor")
+        self.thread.start()
+        print(f"Order execution service started ({loaded} resting order(s))")
+
     def stop(self):
-        """Stop the background order execution service"""
+        """Stop the execution worker (resting orders stay in the database)"""
         self.running = False
+        self._queue.put(None)
         print("Order execution service stopped")
-    
+
+    def place(self, order_request: OrderRequest) -> Dict:
+        """Store a limit/stop order and index it; it fills once a price update triggers it"""
+        if not self.running:
+            return {"error": "Order execution service is not running"}
+
+        created_at = datetime.datetime.now()
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO resting_orders (user_id, stock_symbol, side, order_type, quantity, limit_price, stop_price, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (order_request.user_id, order_request.symbol, order_request.side.value, order_request.order_type.value,
+                  order_request.quantity, order_request.limit_price, order_request.stop_price, created_at))
+            order_id = cursor.lastrowid
+            db.commit()
+
+        order = RestingOrder(order_id, order_request.user_id, order_request.symbol, order_request.side,
+                             order_request.order_type, order_request.quantity, order_request.limit_price,
+                             order_request.stop_price, created_at=created_at)
+        with self._lock:
+            self._index.add(order)
+            self._stats["placed"] += 1
+            # Already marketable at a recent price: trigger now rather than on the next update.
+            # An older one (market closed, symbol not watched) could fill far from the market.
+            last = self._last_prices.get(order.symbol)
+            if last is not None and time.monotonic() - last[1] <= self.max_price_age:
+                self._trigger(order.symbol, last[0])
+
+        return {
+            "success": True,
+            "message": f"{order.order_type.value} {order.side.value} order for {order.quantity} shares of {order.symbol} accepted",
+            "order": order.to_dict()
+        }
+
+    def cancel(self, order_id: int, user_id: str = 'default_user') -> Dict:
+        """Cancel an open order (it is no longer open once triggered for filling)"""
+        with self._lock:
+            order = self._index.get(order_id)
+            if order is None or order.user_id != user_id:
+                return {"error": f"Order {order_id} not found or no longer open"}
+            self._index.remove(order_id)
+            self._stats["cancelled"] += 1
+        self._update(order_id, OrderStatus.CANCELLED)
+        return {"success": True, "message": f"Order {order_id} cancelled", "order_id": order_id}
+
+    def list_orders(self, user_id: str = None, symbol: str = None) -> List[Dict]:
+        """Open orders, oldest first"""
+        with self._lock:
+            orders = self._index.orders(user_id, symbol.upper() if symbol else None)
+        return [order.to_dict() for order in sorted(orders, key=lambda order: order.order_id)]
+
+    def symbols(self) -> List[str]:
+        """Symbols with open orders (the price updater keeps these fresh)"""
+        with self._lock:
+            return self._index.symbols()
+
+    def on_prices(self, prices: Dict[str, float]):
+        """New prices were cached: queue every open order they trigger"""
+        started = time.perf_counter()
+        with self._lock:
+            cached_at = time.monotonic()
+            for symbol, price in prices.items():
+                symbol = symbol.upper()
+                price = float(price)
+                self._last_prices[symbol] = (price, cached_at)
+                self._trigger(symbol, price)
+            self._stats["price_checks"] += len(prices)
+            self._stats["check_us_total"] += (time.perf_counter() - started) * 1e6
+
+    def _trigger(self, symbol: str, price: float):
+        """Queue the orders `price` triggers for the worker (lock held)"""
+        fills, activated = self._index.trigger(symbol, price)
+        for order in activated:
+            self._queue.put(("activate", order, price))
+        for order in fills:
+            self._queue.put(("fill", order, price))
+        self._stats["triggered"] += len(fills)
+
+    def stats(self) -> Dict:
+        """Engine counters for monitoring"""
+        with self._lock:
+            checks = self._stats["price_checks"]
+            return {
+                "running": self.running,
+                "resting_orders": len(self._index),
+                "symbols": len(self._index.symbols()),
+                "queued": self._queue.qsize(),
+                "placed": self._stats["placed"],
+                "cancelled": self._stats["cancelled"],
+                "triggered": self._stats["triggered"],
+                "filled": self._stats["filled"],
+                "rejected": self._stats["rejected"],
+                "price_checks": checks,
+                "average_check_us": round(self._stats["check_us_total"] / checks, 2) if checks else None
+            }
+
     def _run_service(self):
-        """Main service loop (disabled)"""
-        pass
+        """
+        Take everything queued (up to MAX_FILL_BATCH) and fill it together, in trigger
+        order: one transaction and one commit wait for the whole batch, not per order.
+        """
+        while self.running:
+            items = [self._queue.get()]
+            while items[-1] is not None and len(items) < MAX_FILL_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = items[-1] is None
+            items = [item for item in items if item is not None]
+
+            activated = [order for action, order, _ in items if action == "activate"]
+            if activated:
+                try:
+                    self._update_many([(order.order_id, OrderStatus.TRIGGERED, None, None, None) for order in activated])
+                except Exception as e:
+                    # Still in the index as limits; only a restart before they fill re-arms their stops
+                    print(f"[XXXXXXXXX] Error marking stop-limits {_ids(activated)} triggered: {e}")
+
+            fills = [(order, price) for action, order, price in items if action == "fill"]
+            if fills:
+                try:
+                    self._execute(fills)
+                except Exception as e:
+                    # fill_orders failed before committing: the orders are still open in MySQL,
+                    # so rest them again and let the next price update retry
+                    print(f"[XXXXXXXXX] Error executing resting orders {_ids(order for order, _ in fills)}: {e}")
+                    self._restore([order for order, _ in fills])
+            if stopping:
+                break
+
+    def _execute(self, fills: List[Tuple[RestingOrder, float]]):
+        # Each trade also marks its order FILLED, in the same transaction
+        results = fill_orders([(order.order_id, order.user_id, order.side.value, order.symbol, order.quantity, price)
+                               for order, price in fills])
+
+        filled, rejected, retry = 0, [], []
+        for (order, price), result in zip(fills, results):
+            if result.get('success'):
+                filled += 1
+                print(f"Resting order {order.order_id} filled: {order.side.value} {order.quantity} {order.symbol} at ${price:.2f}")
+            elif result.get('retryable'):
+                # The database, not the account, refused it: keep it open for the next price update
+                retry.append(order)
+                print(f"Resting order {order.order_id} not filled at ${price:.2f}, will retry: {result.get('error')}")
+            else:
+                rejected.append((order, price, result.get('error')))
+                print(f"Resting order {order.order_id} rejected at ${price:.2f}: {result.get('error')}")
+
+        marked = not rejected
+        if rejected:
+            try:
+                marked = self._update_many([(order.order_id, OrderStatus.REJECTED, price, None, error)
+                                            for order, price, error in rejected])
+            except Exception as e:
+                print(f"[XXXXXXXXX] Error marking resting orders {_ids(order for order, _, _ in rejected)} rejected: {e}")
+            if not marked:
+                # Still open in MySQL: keep them resting so memory and the table agree
+                self._restore([order for order, _, _ in rejected])
+        if retry:
+            self._restore(retry)
+        with self._lock:
+            self._stats["filled"] += filled
+            self._stats["rejected"] += len(rejected) if marked else 0
+
+    def _restore(self, orders: List[RestingOrder]):
+        """Put orders taken out by a price update back in the index"""
+        with self._lock:
+            for order in orders:
+                if self._index.get(order.order_id) is None:
+                    self._index.add(order)
+
+    def _update(self, order_id: int, status: OrderStatus, fill_price: float = None,
+                trade_id: int = None, message: str = None):
+        self._update_many([(order_id, status, fill_price, trade_id, message)])
+
+    def _update_many(self, updates: List[Tuple[int, OrderStatus, Optional[float], Optional[int], Optional[str]]]) -> bool:
+        """Apply (order_id, status, fill_price, trade_id, message) updates in one transaction; False if not written"""
+        with db_connection() as db:
+            if not db:
+                print(f"Database connection failed; order(s) {', '.join(str(update[0]) for update in updates)} "
+                      f"not marked {updates[0][1].value}")
+                return False
+            cursor = db.cursor()
+            cursor.executemany("""
+                UPDATE resting_orders
+                SET status = %s, fill_price = COALESCE(%s, fill_price), trade_id = COALESCE(%s, trade_id),
+                    message = COALESCE(%s, message)
+                WHERE order_id = %s
+            """, [(status.value, fill_price, trade_id, message[:255] if message else None, order_id)
+                  for order_id, status, fill_price, trade_id, message in updates])
+            db.commit()
+        return True
+
+    def _load(self) -> int:
+        try:
+            with db_connection() as db:
+                if not db:
+                    return 0
+                cursor = db.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT order_id, user_id, stock_symbol, side, order_type, quantity,
+                           limit_price, stop_price, status, created_at
+                    FROM resting_orders
+                    WHERE status IN ('PENDING', 'TRIGGERED')
+                    ORDER BY order_id
+                """)
+                rows = cursor.fetchall()
+        except Exception as e:
+            print(f"Error loading resting orders: {e}")
+            return 0
+
+        with self._lock:
+            for row in rows:
+                order_type = OrderType(row['order_type'])
+                self._index.add(RestingOrder(
+                    row['order_id'], row['user_id'], row['stock_symbol'], OrderSide(row['side']), order_type,
+                    int(row['quantity']),
+                    float(row['limit_price']) if row['limit_price'] is not None else None,
+                    float(row['stop_price']) if row['stop_price'] is not None else None,
+                    # TRIGGERED is only recorded for stop-limits whose stop fired: they rest as limits
+                    activated=row['status'] == OrderStatus.TRIGGERED.value,
+                    created_at=row['created_at']
+                ))
+        return len(rows)
 
 # Global service instance
-order_service = OrderExecutionService()
+order_service = OrderExecutionService(max_price_age=float(os.getenv('ORDER_PRICE_MAX_AGE', 30)))
 
 def start_order_service():
     """Start the order execution service"""
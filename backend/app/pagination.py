@@ -0,0 +1,32 @@
+import base64
+import datetime
+from typing import List, Tuple
+
+# Keyset ("seek") pagination over trades ordered by (trade_date, trade_id) descending.
+# The cursor names the last trade of the previous page, so each page is an index range
+# scan from that point instead of an OFFSET that rescans every earlier row.
+
+# Appended to a WHERE clause on `trades t`; parameters come from keyset_params()
+KEYSET_FILTER = " AND (t.trade_date < %s OR (t.trade_date = %s AND t.trade_id < %s))"
+
+def encode_trade_cursor(trade_date: datetime.datetime, trade_id: int) -> str:
+    """Opaque cursor pointing just past the given trade"""
+    return base64.urlsafe_b64encode(f"{trade_date.isoformat()}|{trade_id}".encode()).decode()
+
+def decode_trade_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """(trade_date, trade_id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        trade_date, trade_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(trade_date), int(trade_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_params(after: Tuple[datetime.datetime, int]) -> List:
+    return [after[0], after[0], after[1]]
+
+def next_cursor(rows: List, limit: int) -> str:
+    """Cursor for the page after `rows`, fetched with LIMIT limit + 1 (None on the last page)"""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_trade_cursor(last['trade_date'], last['trade_id'])
@@ -0,0 +1,259 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+import numpy as np
+from dotenv import load_dotenv
+from .utils import db_connection
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Annual risk-free rate used by Sharpe and Sortino (0.04 = 4%)
+RISK_FREE_RATE = float(os.getenv('PERFORMANCE_RISK_FREE_RATE', 0))
+# Price-history results are cached this long; NAV results until the next snapshot
+PRICE_ANALYTICS_TTL = float(os.getenv('PERFORMANCE_PRICE_TTL', 3600))
+DEFAULT_ROLLING_WINDOW = 21
+
+class AnalyticsCache:
+    """
+    Small LRU of computed analytics keyed by (owner, range, options).
+    NAV entries stay until invalidate(owner) is called when a new snapshot is written;
+    entries stored with a ttl expire on their own.
+    """
+
+    def __init__(self, max_size: int = 256):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Dict, ttl: float = None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, owner: str = None):
+        """Drop every entry for one owner (the first element of the key), or everything"""
+        with self._lock:
+            for key in [key for key in self._entries if owner is None or key[0] == owner]:
+                del self._entries[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+analytics_cache = AnalyticsCache()
+
+def compute_metrics(dates: np.ndarray, values: np.ndarray, flows: np.ndarray = None,
+                    risk_free_rate: float = 0.0, rolling_window: int = DEFAULT_ROLLING_WINDOW,
+                    periods_per_year: float = None) -> Dict:
+    """
+    Return and risk statistics of a value series, all as vectorized array operations.
+    dates: datetime64 per point (datetime64[D] for daily data); values: portfolio value
+    (or price) per point; flows: external cash added (+) or withdrawn (-) on each date,
+    already included in that date's value (None for a price series). periods_per_year
+    overrides the rate derived from the calendar span (e.g. for intraday bars).
+    Returns are fractions (0.05 = 5%).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flows = np.zeros_like(values) if flows is None else np.asarray(flows, dtype=np.float64)
+    if len(values) < 2:
+        return {"error": "At least two data points are required"}
+
+    # Time-weighted: chain the period returns with each day's flow taken out
+    previous = values[:-1]
+    returns = np.where(previous > 0, (values[1:] - flows[1:]) / np.where(previous > 0, previous, 1) - 1, 0.0)
+    wealth = np.concatenate(([1.0], np.cumprod(1 + returns)))
+    total_return = wealth[-1] - 1
+
+    if periods_per_year is None:
+        years = (dates[-1] - dates[0]) / np.timedelta64(1, 'D') / 365.25
+        periods_per_year = len(returns) / years if years > 0 else 252.0
+    else:
+        years = len(returns) / periods_per_year
+    annualized_return = wealth[-1] ** (1 / years) - 1 if years > 0 and wealth[-1] > 0 else None
+
+    # Risk: annualized volatility, Sharpe and Sortino on per-period returns
+    excess = returns - risk_free_rate / periods_per_year
+    volatility = returns.std(ddof=1) * np.sqrt(periods_per_year) if len(returns) > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2)) * np.sqrt(periods_per_year)
+    mean_excess = excess.mean() * periods_per_year
+    sharpe = mean_excess / volatility if volatility > 0 else None
+    sortino = mean_excess / downside if downside > 0 else None
+
+    # Drawdown on the time-weighted wealth index
+    peaks = np.maximum.accumulate(wealth)
+    drawdowns = wealth / peaks - 1
+    trough = int(np.argmin(drawdowns))
+    peak = int(np.argmax(wealth[:trough + 1]))
+
+    window = max(1, min(int(rolling_window), len(wealth) - 1))
+    rolling = wealth[window:] / wealth[:-window] - 1
+
+    return {
+        "points": len(values),
+        "start_value": round(float(values[0]), 2),
+        "end_value": round(float(values[-1]), 2),
+        "net_flows": round(float(flows[1:].sum()), 2),
+        "total_return": _fraction(total_return),
+        "annualized_return": _fraction(annualized_return),
+        "money_weighted_return": _fraction(money_weighted_return(dates, values, flows)),
+        "volatility": _fraction(volatility),
+        "sharpe_ratio": _fraction(sharpe),
+        "sortino_ratio": _fraction(sortino),
+        "max_drawdown": _fraction(drawdowns[trough]),
+        "max_drawdown_peak": str(dates[peak]),
+        "max_drawdown_trough": str(dates[trough]),
+        "rolling_window": window,
+        "rolling_returns": {
+            "dates": np.datetime_as_string(dates[window:]).tolist(),
+            "returns": np.round(rolling, 6).tolist()
+        }
+    }
+
+def money_weighted_return(dates: np.ndarray, values: np.ndarray, flows: np.ndarray) -> Optional[float]:
+    """
+    Annualized internal rate of return: the starting value and every flow invested, the
+    ending value received. Newton's method on the vectorized NPV, bisection if it diverges.
+    """
+    years = (dates - dates[0]) / np.timedelta64(1, 'D') / 365.25
+    if years[-1] <= 0:
+        return None
+    # Investor's view: money in is negative, the final value is a payout
+    cash = -flows.copy()
+    cash[0] = -values[0]
+    cash[-1] += values[-1]
+    if not (cash < 0).any() or not (cash > 0).any():
+        return None
+
+    def npv(rate):
+        return np.sum(cash * (1 + rate) ** -years)
+
+    rate = 0.1
+    for _ in range(50):
+        discount = (1 + rate) ** -years
+        value = np.sum(cash * discount)
+        slope = np.sum(-years * cash * discount / (1 + rate))
+        if slope == 0:
+            break
+        step = value / slope
+        rate -= step
+        if rate <= -0.9999 or not np.isfinite(rate):
+            break
+        if abs(step) < 1e-10:
+            return float(rate)
+
+    low, high = -0.9999, 10.0
+    if npv(low) * npv(high) > 0:
+        return None
+    for _ in range(200):
+        middle = (low + high) / 2
+        if npv(low) * npv(middle) <= 0:
+            high = middle
+        else:
+            low = middle
+        if high - low < 1e-10:
+            break
+    return float((low + high) / 2)
+
+def _fraction(value) -> Optional[float]:
+    return round(float(value), 6) if value is not None and np.isfinite(value) else None
+
+def get_performance_analytics(user_id: str = 'default_user', start: datetime.date = None,
+                              end: datetime.date = None, symbol: str = None,
+                              rolling_window: int = DEFAULT_ROLLING_WINDOW) -> Dict:
+    """
+    Performance analytics from stored end-of-day NAV snapshots, or from the stored daily
+    closes of `symbol` when one is given. Results are cached per (user or symbol, range).
+    """
+    end = end or datetime.date.today()
+    start = start or end - datetime.timedelta(days=365)
+    owner = f"symbol:{symbol.upper()}" if symbol else user_id
+    key = (owner, start, end, rolling_window, RISK_FREE_RATE)
+
+    cached = analytics_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        started = time.perf_counter()
+        series = _price_series(symbol, start, end) if symbol else _nav_series(user_id, start, end)
+        if 'error' in series:
+            return series
+
+        metrics = compute_metrics(series['dates'], series['values'], series.get('flows'),
+                                  RISK_FREE_RATE, rolling_window)
+        if 'error' in metrics:
+            return metrics
+
+        result = {
+            **({"symbol": symbol.upper()} if symbol else {"user_id": user_id}),
+            "source": "price_history" if symbol else "nav_snapshots",
+            "start": start.strftime('%Y-%m-%d'),
+            "end": end.strftime('%Y-%m-%d'),
+            "risk_free_rate": RISK_FREE_RATE,
+            **metrics,
+            "computed_in_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        analytics_cache.put(key, result, ttl=PRICE_ANALYTICS_TTL if symbol else None)
+        return result
+
+    except Exception as e:
+        print(f"Error computing performance analytics: {e}")
+        return {"error": str(e)}
+
+def _nav_series(user_id: str, start: datetime.date, end: datetime.date) -> Dict:
+    """EOD NAV and external flows; a flow is the change in contributed capital (cash + cost basis - realized P&L)"""
+    with db_connection() as db:
+        if not db:
+            return {"error": "Database connection failed"}
+
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT DATE(snapshot_time), CAST(nav AS DOUBLE),
+                   CAST(cash_balance + cost_basis - realized_pnl AS DOUBLE)
+            FROM nav_snapshots
+            WHERE user_id = %s AND snapshot_type = 'EOD'
+            AND snapshot_time >= %s AND snapshot_time < %s
+            ORDER BY snapshot_time
+        """, (user_id, start, end + datetime.timedelta(days=1)))
+        rows = cursor.fetchall()
+
+    if len(rows) < 2:
+        return {"error": "Not enough NAV snapshots in range"}
+
+    dates, nav, contributed = zip(*rows)
+    contributed = np.array(contributed, dtype=np.float64)
+    return {
+        "dates": np.array(dates, dtype='datetime64[D]'),
+        "values": np.array(nav, dtype=np.float64),
+        "flows": np.concatenate(([0.0], np.diff(contributed)))
+    }
+
+def _price_series(symbol: str, start: datetime.date, end: datetime.date) -> Dict:
+    from .history_store import load_history
+    hist = load_history(symbol, "1d", start=start, end=end + datetime.timedelta(days=1))
+    if hist is None:
+        return {"error": "Database connection failed"}
+    if len(hist) < 2:
+        return {"error": f"Not enough stored daily history for {symbol.upper()}"}
+    return {
+        "dates": hist.index.values.astype('datetime64[D]'),
+        "values": hist['Close'].to_numpy(dtype=np.float64)
+    }
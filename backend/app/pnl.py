@@ -1,229 +1,218 @@
 import mysql.connector
 import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from .utils import get_db_connection
+from .utils import db_connection
+from .valuation import portfolio_valuation
+from .pnl_kernels import cents, holding_columns, value_holdings
+from .pagination import KEYSET_FILTER, decode_trade_cursor, keyset_params, next_cursor
+
+# Realized trade detail is paginated so the response stays bounded however long the history
+REALIZED_PAGE_SIZE = 50
+MAX_REALIZED_PAGE_SIZE = 500
 
 # Load environment variables from .env file
 load_dotenv()
 
 def record_realized_pnl(stock_symbol: str, trade_id: int, realized_pnl: float) -> bool:
     """Record realized P&L in the profit_and_loss table"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return False
-        
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO profit_and_loss (stock_symbol, trade_id, realized_pnl, calculation_date)
-            VALUES (%s, %s, %s, %s)
-        """, (stock_symbol.upper(), trade_id, realized_pnl, datetime.datetime.now()))
-        
-        db.commit()
-        print(f"Recorded realized P&L: ${realized_pnl:.2f} for {stock_symbol}")
-        return True
-        
+        with db_connection() as db:
+            if not db:
+                return False
+            
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO profit_and_loss (stock_symbol, trade_id, realized_pnl, calculation_date)
+                VALUES (%s, %s, %s, %s)
+            """, (stock_symbol.upper(), trade_id, realized_pnl, datetime.datetime.now()))
+            
+            db.commit()
+            print(f"Recorded realized P&L: ${realized_pnl:.2f} for {stock_symbol}")
+            return True
+            
     except Exception as e:
         print(f"Error recording realized P&L: {e}")
         return False
-    finally:
-        if db:
-            db.close()
 
 def calculate_unrealized_pnl(stock_symbol: str = None, user_id: str = 'default_user') -> Dict:
     """Calculate unrealized P&L for holdings"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        
-        # Build query based on whether specific symbol is requested
-        if stock_symbol:
-            holdings_query = """
-                SELECT h.stock_symbol, h.quantity, h.average_cost, s.current_price
-                FROM holdings h
-                LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
-                WHERE h.stock_symbol = %s
-            """
-            cursor.execute(holdings_query, (stock_symbol.upper(),))
-        else:
-            holdings_query = """
-                SELECT h.stock_symbol, h.quantity, h.average_cost, s.current_price
-                FROM holdings h
-                LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
-                WHERE h.quantity > 0
-            """
-            cursor.execute(holdings_query)
-        
-        holdings = cursor.fetchall()
-        
-        if not holdings:
-            return {"unrealized_pnl": 0, "holdings": [], "total_market_value": 0, "total_cost_basis": 0}
-        
-        unrealized_positions = []
-        total_unrealized_pnl = 0
-        total_market_value = 0
-        total_cost_basis = 0
-        
-        for holding in holdings:
-            symbol = holding['stock_symbol']
-            quantity = float(holding['quantity'])
-            avg_cost = float(holding['average_cost'])
-            current_price = float(holding['current_price']) if holding['current_price'] else avg_cost
+        # Served from the live in-memory valuation once it is loaded
+        unrealized = portfolio_valuation.unrealized_pnl(stock_symbol)
+        if unrealized is not None:
+            return unrealized
+        
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
             
-            cost_basis = quantity * avg_cost
-            market_value = quantity * current_price
-            unrealized_pnl = market_value - cost_basis
-            unrealized_pnl_percent = (unrealized_pnl / cost_basis * 100) if cost_basis > 0 else 0
+            cursor = db.cursor(dictionary=True)
             
-            total_unrealized_pnl += unrealized_pnl
-            total_market_value += market_value
-            total_cost_basis += cost_basis
+            # Build query based on whether specific symbol is requested
+            if stock_symbol:
+                holdings_query = """
+                    SELECT h.stock_symbol, CAST(h.quantity AS DOUBLE) AS quantity,
+                           CAST(h.average_cost AS DOUBLE) AS average_cost,
+                           CAST(s.current_price AS DOUBLE) AS current_price
+                    FROM holdings h
+                    LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
+                    WHERE h.stock_symbol = %s
+                """
+                cursor.execute(holdings_query, (stock_symbol.upper(),))
+            else:
+                holdings_query = """
+                    SELECT h.stock_symbol, CAST(h.quantity AS DOUBLE) AS quantity,
+                           CAST(h.average_cost AS DOUBLE) AS average_cost,
+                           CAST(s.current_price AS DOUBLE) AS current_price
+                    FROM holdings h
+                    LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
+                    WHERE h.quantity > 0
+                """
+                cursor.execute(holdings_query)
+            
+            holdings = cursor.fetchall()
+            
+            if not holdings:
+                return {"unrealized_pnl": 0, "holdings": [], "total_market_value": 0, "total_cost_basis": 0}
+            
+            # Value every holding at once over the quantity/cost/price columns
+            columns = holding_columns(holdings)
+            valued = value_holdings(**columns)
+            
+            unrealized_positions = [
+                {
+                    "symbol": holding['stock_symbol'],
+                    "quantity": quantity,
+                    "average_cost": avg_cost,
+                    "current_price": current_price,
+                    "cost_basis": cost_basis,
+                    "market_value": market_value,
+                    "unrealized_pnl": unrealized_pnl,
+                    "unrealized_pnl_percent": unrealized_pnl_percent
+                }
+                for holding, quantity, avg_cost, current_price, cost_basis, market_value, unrealized_pnl, unrealized_pnl_percent
+                in zip(holdings, columns['quantity'].tolist(), columns['average_cost'].tolist(),
+                       columns['current_price'].tolist(), cents(valued['cost_basis']),
+                       cents(valued['market_value']), cents(valued['unrealized_pnl']),
+                       cents(valued['unrealized_pnl_percent']))
+            ]
+            
+            return {
+                "unrealized_pnl": round(valued['total_unrealized_pnl'], 2),
+                "total_market_value": round(valued['total_market_value'], 2),
+                "total_cost_basis": round(valued['total_cost_basis'], 2),
+                "unrealized_pnl_percent": valued['unrealized_pnl_percent_total'],
+                "holdings": unrealized_positions
+            }
             
-            unrealized_positions.append({
-                "symbol": symbol,
-                "quantity": quantity,
-                "average_cost": avg_cost,
-                "current_price": current_price,
-                "cost_basis": round(cost_basis, 2),
-                "market_value": round(market_value, 2),
-                "unrealized_pnl": round(unrealized_pnl, 2),
-                "unrealized_pnl_percent": round(unrealized_pnl_percent, 2)
-            })
-        
-        return {
-            "unrealized_pnl": round(total_unrealized_pnl, 2),
-            "total_market_value": round(total_market_value, 2),
-            "total_cost_basis": round(total_cost_basis, 2),
-            "unrealized_pnl_percent": round((total_unrealized_pnl / total_cost_basis * 100) if total_cost_basis > 0 else 0, 2),
-            "holdings": unrealized_positions
-        }
-        
     except Exception as e:
         print(f"Error calculating unrealized P&L: {e}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
 
-def get_realized_pnl_summary(stock_symbol: str = None, days: int = 30) -> Dict:
-    """Get realized P&L summary for specified period"""
-    db = None
+def get_realized_pnl_summary(stock_symbol: str = None, days: int = 30, include_trades: bool = False,
+                             limit: int = REALIZED_PAGE_SIZE, cursor: str = None) -> Dict:
+    """
+    Get realized P&L summary for specified period.
+    The statistics come from one aggregate query; the per-trade list is only included
+    on request, newest first, one page of at most `limit` trades at a time. Pass the
+    returned `next_cursor` back as `cursor` for the following page.
+    Raises ValueError for a malformed cursor.
+    """
+    after = decode_trade_cursor(cursor) if cursor else None
+    limit = max(1, min(int(limit), MAX_REALIZED_PAGE_SIZE))
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        
-        # Calculate date range
-        end_date = datetime.datetime.now()
-        start_date = end_date - datetime.timedelta(days=days)
-        
-        if stock_symbol:
-            query = """
-                SELECT 
-                    t.stock_symbol,
-                    t.trade_id,
-                    t.realized_pnl,
-                    t.trade_date,
-                    t.quantity,
-                    t.price_at_trade
-                FROM trades t
-                WHERE t.trade_type = 'SELL' 
-                AND t.stock_symbol = %s
-                AND t.trade_date >= %s
-                AND t.realized_pnl IS NOT NULL
-                ORDER BY t.trade_date DESC
-            """
-            cursor.execute(query, (stock_symbol.upper(), start_date))
-        else:
-            query = """
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            
+            db_cursor = db.cursor(dictionary=True)
+            
+            # Calculate date range
+            end_date = datetime.datetime.now()
+            start_date = end_date - datetime.timedelta(days=days)
+            
+            filters = "t.trade_type = 'SELL' AND t.trade_date >= %s AND t.realized_pnl IS NOT NULL"
+            params = [start_date]
+            if stock_symbol:
+                filters += " AND t.stock_symbol = %s"
+                params.append(stock_symbol.upper())
+            
+            # Sum, win/loss counts and averages computed by the database in one pass
+            db_cursor.execute(f"""
                 SELECT 
-                    t.stock_symbol,
-                    t.trade_id,
-                    t.realized_pnl,
-                    t.trade_date,
-                    t.quantity,
-                    t.price_at_trade
+                    COUNT(*) AS trades_count,
+                    COALESCE(SUM(t.realized_pnl), 0) AS total_realized_pnl,
+                    COALESCE(SUM(t.realized_pnl > 0), 0) AS winning_trades,
+                    COALESCE(SUM(t.realized_pnl < 0), 0) AS losing_trades,
+                    COALESCE(AVG(CASE WHEN t.realized_pnl > 0 THEN t.realized_pnl END), 0) AS average_win,
+                    COALESCE(AVG(CASE WHEN t.realized_pnl < 0 THEN t.realized_pnl END), 0) AS average_loss
                 FROM trades t
-                WHERE t.trade_type = 'SELL' 
-                AND t.trade_date >= %s
-                AND t.realized_pnl IS NOT NULL
-                ORDER BY t.trade_date DESC
-            """
-            cursor.execute(query, (start_date,))
-        
-        realized_trades = cursor.fetchall()
-        
-        if not realized_trades:
-            return {
-                "total_realized_pnl": 0,
-                "trades_count": 0,
-                "winning_trades": 0,
-                "losing_trades": 0,
-                "win_rate": 0,
-                "average_win": 0,
-                "average_loss": 0,
-                "trades": []
+                WHERE {filters}
+            """, params)
+            stats = db_cursor.fetchone()
+            
+            trades_count = int(stats['trades_count'])
+            winning_trades = int(stats['winning_trades'])
+            summary = {
+                "total_realized_pnl": round(float(stats['total_realized_pnl']), 2),
+                "trades_count": trades_count,
+                "winning_trades": winning_trades,
+                "losing_trades": int(stats['losing_trades']),
+                "win_rate": round(winning_trades / trades_count * 100, 2) if trades_count else 0,
+                "average_win": round(float(stats['average_win']), 2),
+                "average_loss": round(float(stats['average_loss']), 2),
+                "period_days": days
             }
-        
-        total_realized_pnl = 0
-        winning_trades = 0
-        losing_trades = 0
-        total_wins = 0
-        total_losses = 0
-        
-        trades_list = []
-        
-        for trade in realized_trades:
-            pnl = float(trade['realized_pnl'])
-            total_realized_pnl += pnl
             
-            if pnl > 0:
-                winning_trades += 1
-                total_wins += pnl
-            elif pnl < 0:
-                losing_trades += 1
-                total_losses += pnl
+            if include_trades:
+                summary.update(_realized_trades_page(db_cursor, filters, params, after, limit))
+            
+            return summary
             
-            trades_list.append({
-                "symbol": trade['stock_symbol'],
-                "trade_id": trade['trade_id'],
-                "realized_pnl": round(pnl, 2),
-                "trade_date": trade['trade_date'].strftime('%Y-%m-%d %H:%M:%S'),
-                "quantity": float(trade['quantity']),
-                "price": float(trade['price_at_trade'])
-            })
-        
-        total_trades = len(realized_trades)
-        win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-        average_win = (total_wins / winning_trades) if winning_trades > 0 else 0
-        average_loss = (total_losses / losing_trades) if losing_trades > 0 else 0
-        
-        return {
-            "total_realized_pnl": round(total_realized_pnl, 2),
-            "trades_count": total_trades,
-            "winning_trades": winning_trades,
-            "losing_trades": losing_trades,
-            "win_rate": round(win_rate, 2),
-            "average_win": round(average_win, 2),
-            "average_loss": round(average_loss, 2),
-            "period_days": days,
-            "trades": trades_list
-        }
-        
     except Exception as e:
         print(f"Error getting realized P&L summary: {e}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
+
+def _realized_trades_page(db_cursor, filters: str, params: List, after: Optional[Tuple], limit: int) -> Dict:
+    """One keyset page of realized trades ordered by (trade_date, trade_id) descending"""
+    if after:
+        filters += KEYSET_FILTER
+        params = params + keyset_params(after)
+    
+    # One extra row tells whether another page follows
+    db_cursor.execute(f"""
+        SELECT 
+            t.stock_symbol,
+            t.trade_id,
+            CAST(t.realized_pnl AS DOUBLE) AS realized_pnl,
+            t.trade_date,
+            CAST(t.quantity AS DOUBLE) AS quantity,
+            CAST(t.price_at_trade AS DOUBLE) AS price_at_trade
+        FROM trades t
+        WHERE {filters}
+        ORDER BY t.trade_date DESC, t.trade_id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = db_cursor.fetchall()
+    page = rows[:limit]
+    
+    trades_list = [
+        {
+            "symbol": trade['stock_symbol'],
+            "trade_id": trade['trade_id'],
+            "realized_pnl": round(trade['realized_pnl'], 2),
+            "trade_date": trade['trade_date'].isoformat(' ', 'seconds'),
+            "quantity": trade['quantity'],
+            "price": trade['price_at_trade']
+        }
+        for trade in page
+    ]
+    
+    return {
+        "trades": trades_list,
+        "next_cursor": next_cursor(rows, limit)
+    }
 
 def get_comprehensive_pnl_report(stock_symbol: str = None, days: int = 30) -> Dict:
     """Get comprehensive P&L report combining realized and unrealized"""
@@ -0,0 +1,61 @@
+import numpy as np
+from typing import Dict, List
+
+# Vectorized valuation and P&L over columns loaded once from a cursor.
+# Shared by the portfolio summary, unrealized P&L and dashboard queries.
+# Queries select these columns CAST(... AS DOUBLE): converting DECIMAL values to
+# float one by one costs more than the arithmetic itself.
+
+def column(rows: List[Dict], key: str) -> np.ndarray:
+    """One float64 column from cursor rows; NULL becomes 0"""
+    return np.fromiter((row[key] or 0 for row in rows), dtype=np.float64, count=len(rows))
+
+def cents(values: np.ndarray) -> List[float]:
+    """
+    Per-row values rounded to cents, exactly as round(value, 2) would.
+    np.round() rounds the scaled binary value and can differ from round() at
+    half-cent ties, so the few values near a tie are rounded one by one.
+    """
+    scaled = values * 100
+    distance = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = np.flatnonzero(distance <= 1e-9 * np.maximum(1.0, np.abs(scaled)))
+
+    rounded = np.round(values, 2).tolist()
+    for index in near_tie.tolist():
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+def holding_columns(rows: List[Dict]) -> Dict[str, np.ndarray]:
+    """quantity, average_cost and current_price columns; unpriced holdings are valued at cost"""
+    average_cost = column(rows, 'average_cost')
+    current_price = column(rows, 'current_price')
+    return {
+        "quantity": column(rows, 'quantity'),
+        "average_cost": average_cost,
+        "current_price": np.where(current_price != 0, current_price, average_cost)
+    }
+
+def percent(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator * 100, 0 where the denominator is not positive"""
+    positive = denominator > 0
+    return np.where(positive, numerator / np.where(positive, denominator, 1) * 100, 0.0)
+
+def value_holdings(quantity: np.ndarray, average_cost: np.ndarray, current_price: np.ndarray) -> Dict:
+    """Per-holding market value, cost basis, unrealized P&L and its percent, plus totals"""
+    market_value = quantity * current_price
+    cost_basis = quantity * average_cost
+    unrealized = market_value - cost_basis
+
+    total_market_value = float(market_value.sum())
+    total_cost_basis = float(cost_basis.sum())
+    total_unrealized = float(unrealized.sum())
+    return {
+        "market_value": market_value,
+        "cost_basis": cost_basis,
+        "unrealized_pnl": unrealized,
+        "unrealized_pnl_percent": percent(unrealized, cost_basis),
+        "total_market_value": total_market_value,
+        "total_cost_basis": total_cost_basis,
+        "total_unrealized_pnl": total_unrealized,
+        "unrealized_pnl_percent_total": round(total_unrealized / total_cost_basis * 100, 2) if total_cost_basis > 0 else 0
+    }
@@ -1,305 +1,369 @@
 import mysql.connector
-from typing import Dict, List, Optional
+import datetime
+from typing import Dict, Iterator, List, Optional
 from dotenv import load_dotenv
-from .utils import get_db_connection
+from .utils import db_connection, get_db_pool
+from .valuation import portfolio_valuation
+from .ledger import trade_ledger, CASH_REFUSED, CASH_APPLIED
+from .pnl_kernels import cents, holding_columns, value_holdings
+from .pagination import KEYSET_FILTER, decode_trade_cursor, keyset_params, next_cursor
 
 # Load environment variables from .env file
 load_dotenv()
 
 def get_portfolio_summary(symbol: str = None) -> Dict:
     """Get enhanced portfolio summary with P&L data"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        
-        if symbol:
-            # Get specific symbol summary even if the current price is not in api_stock_information, so left join is good
-            cursor.execute("""
-                SELECT h.stock_symbol, h.quantity, h.average_cost, s.current_price
-                FROM holdings h
-                LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
-                WHERE h.stock_symbol = %s
-            """, (symbol,))
-        else:
-            # Get all holdings with current prices
-            cursor.execute("""
-                SELECT h.stock_symbol, h.quantity, h.average_cost, s.current_price
-                FROM holdings h
-                LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
-                ORDER BY h.stock_symbol
-            """)
-        
-        holdings = cursor.fetchall()
-        
-        # Get total realized P&L for the period
-        if symbol:
-            cursor.execute("""
-                SELECT COALESCE(SUM(realized_pnl), 0) as total_realized_pnl 
-                FROM trades WHERE stock_symbol = %s AND trade_type = 'SELL'
-            """, (symbol,))
-        else:
-            cursor.execute("""
-                SELECT COALESCE(SUM(realized_pnl), 0) as total_realized_pnl 
-                FROM trades WHERE trade_type = 'SELL'
-            """)
-        
-        pnl_result = cursor.fetchone()
-        total_realized_pnl = pnl_result['total_realized_pnl'] if pnl_result else 0
-        
-        # Calculate total portfolio value and unrealized P&L
-        portfolio_value = 0
-        total_cost_basis = 0
-        unrealized_pnl = 0
-        enhanced_holdings = []
-        
-        for holding in holdings:
-            quantity = float(holding['quantity'])
-            avg_cost = float(holding['average_cost'])
-            # Use current_price from the join if available, otherwise use average_cost
-            current_price = float(holding['current_price']) if holding['current_price'] else avg_cost
-            
-            market_value = current_price * quantity
-            cost_basis = avg_cost * quantity
-            holding_unrealized_pnl = market_value - cost_basis
-            
-            portfolio_value += market_value
-            total_cost_basis += cost_basis
-            unrealized_pnl += holding_unrealized_pnl
-            
-            # Create enhanced holding info
-            enhanced_holdings.append({
-                'stock_symbol': holding['stock_symbol'],
-                'quantity': quantity,
-                'average_cost': avg_cost,
-                'current_price': current_price,
-                'market_value': round(market_value, 2),
-                'cost_basis': round(cost_basis, 2),
-                'unrealized_pnl': round(holding_unrealized_pnl, 2),
-                'unrealized_pnl_percent': round((holding_unrealized_pnl / cost_basis * 100) if cost_basis > 0 else 0, 2)
-            })
-        
-        return {
-            "holdings": enhanced_holdings,
-            "summary": {
-                "total_portfolio_value": round(portfolio_value, 2),
-                "total_cost_basis": round(total_cost_basis, 2),
-                "total_unrealized_pnl": round(unrealized_pnl, 2),
-                "total_realized_pnl": float(total_realized_pnl),
-                "total_pnl": round(unrealized_pnl + float(total_realized_pnl), 2),
-                "unrealized_pnl_percent": round((unrealized_pnl / total_cost_basis * 100) if total_cost_basis > 0 else 0, 2),
-                "holdings_count": len(enhanced_holdings)
+        # Served from the live in-memory valuation once it is loaded
+        summary = portfolio_valuation.portfolio_summary(symbol)
+        if summary is not None:
+            return summary
+        
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            
+            cursor = db.cursor(dictionary=True)
+            
+            if symbol:
+                # Get specific symbol summary even if the current price is not in api_stock_information, so left join is good
+                cursor.execute("""
+                    SELECT h.stock_symbol, CAST(h.quantity AS DOUBLE) AS quantity,
+                           CAST(h.average_cost AS DOUBLE) AS average_cost,
+                           CAST(s.current_price AS DOUBLE) AS current_price
+                    FROM holdings h
+                    LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
+                    WHERE h.stock_symbol = %s
+                """, (symbol,))
+            else:
+                # Get all holdings with current prices
+                cursor.execute("""
+                    SELECT h.stock_symbol, CAST(h.quantity AS DOUBLE) AS quantity,
+                           CAST(h.average_cost AS DOUBLE) AS average_cost,
+                           CAST(s.current_price AS DOUBLE) AS current_price
+                    FROM holdings h
+                    LEFT JOIN api_stock_information s ON h.stock_symbol = s.stock_symbol
+                    ORDER BY h.stock_symbol
+                """)
+            
+            holdings = cursor.fetchall()
+            
+            # Get total realized P&L for the period
+            if symbol:
+                cursor.execute("""
+                    SELECT COALESCE(SUM(realized_pnl), 0) as total_realized_pnl 
+                    FROM trades WHERE stock_symbol = %s AND trade_type = 'SELL'
+                """, (symbol,))
+            else:
+                cursor.execute("""
+                    SELECT COALESCE(SUM(realized_pnl), 0) as total_realized_pnl 
+                    FROM trades WHERE trade_type = 'SELL'
+                """)
+            
+            pnl_result = cursor.fetchone()
+            total_realized_pnl = pnl_result['total_realized_pnl'] if pnl_result else 0
+            
+            # Calculate total portfolio value and unrealized P&L over the holding columns
+            # (current_price from the join if available, otherwise average_cost)
+            columns = holding_columns(holdings)
+            valued = value_holdings(**columns)
+            unrealized_pnl = valued['total_unrealized_pnl']
+            
+            enhanced_holdings = [
+                {
+                    'stock_symbol': holding['stock_symbol'],
+                    'quantity': quantity,
+                    'average_cost': avg_cost,
+                    'current_price': current_price,
+                    'market_value': market_value,
+                    'cost_basis': cost_basis,
+                    'unrealized_pnl': holding_unrealized_pnl,
+                    'unrealized_pnl_percent': unrealized_pnl_percent
+                }
+                for holding, quantity, avg_cost, current_price, market_value, cost_basis, holding_unrealized_pnl, unrealized_pnl_percent
+                in zip(holdings, columns['quantity'].tolist(), columns['average_cost'].tolist(),
+                       columns['current_price'].tolist(), cents(valued['market_value']),
+                       cents(valued['cost_basis']), cents(valued['unrealized_pnl']),
+                       cents(valued['unrealized_pnl_percent']))
+            ]
+            
+            return {
+                "holdings": enhanced_holdings,
+                "summary": {
+                    "total_portfolio_value": round(valued['total_market_value'], 2),
+                    "total_cost_basis": round(valued['total_cost_basis'], 2),
+                    "total_unrealized_pnl": round(unrealized_pnl, 2),
+                    "total_realized_pnl": float(total_realized_pnl),
+                    "total_pnl": round(unrealized_pnl + float(total_realized_pnl), 2),
+                    "unrealized_pnl_percent": valued['unrealized_pnl_percent_total'],
+                    "holdings_count": len(enhanced_holdings)
+                }
             }
-        }
-        
+            
     except Exception as e:
         print(f"Error getting portfolio summary: {e}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
 
-def get_trade_history(symbol: str = None, limit: int = 50) -> Dict:
-    """Get trade history for portfolio or specific symbol"""
-    db = None
+TRADE_COLUMNS = "trade_id, stock_symbol, trade_type, price_at_trade, quantity, trade_date, realized_pnl"
+
+# Rows pulled from the server per round trip while streaming an export
+EXPORT_BATCH_SIZE = 1000
+
+def get_trade_history(symbol: str = None, limit: int = 50, cursor: str = None) -> Dict:
+    """
+    Get one page of trade history for portfolio or specific symbol, newest first.
+    Pass the returned `next_cursor` back as `cursor` for the following page.
+    Raises ValueError for a malformed cursor.
+    """
+    after = decode_trade_cursor(cursor) if cursor else None
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        
-        if symbol:
-            cursor.execute("""
-                SELECT trade_id, stock_symbol, trade_type, price_at_trade, quantity, 
-                       trade_date, realized_pnl 
-                FROM trades 
-                WHERE stock_symbol = %s 
-                ORDER BY trade_date DESC 
-                LIMIT %s
-            """, (symbol, limit))
-        else:
-            cursor.execute("""
-                SELECT trade_id, stock_symbol, trade_type, price_at_trade, quantity, 
-                       trade_date, realized_pnl 
-                FROM trades 
-                ORDER BY trade_date DESC 
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            
+            db_cursor = db.cursor(dictionary=True)
+            
+            filters = "1 = 1"
+            params = []
+            if symbol:
+                filters += " AND t.stock_symbol = %s"
+                params.append(symbol)
+            if after:
+                filters += KEYSET_FILTER
+                params += keyset_params(after)
+            
+            # One extra row tells whether another page follows
+            db_cursor.execute(f"""
+                SELECT {TRADE_COLUMNS}
+                FROM trades t
+                WHERE {filters}
+                ORDER BY t.trade_date DESC, t.trade_id DESC
                 LIMIT %s
-            """, (limit,))
-        
-        trades = cursor.fetchall()
-        
-        # Convert decimal and datetime to serializable formats
-        for trade in trades:
-            if trade['realized_pnl']:
-                trade['realized_pnl'] = float(trade['realized_pnl'])
-            trade['price_at_trade'] = float(trade['price_at_trade'])
-            trade['quantity'] = float(trade['quantity'])
-            trade['trade_date'] = trade['trade_date'].strftime('%Y-%m-%d %H:%M:%S')
-        
-        return {
-            "trades": trades,
-            "total_trades": len(trades)
-        }
-        
+            """, params + [limit + 1])
+            
+            rows = db_cursor.fetchall()
+            trades = [_serialize_trade(trade) for trade in rows[:limit]]
+            
+            return {
+                "trades": trades,
+                "total_trades": len(trades),
+                "next_cursor": next_cursor(rows, limit)
+            }
+            
     except Exception as e:
         print(f"Error getting trade history: {e}")
         return {"error": str(e)}
+
+def iter_trades(symbol: str = None) -> Iterator[Dict]:
+    """
+    Yield every trade, oldest first, for streaming exports.
+    The connection is acquired and the query executed before this returns, so a pool
+    timeout or database error raises here rather than midway through a response.
+    Rows are then read through an unbuffered cursor EXPORT_BATCH_SIZE at a time, so
+    memory stays constant however many trades there are. The pooled connection is held
+    until the iterator is exhausted or closed.
+    """
+    pool = get_db_pool()
+    pooled = pool.acquire()
+    try:
+        db_cursor = pooled.connection.cursor(dictionary=True, buffered=False)
+        if symbol:
+            db_cursor.execute(f"""
+                SELECT {TRADE_COLUMNS} FROM trades
+                WHERE stock_symbol = %s
+                ORDER BY trade_date, trade_id
+            """, (symbol,))
+        else:
+            db_cursor.execute(f"""
+                SELECT {TRADE_COLUMNS} FROM trades
+                ORDER BY trade_date, trade_id
+            """)
+    except Exception:
+        pool.release(pooled, discard=True)
+        raise
+    
+    trades = _stream_trades(pool, pooled, db_cursor)
+    # Enter the generator's try block, so closing it unread still releases the connection
+    next(trades)
+    return trades
+
+def _stream_trades(pool, pooled, db_cursor) -> Iterator[Dict]:
+    finished = False
+    try:
+        yield None
+        while True:
+            rows = db_cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            for trade in rows:
+                yield _serialize_trade(trade)
+        
+        db_cursor.close()
+        finished = True
     finally:
-        if db:
-            db.close()
+        # A client that disconnects mid-export leaves unread rows on the connection
+        pool.release(pooled, discard=not finished)
+
+def _serialize_trade(trade: Dict) -> Dict:
+    """Convert decimal and datetime to serializable formats"""
+    return {
+        "trade_id": trade['trade_id'],
+        "stock_symbol": trade['stock_symbol'],
+        "trade_type": trade['trade_type'],
+        "price_at_trade": float(trade['price_at_trade']),
+        "quantity": float(trade['quantity']),
+        "trade_date": trade['trade_date'].strftime('%Y-%m-%d %H:%M:%S'),
+        "realized_pnl": float(trade['realized_pnl']) if trade['realized_pnl'] is not None else None
+    }
 
 def get_cash_balance(user_id: str = 'default_user') -> Dict:
     """Get current cash balance for user"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT cash_balance, updated_at FROM user_balance WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        if result:
+        # The in-memory ledger is authoritative once loaded (the table may lag by one flush)
+        if trade_ledger.loaded:
+            account = trade_ledger.cash_balance(user_id)
+            if account is None:
+                return {"error": "User not found"}
             return {
                 "user_id": user_id,
-                "cash_balance": float(result['cash_balance']),
-                "updated_at": result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
+                "cash_balance": account.cash_balance,
+                "updated_at": (account.updated_at or datetime.datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
             }
-        else:
-            return {"error": "User not found"}
         
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            
+            cursor = db.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT cash_balance, updated_at FROM user_balance WHERE user_id = %s
+            """, (user_id,))
+            
+            result = cursor.fetchone()
+            if result:
+                return {
+                    "user_id": user_id,
+                    "cash_balance": float(result['cash_balance']),
+                    "updated_at": result['updated_at'].strftime('%Y-%m-%d %H:%M:%S')
+                }
+            else:
+                return {"error": "User not found"}
+            
     except Exception as e:
         print(f"Error getting cash balance: {e}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
 
-def add_cash_balance(user_id: str, amount: float) -> bool:
-    """Add cash balance for user"""
-    db = None
+def add_cash_balance(user_id: str, amount: float) -> str:
+    """Add cash balance for user; CASH_APPLIED, CASH_REFUSED, or CASH_PENDING (applied, commit not yet confirmed)"""
+    if trade_ledger.loaded:
+        return trade_ledger.adjust_cash(user_id, amount, create=True)
+    
     try:
-        db = get_db_connection()
-        if not db:
-            return False
-        
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO user_balance (user_id, cash_balance) 
-            VALUES (%s, %s) 
-            ON DUPLICATE KEY UPDATE cash_balance = cash_balance + %s
-        """, (user_id, amount, amount))
-        
-        db.commit()
-        return cursor.rowcount > 0
-        
+        with db_connection() as db:
+            if not db:
+                return CASH_REFUSED
+            
+            cursor = db.cursor()
+            cursor.execute("""
+                INSERT INTO user_balance (user_id, cash_balance) 
+                VALUES (%s, %s) 
+                ON DUPLICATE KEY UPDATE cash_balance = cash_balance + %s
+            """, (user_id, amount, amount))
+            
+            db.commit()
+            return CASH_APPLIED if cursor.rowcount > 0 else CASH_REFUSED
+            
     except Exception as e:
         print(f"Error adding cash balance: {e}")
-        return False
-    finally:
-        if db:
-            db.close()
+        return CASH_REFUSED
 
-def subtract_cash_balance(user_id: str, amount: float) -> bool:
-    """Subtract cash balance for user"""
-    db = None
+def subtract_cash_balance(user_id: str, amount: float) -> str:
+    """Subtract cash balance for user; same outcomes as add_cash_balance"""
+    if trade_ledger.loaded:
+        return trade_ledger.adjust_cash(user_id, -amount)
+    
     try:
-        db = get_db_connection()
-        if not db:
-            return False
-        
-        cursor = db.cursor()
-        cursor.execute("""
-            UPDATE user_balance 
-            SET cash_balance = cash_balance - %s 
-            WHERE user_id = %s AND cash_balance >= %s
-        """, (amount, user_id, amount))
-        
-        db.commit()
-        return cursor.rowcount > 0
-        
+        with db_connection() as db:
+            if not db:
+                return CASH_REFUSED
+            
+            cursor = db.cursor()
+            cursor.execute("""
+                UPDATE user_balance 
+                SET cash_balance = cash_balance - %s 
+                WHERE user_id = %s AND cash_balance >= %s
+            """, (amount, user_id, amount))
+            
+            db.commit()
+            return CASH_APPLIED if cursor.rowcount > 0 else CASH_REFUSED
+            
     except Exception as e:
         print(f"Error subtracting cash balance: {e}")
-        return False
-    finally:
-        if db:
-            db.close()
+        return CASH_REFUSED
 
-def update_cash_balance(user_id: str, new_balance: float) -> bool:
-    """Update cash balance for user"""
-    db = None
+def update_cash_balance(user_id: str, new_balance: float) -> str:
+    """Update cash balance for user; same outcomes as add_cash_balance"""
+    if trade_ledger.loaded:
+        return trade_ledger.set_cash(user_id, new_balance)
+    
     try:
-        db = get_db_connection()
-        if not db:
-            return False
-        
-        cursor = db.cursor()
-        cursor.execute("""
-            UPDATE user_balance SET cash_balance = %s WHERE user_id = %s
-        """, (new_balance, user_id))
-        
-        db.commit()
-        return cursor.rowcount > 0
-        
+        with db_connection() as db:
+            if not db:
+                return CASH_REFUSED
+            
+            cursor = db.cursor()
+            cursor.execute("""
+                UPDATE user_balance SET cash_balance = %s WHERE user_id = %s
+            """, (new_balance, user_id))
+            
+            db.commit()
+            return CASH_APPLIED if cursor.rowcount > 0 else CASH_REFUSED
+            
     except Exception as e:
         print(f"Error updating cash balance: {e}")
-        return False
-    finally:
-        if db:
-            db.close()
+        return CASH_REFUSED
 
 def get_portfolio_performance(days: int = 30) -> Dict:
     """Get portfolio performance over specified days"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return {"error": "Database connection failed"}
-        
-        cursor = db.cursor(dictionary=True)
-        
-        # Get trades in the last N days
-        cursor.execute("""
-            SELECT trade_type, SUM(quantity * price_at_trade) as total_value,
-                   COUNT(*) as trade_count, SUM(COALESCE(realized_pnl, 0)) as total_pnl
-            FROM trades 
-            WHERE trade_date >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            GROUP BY trade_type
-        """, (days,))
-        
-        trade_summary = cursor.fetchall()
-        
-        # Convert to readable format
-        performance = {
-            "period_days": days,
-            "buy_volume": 0,
-            "sell_volume": 0,
-            "buy_trades": 0,
-            "sell_trades": 0,
-            "realized_pnl": 0
-        }
-        
-        for summary in trade_summary:
-            if summary['trade_type'] == 'BUY':
-                performance['buy_volume'] = float(summary['total_value'])
-                performance['buy_trades'] = summary['trade_count']
-            elif summary['trade_type'] == 'SELL':
-                performance['sell_volume'] = float(summary['total_value'])
-                performance['sell_trades'] = summary['trade_count']
-                performance['realized_pnl'] = float(summary['total_pnl'])
-        
-        return performance
-        
+        with db_connection() as db:
+            if not db:
+                return {"error": "Database connection failed"}
+            
+            cursor = db.cursor(dictionary=True)
+            
+            # Get trades in the last N days
+            cursor.execute("""
+                SELECT trade_type, SUM(quantity * price_at_trade) as total_value,
+                       COUNT(*) as trade_count, SUM(COALESCE(realized_pnl, 0)) as total_pnl
+                FROM trades 
+                WHERE trade_date >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                GROUP BY trade_type
+            """, (days,))
+            
+            trade_summary = cursor.fetchall()
+            
+            # Convert to readable format
+            performance = {
+                "period_days": days,
+                "buy_volume": 0,
+                "sell_volume": 0,
+                "buy_trades": 0,
+                "sell_trades": 0,
+                "realized_pnl": 0
+            }
+            
+            for summary in trade_summary:
+                if summary['trade_type'] == 'BUY':
+                    performance['buy_volume'] = float(summary['total_value'])
+                    performance['buy_trades'] = summary['trade_count']
+                elif summary['trade_type'] == 'SELL':
+                    performance['sell_volume'] = float(summary['total_value'])
+                    performance['sell_trades'] = summary['trade_count']
+                    performance['realized_pnl'] = float(summary['total_pnl'])
+            
+            return performance
+            
     except Exception as e:
         print(f"Error getting portfolio performance: {e}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
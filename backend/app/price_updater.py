@@ -4,125 +4,82 @@ import time
 import threading
 from typing import List, Dict
 from dotenv import load_dotenv
-from .market import get_quote
-from .utils import get_db_connection, cache_price_in_database
+from .market import get_quote, get_quotes
+from .utils import db_connection, cache_price_in_database, cache_prices_in_database
+from .order_service import order_service
 
 # Load environment variables from .env file
 load_dotenv()
 
 def get_owned_symbols() -> List[str]:
     """Get list of stock symbols that are currently owned (in holdings)"""
-    db = None
     try:
-        db = get_db_connection()
-        if not db:
-            return []
-        
-        cursor = db.cursor()
-        cursor.execute("""
-            SELECT DISTINCT stock_symbol 
-            FROM holdings 
-            WHERE quantity > 0
-        """)
-        
-        results = cursor.fetchall()
-        symbols = [row[0] for row in results]
-        print(f"Found {len(symbols)} owned symbols: {symbols}")
-        return symbols
-        
+        with db_connection() as db:
+            if not db:
+                return []
+            
+            cursor = db.cursor()
+            cursor.execute("""
+                SELECT DISTINCT stock_symbol 
+                FROM holdings 
+                WHERE quantity > 0
+            """)
+            
+            results = cursor.fetchall()
+            symbols = [row[0] for row in results]
+            print(f"Found {len(symbols)} owned symbols: {symbols}")
+            return symbols
+            
     except Exception as e:
         print(f"Error getting owned symbols: {e}")
         return []
-    finally:
-        if db:
-            db.close()
 
 def update_single_stock_price(symbol: str) -> bool:
     """Update price for a single stock symbol"""
-    db = None
     try:
-        # Get fresh price from API
+        # Get fresh price from API (refreshing the shared quote cache as well)
         print(f"Updating price for {symbol}...")
-        api_data = get_quote(symbol.upper())
+        api_data = get_quote(symbol.upper(), force_refresh=True)
         
         if not api_data or '05. price' not in api_data:
             print(f"Failed to get price data for {symbol}")
             return False
         
-        # Extract data from API response
-        current_price = float(api_data.get('05. price', 0))
-        open_price = float(api_data.get('02. open', current_price))
-        high_price = float(api_data.get('03. high', current_price))
-        low_price = float(api_data.get('04. low', current_price))
-        previous_close = float(api_data.get('08. previous close', current_price))
-        change_amount = float(api_data.get('09. change', 0))
-        change_percent = api_data.get('10. change percent', '0%').rstrip('%')
-        volume = int(api_data.get('06. volume', 0))
-        latest_trading_day = api_data.get('07. latest trading day', datetime.date.today().strftime('%Y-%m-%d'))
-        
         # Update database
-        db = get_db_connection()
-        if not db:
+        if not cache_price_in_database(symbol.upper(), api_data):
             return False
         
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO api_stock_information 
-            (stock_symbol, open_price, high_price, low_price, current_price, volume, 
-             latest_trading_day, previous_close, change_amount, change_percent)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            open_price = VALUES(open_price),
-            high_price = VALUES(high_price),
-            low_price = VALUES(low_price),
-            current_price = VALUES(current_price),
-            volume = VALUES(volume),
-            latest_trading_day = VALUES(latest_trading_day),
-            previous_close = VALUES(previous_close),
-            change_amount = VALUES(change_amount),
-            change_percent = VALUES(change_percent),
-            updated_at = CURRENT_TIMESTAMP
-        """, (symbol, open_price, high_price, low_price, current_price, volume,
-              latest_trading_day, previous_close, change_amount, change_percent))
-        
-        db.commit()
-        print(f"[WORKS] Updated {symbol}: ${current_price:.2f}")
+        print(f"[WORKS] Updated {symbol}: ${float(api_data['05. price']):.2f}")
         return True
         
     except Exception as e:
         print(f"[XXXXXX] Error updating {symbol}: {e}")
         return False
-    finally:
-        if db:
-            db.close()
 
 def update_all_owned_prices() -> Dict[str, bool]:
     """Update prices for all owned stocks"""
     print(f"\n Starting price update cycle at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
     owned_symbols = get_owned_symbols()
+    # Symbols with resting limit/stop orders need fresh prices too, held or not
+    owned_symbols += [symbol for symbol in order_service.symbols() if symbol not in owned_symbols]
     if not owned_symbols:
         print("No owned stocks to update")
         return {}
     
-    results = {}
-    successful_updates = 0
+    # One multi-ticker download for every owned symbol, then one multi-row upsert
+    started = time.monotonic()
+    quotes = get_quotes(owned_symbols, force_refresh=True)
+    quotes = {symbol: quote for symbol, quote in quotes.items() if '05. price' in quote}
+    saved = cache_prices_in_database(quotes)
     
-    for symbol in owned_symbols:
-        try:
-            success = update_single_stock_price(symbol)
-            results[symbol] = success
-            if success:
-                successful_updates += 1
-            
-            # Small delay between API calls to avoid rate limiting
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"[XXXXXXXXX] Failed to update {symbol}: {e}")
-            results[symbol] = False
+    results = {symbol: saved and symbol in quotes for symbol in owned_symbols}
+    successful_updates = sum(1 for success in results.values() if success)
+    for symbol, success in results.items():
+        if not success:
+            print(f"[XXXXXXXXX] Failed to update {symbol}")
     
-    print(f"Price update completed: {successful_updates}/{len(owned_symbols)} successful")
+    print(f"Price update completed: {successful_updates}/{len(owned_symbols)} successful in {time.monotonic() - started:.2f}s")
     return results
 
 def start_background_price_updater(interval_minutes: int = 1):
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Lookup outcomes reported by QuoteCache.lookup()
+HIT = "hit"              # fresh entry served from memory
+STALE = "stale"          # expired entry served while a background refresh runs
+MISS = "miss"            # this caller fetched the value upstream
+COALESCED = "coalesced"  # this caller waited on another caller's upstream fetch
+
+class _Entry:
+    """Cached value with the timestamps needed for TTL and age reporting"""
+
+    def __init__(self, value: Dict, ttl: float):
+        self.value = value
+        self.ttl = ttl
+        self.fetched_at = time.monotonic()
+        self.fetched_wall = time.time()
+
+class _Flight:
+    """An upstream fetch in progress that concurrent callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = {}
+
+class QuoteCache:
+    """Thread-safe LRU quote cache with per-symbol TTL, single-flight loads and stale-while-revalidate"""
+
+    def __init__(self, ttl: float = 15, stale_ttl: float = 60, max_size: int = 1024,
+                 load_timeout: float = 30):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self.load_timeout = load_timeout
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._ttl_overrides = {}
+
+        self._stats = {HIT: 0, STALE: 0, MISS: 0, COALESCED: 0, "evictions": 0, "upstream_fetches": 0}
+
+    def get(self, key: str, loader: Callable[[str], Dict]) -> Dict:
+        """Get a value, calling `loader(key)` at most once across concurrent misses"""
+        return self.lookup(key, loader)[0]
+
+    def lookup(self, key: str, loader: Callable[[str], Dict]) -> Tuple[Dict, str]:
+        """Get a value together with how it was served (hit, stale, miss or coalesced)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.fetched_at
+                if age < entry.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats[HIT] += 1
+                    return dict(entry.value), HIT
+                if age < entry.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self._stats[STALE] += 1
+                    if key not in self._inflight:
+                        flight = self._inflight[key] = _Flight()
+                        threading.Thread(target=self._load, args=(key, loader, flight), daemon=True).start()
+                    return dict(entry.value), STALE
+            flight, leader = self._join_flight(key)
+
+        return self._await_flight(key, loader, flight, leader)
+
+    def refresh(self, key: str, loader: Callable[[str], Dict]) -> Dict:
+        """Fetch a value upstream regardless of freshness (joining a fetch already in progress)"""
+        with self._lock:
+            flight, leader = self._join_flight(key)
+        return self._await_flight(key, loader, flight, leader)[0]
+
+    def put(self, key: str, value: Dict, ttl: float = None):
+        """Store a value fetched elsewhere (e.g. a batch download)"""
+        if not value:
+            return
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def get_if_fresh(self, key: str) -> Optional[Dict]:
+        """Get a cached value only if it is still within its TTL (never fetches)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.fetched_at >= entry.ttl:
+                return None
+            self._entries.move_to_end(key)
+            self._stats[HIT] += 1
+            return dict(entry.value)
+
+    def peek(self, key: str) -> Optional[Tuple[Dict, float]]:
+        """Get a cached value and its age in seconds without fetching or touching LRU order"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return dict(entry.value), time.time() - entry.fetched_wall
+
+    def invalidate(self, key: str = None):
+        """Drop one key, or the whole cache when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def set_ttl(self, key: str, ttl: Optional[float]):
+        """Override the TTL for one key (None restores the default)"""
+        with self._lock:
+            if ttl is None:
+                self._ttl_overrides.pop(key, None)
+            else:
+                self._ttl_overrides[key] = ttl
+
+    def stats(self) -> Dict:
+        """Cache counters for monitoring"""
+        with self._lock:
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "inflight": len(self._inflight)
+            }
+
+    def _join_flight(self, key: str) -> Tuple[_Flight, bool]:
+        # Caller must hold self._lock
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self._stats[COALESCED] += 1
+            return flight, False
+        flight = self._inflight[key] = _Flight()
+        self._stats[MISS] += 1
+        return flight, True
+
+    def _await_flight(self, key: str, loader: Callable, flight: _Flight, leader: bool) -> Tuple[Dict, str]:
+        if leader:
+            self._load(key, loader, flight)
+            return dict(flight.value), MISS
+        flight.event.wait(self.load_timeout)
+        return dict(flight.value), COALESCED
+
+    def _load(self, key: str, loader: Callable, flight: _Flight):
+        value = {}
+        try:
+            value = loader(key) or {}
+        except Exception as e:
+            print(f"Quote cache load failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._stats["upstream_fetches"] += 1
+                # Failed fetches are not cached so the next caller retries upstream
+                if value:
+                    self._store(key, value)
+                flight.value = value
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def _store(self, key: str, value: Dict, ttl: float = None):
+        # Caller must hold self._lock
+        if ttl is None:
+            ttl = self._ttl_overrides.get(key, self.ttl)
+        self._entries[key] = _Entry(dict(value), ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+from .market import get_quotes
+
+# Most symbols one stream may subscribe to
+MAX_STREAM_SYMBOLS = 50
+
+class Subscription:
+    """One connected client: its symbols and the newest not yet sent quote of each"""
+
+    def __init__(self, symbols: List[str]):
+        self.symbols = symbols
+        self._pending = {}
+        self._ready = threading.Condition()
+
+    def push(self, quotes: Dict[str, Dict]):
+        # A slow client only ever needs the newest quote per symbol: merge into what it has not read
+        with self._ready:
+            self._pending.update(quotes)
+            self._ready.notify()
+
+    def get(self, timeout: float = None) -> Dict[str, Dict]:
+        """Every quote pushed since the last get() as {symbol: quote}; raises queue.Empty after `timeout` seconds"""
+        with self._ready:
+            if not self._ready.wait_for(lambda: self._pending, timeout=timeout):
+                raise queue.Empty
+            pending, self._pending = self._pending, {}
+            return pending
+
+class QuoteHub:
+    """Fetches every subscribed symbol once per tick and fans changed quotes out to all subscribers"""
+
+    def __init__(self, fetch: Callable[[List[str]], Dict[str, Dict]], interval: float = 5):
+        self.fetch = fetch
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._latest = {}
+        self._thread = None
+        self._stats = {"ticks": 0, "symbols_fetched": 0, "updates_sent": 0, "errors": 0}
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        """Register a client; it immediately receives the latest known quotes for its symbols"""
+        subscription = Subscription(list(dict.fromkeys(symbol.upper() for symbol in symbols if symbol)))
+        with self._lock:
+            self._subscriptions.add(subscription)
+            snapshot = {symbol: self._latest[symbol] for symbol in subscription.symbols if symbol in self._latest}
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="quote-hub")
+                self._thread.start()
+
+        missing = [symbol for symbol in subscription.symbols if symbol not in snapshot]
+        if missing:
+            # New symbols should not wait a full tick for their first quote
+            fetched = {symbol: quote for symbol, quote in self.fetch(missing).items() if quote}
+            with self._lock:
+                self._latest.update(fetched)
+            snapshot.update(fetched)
+        if snapshot:
+            subscription.push(snapshot)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def stats(self) -> Dict:
+        """Hub counters for monitoring"""
+        with self._lock:
+            return {
+                **self._stats,
+                "subscribers": len(self._subscriptions),
+                "symbols": len({symbol for sub in self._subscriptions for symbol in sub.symbols}),
+                "interval_seconds": self.interval
+            }
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            with self._lock:
+                if not self._subscriptions:
+                    # Nobody is listening: stop until the next subscribe()
+                    self._thread = None
+                    return
+                subscriptions = list(self._subscriptions)
+            symbols = list(dict.fromkeys(symbol for sub in subscriptions for symbol in sub.symbols))
+
+            try:
+                self._tick(symbols, subscriptions)
+            except Exception as e:
+                print(f"Quote stream tick failed: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _tick(self, symbols: List[str], subscriptions: List[Subscription]):
+        quotes = self.fetch(symbols)
+        changed = {}
+        with self._lock:
+            self._stats["ticks"] += 1
+            self._stats["symbols_fetched"] += len(symbols)
+            for symbol, quote in quotes.items():
+                if quote and self._latest.get(symbol) != quote:
+                    self._latest[symbol] = quote
+                    changed[symbol] = quote
+            # Forget symbols nobody subscribes to any more
+            for symbol in set(self._latest) - set(symbols):
+                del self._latest[symbol]
+
+        if not changed:
+            return
+        sent = 0
+        for subscription in subscriptions:
+            update = {symbol: changed[symbol] for symbol in subscription.symbols if symbol in changed}
+            if update:
+                subscription.push(update)
+                sent += 1
+        with self._lock:
+            self._stats["updates_sent"] += sent
+
+# Shared hub behind /api/stream/quotes; quotes come through the shared quote cache,
+# so upstream load follows distinct symbols, not connected clients
+quote_hub = QuoteHub(get_quotes, interval=float(os.getenv('QUOTE_STREAM_INTERVAL', 5)))
@@ -0,0 +1,254 @@
+import datetime
+import os
+import threading
+import time
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from .utils import db_connection
+from .portfolio import get_portfolio_summary
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Daily returns kept in the matrix (about one trading year)
+RISK_WINDOW_DAYS = int(os.getenv('RISK_WINDOW_DAYS', 252))
+# Seconds between checks for new daily bars
+RISK_REFRESH_SECONDS = float(os.getenv('RISK_REFRESH_SECONDS', 300))
+TRADING_DAYS_PER_YEAR = 252
+
+class ReturnCovariance:
+    """
+    Rolling matrix of daily returns for a set of symbols, built from the stored daily bars.
+    The covariance is kept as running sums (sum of returns, sum of outer products), so a
+    refresh adds only the new days' rows and subtracts the rows that fall out of the window.
+    The full matrix is rebuilt only when the set of symbols changes.
+    """
+
+    def __init__(self, window: int = 252):
+        self.window = window
+
+        self._lock = threading.Lock()
+        self._requested = ()      # symbols asked for
+        self._symbols = ()        # those with stored history (the matrix columns)
+        self._dates = []          # date of each return row
+        self._returns = None      # (rows, symbols) daily returns, oldest first
+        self._last_closes = None  # closes of the last two dates, to revise a partial last bar
+        self._sum = None
+        self._cross = None
+        self._refreshed_at = None
+        self._stats = {"rebuilds": 0, "refreshes": 0, "rows_added": 0}
+
+    def refresh(self, symbols: Sequence[str], force: bool = False) -> bool:
+        """Bring the matrix up to date for `symbols`; False if there is no usable history"""
+        symbols = tuple(sorted(symbol.upper() for symbol in symbols))
+        with self._lock:
+            if symbols != self._requested or self._returns is None:
+                return self._rebuild(symbols)
+            if not force and time.monotonic() - self._refreshed_at < RISK_REFRESH_SECONDS:
+                return True
+            return self._append_new_days()
+
+    def snapshot(self) -> Optional[Dict]:
+        """Symbols, return matrix and covariance as of the last refresh"""
+        with self._lock:
+            if self._returns is None or len(self._returns) < 2:
+                return None
+            rows = len(self._returns)
+            covariance = (self._cross - np.outer(self._sum, self._sum) / rows) / (rows - 1)
+            return {
+                "symbols": list(self._symbols),
+                "returns": self._returns,
+                "covariance": covariance,
+                "start": self._dates[0],
+                "as_of": self._dates[-1]
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "symbols": len(self._symbols),
+                "rows": 0 if self._returns is None else len(self._returns),
+                "window": self.window,
+                "as_of": self._dates[-1].strftime('%Y-%m-%d') if self._dates else None
+            }
+
+    def _rebuild(self, symbols: tuple) -> bool:
+        self._requested = symbols
+        self._refreshed_at = time.monotonic()
+        self._stats["rebuilds"] += 1
+        self._returns = None
+        self._dates = []
+
+        # Calendar days needed for `window` trading days, plus slack for holidays
+        since = datetime.date.today() - datetime.timedelta(days=self.window * 7 // 5 + 14)
+        closes = _load_closes(symbols, since)
+        if closes is None:
+            return False
+        # Symbols without any stored bars are left out of the matrix
+        closes = closes.dropna(axis=1, how='all').ffill().dropna()
+        self._symbols = tuple(closes.columns)
+        if len(closes) < 3:
+            return False
+
+        returns = _daily_returns(closes)[-self.window:]
+        self._dates = [timestamp.date() for timestamp in closes.index[1:]][-self.window:]
+        self._returns = returns
+        self._last_closes = closes.tail(2)
+        self._sum = returns.sum(axis=0)
+        self._cross = returns.T @ returns
+        return True
+
+    def _append_new_days(self) -> bool:
+        self._refreshed_at = time.monotonic()
+        self._stats["refreshes"] += 1
+        last_date = self._dates[-1]
+        # Re-read the last cached day too: its bar may have been partial when it was stored
+        new_closes = _load_closes(self._symbols, last_date)
+        if new_closes is None or new_closes.index[0].date() != last_date:
+            return self._rebuild(self._requested)
+
+        # Replace the last cached row and append the new days, against the close before it
+        closes = pd.concat([self._last_closes.iloc[[0]], new_closes]).ffill()
+        added = _daily_returns(closes)
+        stale = self._returns[-1:]
+
+        returns = np.vstack([self._returns[:-1], added])
+        dropped = returns[:-self.window] if len(returns) > self.window else returns[:0]
+        self._returns = returns[-self.window:]
+        self._dates = (self._dates[:-1] + [timestamp.date() for timestamp in closes.index[1:]])[-self.window:]
+        self._last_closes = closes.tail(2)
+
+        self._sum += added.sum(axis=0) - stale.sum(axis=0) - dropped.sum(axis=0)
+        self._cross += added.T @ added - stale.T @ stale - dropped.T @ dropped
+        self._stats["rows_added"] += len(added) - 1
+        return True
+
+def _daily_returns(closes: pd.DataFrame) -> np.ndarray:
+    values = closes.to_numpy(dtype=np.float64)
+    return values[1:] / values[:-1] - 1
+
+def _load_closes(symbols: Sequence[str], since: datetime.date) -> Optional[pd.DataFrame]:
+    """Daily closes from `since` as a (date x symbol) frame, read in one range scan (NaN where a bar is missing)"""
+    from .history_store import ensure_synced
+    for symbol in symbols:
+        try:
+            ensure_synced(symbol, "1d")
+        except Exception as e:
+            print(f"History sync failed for {symbol} (1d): {e}")
+
+    with db_connection() as db:
+        if not db:
+            return None
+        cursor = db.cursor()
+        cursor.execute(f"""
+            SELECT DATE(bar_time), stock_symbol, close_price
+            FROM price_history
+            WHERE bar_interval = '1d' AND bar_time >= %s
+            AND stock_symbol IN ({', '.join(['%s'] * len(symbols))})
+        """, [since] + list(symbols))
+        rows = cursor.fetchall()
+
+    if not rows:
+        return None
+    frame = pd.DataFrame(rows, columns=['date', 'symbol', 'close'])
+    closes = frame.pivot_table(index='date', columns='symbol', values='close', aggfunc='last')
+    closes = closes.reindex(columns=list(symbols)).astype(float)
+    closes.index = pd.to_datetime(closes.index)
+    return closes.sort_index()
+
+def position_risk(exposure: np.ndarray, covariance: np.ndarray, returns: np.ndarray,
+                  confidence: float = 0.95, horizon_days: int = 1) -> Dict:
+    """
+    Parametric (normal) and historical VaR/CVaR of dollar `exposure` per symbol, plus each
+    position's contribution to parametric VaR (contributions sum to the total).
+    """
+    scale = np.sqrt(horizon_days)
+    z = NormalDist().inv_cdf(confidence)
+    tail = 1 - confidence
+
+    marginal = covariance @ exposure
+    portfolio_sd = float(np.sqrt(max(exposure @ marginal, 0.0)))
+    parametric_var = z * portfolio_sd * scale
+    parametric_cvar = portfolio_sd * scale * NormalDist().pdf(z) / tail
+
+    pnl = returns @ exposure
+    cutoff = np.quantile(pnl, tail)
+    historical_var = -cutoff * scale
+    historical_cvar = -pnl[pnl <= cutoff].mean() * scale
+
+    contributions = exposure * marginal / portfolio_sd * z * scale if portfolio_sd > 0 else np.zeros_like(exposure)
+    return {
+        "portfolio_sd": portfolio_sd,
+        "parametric_var": parametric_var,
+        "parametric_cvar": parametric_cvar,
+        "historical_var": float(historical_var),
+        "historical_cvar": float(historical_cvar),
+        "contributions": contributions
+    }
+
+def get_portfolio_risk(confidence: float = 0.95, horizon_days: int = 1) -> Dict:
+    """Covariance/correlation, VaR/CVaR and risk contributions of the current holdings"""
+    try:
+        summary = get_portfolio_summary()
+        if 'error' in summary:
+            return summary
+        positions = {row['stock_symbol']: row['market_value'] for row in summary['holdings'] if row['quantity'] > 0}
+        if not positions:
+            return {"error": "No holdings to analyse"}
+
+        if not return_covariance.refresh(positions):
+            return {"error": "No stored daily history for the held symbols"}
+        model = return_covariance.snapshot()
+        if model is None:
+            return {"error": "Not enough daily history for the held symbols"}
+
+        symbols = model['symbols']
+        covariance = model['covariance']
+        exposure = np.array([positions[symbol] for symbol in symbols], dtype=np.float64)
+        total = exposure.sum()
+        risk = position_risk(exposure, covariance, model['returns'], confidence, horizon_days)
+
+        sd = np.sqrt(np.diag(covariance))
+        correlation = covariance / np.where(np.outer(sd, sd) > 0, np.outer(sd, sd), 1)
+        contributions = risk['contributions']
+        parametric_var = risk['parametric_var']
+
+        return {
+            "as_of": model['as_of'].strftime('%Y-%m-%d'),
+            "window_start": model['start'].strftime('%Y-%m-%d'),
+            "observations": len(model['returns']),
+            "confidence": confidence,
+            "horizon_days": horizon_days,
+            "portfolio_value": round(float(total), 2),
+            "volatility_annualized": round(risk['portfolio_sd'] / total * np.sqrt(TRADING_DAYS_PER_YEAR), 6) if total > 0 else None,
+            "parametric_var": round(parametric_var, 2),
+            "parametric_cvar": round(risk['parametric_cvar'], 2),
+            "historical_var": round(risk['historical_var'], 2),
+            "historical_cvar": round(risk['historical_cvar'], 2),
+            "positions": [
+                {
+                    "symbol": symbol,
+                    "market_value": round(float(value), 2),
+                    "weight": round(float(value / total), 6) if total > 0 else 0,
+                    "volatility_annualized": round(float(volatility * np.sqrt(TRADING_DAYS_PER_YEAR)), 6),
+                    "var_contribution": round(float(contribution), 2),
+                    "var_contribution_percent": round(float(contribution / parametric_var * 100), 2) if parametric_var > 0 else 0
+                }
+                for symbol, value, volatility, contribution in zip(symbols, exposure, sd, contributions)
+            ],
+            "symbols": symbols,
+            "covariance": np.round(covariance, 10).tolist(),
+            "correlation": np.round(correlation, 6).tolist(),
+            "missing_history": sorted(set(positions) - set(symbols))
+        }
+
+    except Exception as e:
+        print(f"Error computing portfolio risk: {e}")
+        return {"error": str(e)}
+
+# Shared return matrix behind the portfolio risk endpoint
+return_covariance = ReturnCovariance(window=RISK_WINDOW_DAYS)
@@ -1,16 +1,25 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+import csv
 import datetime
+import io
+import json
+import queue
+from contextlib import closing
 from .market import (
     get_quote, 
     get_stock_overview, 
     get_intraday_data, 
     get_daily_data, 
-    test_api_connection
+    test_api_connection,
+    quote_cache,
+    fetch_engine
 )
 from .news import get_headlines
 from .portfolio import (
     get_portfolio_summary,
     get_trade_history,
+    iter_trades,
+    TRADE_COLUMNS,
     get_cash_balance,
     get_portfolio_performance,
     add_cash_balance,
@@ -22,22 +31,58 @@ from .sell import sell_stock, get_fifo_holdings
 from .buyRequest import buyRequest
 from .sellRequest import sellRequest
 from .order_request import OrderRequest, OrderType, OrderSide, create_market_order
-from .order_manager import OrderManager
+from .order_manager import OrderManager, MAX_BATCH_ORDERS
+from .order_service import order_service
+from .ledger import CASH_APPLIED, CASH_PENDING, NOT_DURABLE_WARNING
 from .pnl import (
     calculate_unrealized_pnl, 
     get_realized_pnl_summary, 
-    get_comprehensive_pnl_report
+    get_comprehensive_pnl_report,
+    REALIZED_PAGE_SIZE
 )
 from .price_updater import manual_price_update, get_owned_symbols
+from .dashboard import get_dashboard
+from .nav import get_nav_history, take_nav_snapshot
+from .performance import get_performance_analytics, analytics_cache, DEFAULT_ROLLING_WINDOW
+from .risk import get_portfolio_risk, return_covariance
+from .backtest import get_backtest
+from .valuation import portfolio_valuation
+from .ledger import trade_ledger
+from .utils import get_db_pool_metrics, get_current_prices
+from .quote_stream import quote_hub, MAX_STREAM_SYMBOLS
 from .search import (
     search_stocks_by_name,
     get_stock_details_by_symbol,
     get_top_stocks_by_sector,
-    get_all_sectors
+    get_all_sectors,
+    load_search_index,
+    search_index
 )
 
 bp = Blueprint("api", __name__) # helps organize routes 
 
+@bp.get("/stocks")
+def stock_quotes():
+    """Get quotes for ?symbols=AAPL,MSFT in one request, with per-symbol source and age"""
+    try:
+        symbols = list(dict.fromkeys(s.strip().upper() for s in request.args.get('symbols', '').split(',') if s.strip()))
+        if not symbols:
+            return {"error": "symbols parameter is required"}, 400
+        if len(symbols) > 100:
+            return {"error": "At most 100 symbols per request"}, 400
+        max_age = request.args.get('max_age', type=float)
+        
+        print(f"API request received for quotes: {', '.join(symbols)}")
+        quotes = get_current_prices(symbols, max_age)
+        return jsonify({
+            "quotes": quotes,
+            "missing": [symbol for symbol in symbols if symbol not in quotes],
+            "count": len(quotes)
+        })
+    except Exception as e:
+        print(f"Error getting quotes: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/stocks/<symbol>")
 def stock_quote(symbol):
     """Get real-time quote for a stock symbol"""
@@ -53,6 +98,48 @@ def stock_quote(symbol):
         print(f"Error getting quote for {symbol}: {str(e)}")
         return {"error": str(e)}, 500
 
+@bp.get("/stream/quotes")
+def stream_quotes():
+    """Stream quote updates for ?symbols=AAPL,MSFT as Server-Sent Events"""
+    symbols = [s.strip().upper() for s in request.args.get('symbols', '').split(',') if s.strip()]
+    if not symbols:
+        return {"error": "symbols parameter is required"}, 400
+    if len(symbols) > MAX_STREAM_SYMBOLS:
+        return {"error": f"At most {MAX_STREAM_SYMBOLS} symbols per stream"}, 400
+    
+    print(f"Quote stream opened for: {', '.join(symbols)}")
+    subscription = quote_hub.subscribe(symbols)
+    
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    quotes = subscription.get(timeout=15)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream and detects gone clients
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: quotes\ndata: {json.dumps(quotes)}\n\n"
+        finally:
+            quote_hub.unsubscribe(subscription)
+            print(f"Quote stream closed for: {', '.join(symbols)}")
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@bp.get("/stream/stats")
+def quote_stream_stats():
+    """Get quote stream hub statistics"""
+    try:
+        return jsonify(quote_hub.stats())
+    except Exception as e:
+        print(f"Error getting quote stream stats: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/stocks/<symbol>/db-only")
 def stock_quote_db_only(symbol):
     """Get stock quote from database cache only (no API fallback)"""
@@ -88,8 +175,9 @@ def stock_intraday(symbol):
     """Get intraday data for a stock"""
     try:
         interval = request.args.get('interval', '5min')
+        columnar = request.args.get('format') == 'columnar'
         print(f"API request received for intraday: {symbol} ({interval})")
-        data = get_intraday_data(symbol.upper(), interval)
+        data = get_intraday_data(symbol.upper(), interval, columnar)
         if not data:
             print(f"No intraday data found for symbol: {symbol}")
             return {"error": "Symbol not found"}, 404
@@ -103,8 +191,9 @@ def stock_intraday(symbol):
 def stock_daily(symbol):
     """Get daily data for a stock"""
     try:
+        columnar = request.args.get('format') == 'columnar'
         print(f"API request received for daily: {symbol}")
-        data = get_daily_data(symbol.upper())
+        data = get_daily_data(symbol.upper(), columnar)
         if not data:
             print(f"No daily data found for symbol: {symbol}")
             return {"error": "Symbol not found"}, 404
@@ -143,19 +232,220 @@ def portfolio_summary():
         print(f"Error getting portfolio summary: {str(e)}")
         return {"error": str(e)}, 500
 
+@bp.get("/portfolio/valuation")
+def portfolio_valuation_stats():
+    """Get live portfolio valuation statistics"""
+    try:
+        return jsonify(portfolio_valuation.stats())
+    except Exception as e:
+        print(f"Error getting valuation stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/portfolio/analytics")
+def performance_analytics():
+    """Get TWR, IRR, volatility, Sharpe/Sortino, max drawdown and rolling returns (?start=&end=&symbol=&window=)"""
+    try:
+        user_id = request.args.get('user_id', 'default_user')
+        symbol = request.args.get('symbol')
+        start = request.args.get('start')
+        end = request.args.get('end')
+        window = int(request.args.get('window', DEFAULT_ROLLING_WINDOW))
+        data = get_performance_analytics(
+            user_id,
+            datetime.date.fromisoformat(start) if start else None,
+            datetime.date.fromisoformat(end) if end else None,
+            symbol, window
+        )
+        if 'error' in data:
+            return {"error": data['error']}, 500
+        return jsonify(data)
+    except ValueError as e:
+        return {"error": f"Invalid parameter: {str(e)}"}, 400
+    except Exception as e:
+        print(f"Error getting performance analytics: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/portfolio/analytics/cache")
+def performance_analytics_cache():
+    """Get performance analytics cache statistics"""
+    try:
+        return jsonify(analytics_cache.stats())
+    except Exception as e:
+        print(f"Error getting analytics cache stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/portfolio/risk")
+def portfolio_risk():
+    """Get covariance/correlation, VaR/CVaR and per-position risk contributions (?confidence=0.95&horizon=1)"""
+    try:
+        confidence = float(request.args.get('confidence', 0.95))
+        horizon = int(request.args.get('horizon', 1))
+        if not 0.5 <= confidence < 1 or horizon < 1:
+            return {"error": "confidence must be in [0.5, 1) and horizon at least 1 day"}, 400
+        data = get_portfolio_risk(confidence, horizon)
+        if 'error' in data:
+            return {"error": data['error']}, 500
+        return jsonify(data)
+    except ValueError as e:
+        return {"error": f"Invalid parameter: {str(e)}"}, 400
+    except Exception as e:
+        print(f"Error getting portfolio risk: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/portfolio/risk/stats")
+def portfolio_risk_stats():
+    """Get return matrix statistics (rebuilds, incremental refreshes, rows)"""
+    try:
+        return jsonify(return_covariance.stats())
+    except Exception as e:
+        print(f"Error getting risk stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.post("/backtest")
+def backtest():
+    """Replay stored bars through a built-in strategy (no live prices, no database writes)"""
+    try:
+        data = request.get_json() or {}
+        symbols = [symbol.strip().upper() for symbol in data.get('symbols', []) if symbol.strip()]
+        if not symbols:
+            return {"error": "symbols are required"}, 400
+        interval = data.get('interval', '1d')
+        start = data.get('start')
+        end = data.get('end')
+        print(f"Backtest requested: {data.get('strategy', 'buy_and_hold')} on {len(symbols)} symbol(s) ({interval})")
+        result = get_backtest(
+            data.get('strategy', 'buy_and_hold'), symbols, interval,
+            datetime.date.fromisoformat(start) if start else None,
+            datetime.date.fromisoformat(end) if end else None,
+            float(data.get('initial_cash', 100000)),
+            data.get('params')
+        )
+        if 'error' in result:
+            return {"error": result['error']}, 400
+        return jsonify(result)
+    except ValueError as e:
+        return {"error": f"Invalid data format: {str(e)}"}, 400
+    except Exception as e:
+        print(f"Error running backtest: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/portfolio/nav")
+def nav_history():
+    """Get stored NAV history (?period=day|intraday|week|month&start=YYYY-MM-DD&end=YYYY-MM-DD)"""
+    try:
+        user_id = request.args.get('user_id', 'default_user')
+        period = request.args.get('period', 'day').upper()
+        if period not in ('DAY', 'INTRADAY', 'WEEK', 'MONTH'):
+            return {"error": "period must be day, intraday, week or month"}, 400
+        start = request.args.get('start')
+        end = request.args.get('end')
+        data = get_nav_history(
+            user_id, period,
+            datetime.date.fromisoformat(start) if start else None,
+            datetime.date.fromisoformat(end) if end else None
+        )
+        if 'error' in data:
+            return {"error": data['error']}, 500
+        return jsonify(data)
+    except ValueError as e:
+        return {"error": f"Invalid date: {str(e)}"}, 400
+    except Exception as e:
+        print(f"Error getting NAV history: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.post("/portfolio/nav/snapshot")
+def nav_snapshot():
+    """Write a NAV snapshot now (?type=intraday|eod)"""
+    try:
+        snapshot_type = request.args.get('type', 'intraday').upper()
+        if snapshot_type not in ('EOD', 'INTRADAY'):
+            return {"error": "type must be eod or intraday"}, 400
+        users = take_nav_snapshot(snapshot_type)
+        return jsonify({"snapshot_type": snapshot_type, "users": users})
+    except Exception as e:
+        print(f"Error writing NAV snapshot: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/ledger/stats")
+def ledger_stats():
+    """Get in-memory trade ledger counters (apply latency, write-behind queue, flushes)"""
+    try:
+        return jsonify(trade_ledger.stats())
+    except Exception as e:
+        print(f"Error getting ledger stats: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/portfolio/trades")
 def trade_history():
-    """Get trade history"""
+    """Get a page of trade history (follow next_cursor with ?cursor=)"""
     try:
         symbol = request.args.get('symbol')
-        limit = int(request.args.get('limit', 50))
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+        cursor = request.args.get('cursor')
         print(f"API request received for trade history: {symbol if symbol else 'all'}")
-        data = get_trade_history(symbol, limit)
+        data = get_trade_history(symbol, limit, cursor)
         return jsonify(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
     except Exception as e:
         print(f"Error getting trade history: {str(e)}")
         return {"error": str(e)}, 500
 
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
+
+@bp.get("/portfolio/trades/export")
+def export_trades():
+    """Stream every trade as NDJSON (default) or CSV with ?format=csv"""
+    symbol = request.args.get('symbol')
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in ('ndjson', 'csv'):
+        return {"error": "format must be ndjson or csv"}, 400
+    
+    # Runs the query now: failures get an error status instead of a truncated 200
+    try:
+        trades = iter_trades(symbol)
+    except Exception as e:
+        print(f"Error starting trade export: {str(e)}")
+        return {"error": str(e)}, 500
+    print(f"Trade export started: {symbol if symbol else 'all'} ({export_format})")
+    
+    def ndjson_rows():
+        with closing(trades):
+            for trade in trades:
+                yield json.dumps(trade) + "\n"
+    
+    def csv_rows():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=TRADE_COLUMNS.split(', '))
+        writer.writeheader()
+        with closing(trades):
+            for trade in trades:
+                writer.writerow(trade)
+                yield _drain(buffer)
+        # Header only when there are no trades
+        if buffer.tell():
+            yield _drain(buffer)
+    
+    if export_format == 'csv':
+        body, mimetype = csv_rows(), "text/csv"
+    else:
+        body, mimetype = ndjson_rows(), "application/x-ndjson"
+    response = Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename=trades.{export_format}",
+            "X-Accel-Buffering": "no"
+        }
+    )
+    # Releases the connection even if the body is never iterated
+    response.call_on_close(trades.close)
+    return response
+
 @bp.get("/portfolio/cash")
 def cash_balance():
     """Get current cash balance"""
@@ -181,8 +471,7 @@ def cash_deposit():
 
         print(f"API request received for cash deposit: ${amount} for user {user_id}")
 
-        data = add_cash_balance(user_id, amount)  # Fixed parentheses too
-        return jsonify(data)
+        return _cash_response(add_cash_balance(user_id, amount))
     except Exception as e:
         print("Error in deposit route:", str(e))
         return {"error": "Internal server error"}, 500
@@ -191,6 +480,12 @@ def cash_deposit():
         print(f"Error depositing cash: {str(e)}")
         return {"error": str(e)}, 500
     
+def _cash_response(status: str):
+    """202 with durable=false when the change is applied but its commit has not landed: do not retry it"""
+    if status == CASH_PENDING:
+        return jsonify({"success": True, "status": status, "durable": False, "warning": NOT_DURABLE_WARNING}), 202
+    return jsonify({"success": status == CASH_APPLIED, "status": status})
+
 @bp.post("portfolio/cash/withdraw")
 def cash_withdrawal():
     """Withdraw cash from portfolio"""
@@ -203,8 +498,7 @@ def cash_withdrawal():
             return {"error": "Invalid withdrawal amount"}, 400
         
         print(f"API request received for cash withdrawal: ${amount} for user {user_id}")
-        data = subtract_cash_balance(user_id, amount)
-        return jsonify(data)
+        return _cash_response(subtract_cash_balance(user_id, amount))
     
     except Exception as e:
         print(f"Error withdrawing cash: {str(e)}")
@@ -253,9 +547,11 @@ def trade_buy():
         print(f"API request received for buy: {buy_req.quantity} shares of {buy_req.symbol}")
         result = buy_stock(buy_req, cash, user_id)
         
-        # Check if transaction was successful
+        # Check if transaction was successful (202: executed, commit still pending)
         if "successful" in result.lower():
             return jsonify({"status": "success", "message": result})
+        elif "not yet saved" in result.lower():
+            return jsonify({"status": "pending", "message": result}), 202
         else:
             return jsonify({"status": "failed", "message": result}), 400
             
@@ -285,9 +581,11 @@ def trade_sell():
         # sell_stock now handles price fetching internally
         result = sell_stock(sell_req, user_id=user_id)
         
-        # Check if transaction was successful
+        # Check if transaction was successful (202: executed, commit still pending)
         if "successful" in result.lower():
             return jsonify({"status": "success", "message": result})
+        elif "not yet saved" in result.lower():
+            return jsonify({"status": "pending", "message": result}), 202
         else:
             return jsonify({"status": "failed", "message": result}), 400
             
@@ -306,20 +604,22 @@ def place_order():
         if not data:
             return {"error": "No data provided"}, 400
         
-        # Validate required fields (removed price since we only support market orders)
+        # Validate required fields (limit_price/stop_price are checked per order type)
         required_fields = ['symbol', 'side', 'quantity']
         for field in required_fields:
             if field not in data:
                 return {"error": f"{field} is required"}, 400
         
-        # Create order request (all orders are market orders)
+        # Create order request (MARKET unless order_type says otherwise)
         try:
             order_request = OrderRequest(
                 symbol=data['symbol'],
                 side=OrderSide(data['side'].upper()),
                 quantity=int(data['quantity']),
-                order_type=OrderType.MARKET,
-                user_id=data.get('user_id', 'default_user')
+                order_type=OrderType(data.get('order_type', 'MARKET').upper()),
+                user_id=data.get('user_id', 'default_user'),
+                limit_price=float(data['limit_price']) if data.get('limit_price') is not None else None,
+                stop_price=float(data['stop_price']) if data.get('stop_price') is not None else None
             )
         except ValueError as e:
             return {"error": f"Invalid order parameters: {str(e)}"}, 400
@@ -332,7 +632,8 @@ def place_order():
         result = OrderManager.place_order(order_request)
         
         if result.get('success'):
-            return jsonify(result)
+            # 202: executed, but its commit has not landed yet
+            return jsonify(result), 202 if result.get('durable') is False else 200
         else:
             return jsonify(result), 400
             
@@ -340,6 +641,85 @@ def place_order():
         print(f"Error placing order: {str(e)}")
         return {"error": str(e)}, 500
 
+@bp.get("/orders")
+def list_resting_orders():
+    """Get open limit/stop orders (?user_id=, ?symbol=)"""
+    try:
+        user_id = request.args.get('user_id', 'default_user')
+        return jsonify({"orders": order_service.list_orders(user_id, request.args.get('symbol'))})
+    except Exception as e:
+        print(f"Error listing resting orders: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.delete("/orders/<int:order_id>")
+def cancel_resting_order(order_id):
+    """Cancel an open limit/stop order"""
+    try:
+        result = order_service.cancel(order_id, request.args.get('user_id', 'default_user'))
+        if result.get('success'):
+            return jsonify(result)
+        else:
+            return jsonify(result), 404
+    except Exception as e:
+        print(f"Error cancelling order {order_id}: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/orders/engine")
+def order_engine_stats():
+    """Get limit/stop order engine counters (resting orders, triggers, fills, check latency)"""
+    try:
+        return jsonify(order_service.stats())
+    except Exception as e:
+        print(f"Error getting order engine stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.post("/orders/batch")
+def place_order_batch():
+    """Place many market orders at once: one price per symbol, buys netted against sells, one transaction"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('orders'), list) or not data['orders']:
+            return {"error": "orders must be a non-empty list"}, 400
+        if len(data['orders']) > MAX_BATCH_ORDERS:
+            return {"error": f"At most {MAX_BATCH_ORDERS} orders per batch"}, 400
+        
+        # Validate every order before anything is priced or executed
+        order_requests = []
+        errors = []
+        for index, order in enumerate(data['orders']):
+            if not isinstance(order, dict):
+                errors.append({"index": index, "error": "Order must be an object"})
+                continue
+            missing = [field for field in ('symbol', 'side', 'quantity') if field not in order]
+            if missing:
+                errors.append({"index": index, "error": f"{', '.join(missing)} is required"})
+                continue
+            try:
+                order_requests.append(OrderRequest(
+                    symbol=order['symbol'],
+                    side=OrderSide(order['side'].upper()),
+                    quantity=int(order['quantity']),
+                    order_type=OrderType.MARKET,
+                    user_id=data.get('user_id', 'default_user')
+                ))
+            except (ValueError, AttributeError) as e:
+                errors.append({"index": index, "error": f"Invalid order parameters: {str(e)}"})
+        if errors:
+            return {"error": "Invalid orders in batch", "orders": errors}, 400
+        
+        print(f"API request received for a batch of {len(order_requests)} market orders")
+        
+        result = OrderManager.place_batch(order_requests)
+        
+        if result.get('success'):
+            return jsonify(result), 202 if result.get('durable') is False else 200
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        print(f"Error placing order batch: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/trade/holdings/<symbol>")
 def get_holdings_info(symbol):
     """Get FIFO holdings information for a symbol"""
@@ -373,18 +753,23 @@ def unrealized_pnl():
 
 @bp.get("/pnl/realized")
 def realized_pnl():
-    """Get realized P&L summary"""
+    """Get realized P&L summary (?include_trades=true adds a page of trades; follow next_cursor with ?cursor=)"""
     try:
         symbol = request.args.get('symbol')
         days = int(request.args.get('days', 30))
+        include_trades = request.args.get('include_trades', 'false').lower() in ('1', 'true', 'yes')
+        limit = int(request.args.get('limit', REALIZED_PAGE_SIZE))
+        cursor = request.args.get('cursor')
         
         print(f"API request received for realized P&L: {symbol if symbol else 'all'} ({days} days)")
-        data = get_realized_pnl_summary(symbol, days)
+        data = get_realized_pnl_summary(symbol, days, include_trades or bool(cursor), limit, cursor)
         
         if 'error' in data:
             return {"error": data['error']}, 500
             
         return jsonify(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
     except Exception as e:
         print(f"Error getting realized P&L: {str(e)}")
         return {"error": str(e)}, 500
@@ -407,6 +792,31 @@ def comprehensive_pnl():
         print(f"Error getting comprehensive P&L: {str(e)}")
         return {"error": str(e)}, 500
 
+# Dashboard Endpoint
+@bp.get("/dashboard")
+def dashboard():
+    """Get portfolio, cash balance, P&L and performance in one round trip (supports If-None-Match)"""
+    try:
+        days = int(request.args.get('days', 30))
+        user_id = request.args.get('user_id', 'default_user')
+
+        print(f"API request received for dashboard ({days} days)")
+        data, etag = get_dashboard(user_id, days, request.if_none_match)
+
+        if data is None:
+            response = Response(status=304)
+        elif 'error' in data:
+            return {"error": data['error']}, 500
+        else:
+            response = jsonify(data)
+        response.set_etag(etag)
+        # Let the browser keep its copy but revalidate it on every request
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        print(f"Error getting dashboard: {str(e)}")
+        return {"error": str(e)}, 500
+
 # Price Update Endpoints
 @bp.post("/prices/update")
 def manual_update_prices():
@@ -446,6 +856,33 @@ def get_owned_stocks():
         print(f"Error getting owned stocks: {str(e)}")
         return {"error": str(e)}, 500
 
+@bp.get("/db/pool")
+def db_pool_metrics():
+    """Get database connection pool metrics"""
+    try:
+        return jsonify(get_db_pool_metrics())
+    except Exception as e:
+        print(f"Error getting pool metrics: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/quotes/cache")
+def quote_cache_stats():
+    """Get quote cache statistics"""
+    try:
+        return jsonify(quote_cache.stats())
+    except Exception as e:
+        print(f"Error getting quote cache stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.get("/market/engine")
+def market_fetch_engine_stats():
+    """Get upstream fetch engine statistics"""
+    try:
+        return jsonify(fetch_engine.stats())
+    except Exception as e:
+        print(f"Error getting fetch engine stats: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/news")
 def get_news():
     try:
@@ -485,6 +922,26 @@ def search_stocks():
         print(f"Error searching stocks: {str(e)}")
         return {"error": str(e)}, 500
 
+@bp.get("/search/index")
+def search_index_stats():
+    """Get in-memory search index statistics"""
+    try:
+        return jsonify(search_index.stats())
+    except Exception as e:
+        print(f"Error getting search index stats: {str(e)}")
+        return {"error": str(e)}, 500
+
+@bp.post("/search/index/reload")
+def reload_search_index():
+    """Rebuild the search index from nasdaq_companies (e.g. after re-importing the table)"""
+    try:
+        if not load_search_index(force=True):
+            return {"error": "Search index could not be loaded"}, 503
+        return jsonify(search_index.stats())
+    except Exception as e:
+        print(f"Error reloading search index: {str(e)}")
+        return {"error": str(e)}, 500
+
 @bp.get("/search/stocks/<symbol>/details")
 def get_stock_info(symbol):
     """Get detailed information for a specific stock symbol"""
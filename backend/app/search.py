@@ -1,7 +1,18 @@
 import mysql.connector
-from .utils import get_db_connection
+import os
+import threading
+import time
+from .utils import db_connection
+from .search_index import SearchIndex
 from typing import List, Dict, Optional
 
+# Seconds between checks of nasdaq_companies for changes (the index is rebuilt only when it changed)
+SEARCH_INDEX_REFRESH = float(os.getenv('SEARCH_INDEX_REFRESH', 300))
+
+search_index = SearchIndex()
+_index_lock = threading.Lock()
+_index_checked_at = float('-inf')
+
 def get_sector_emoji(sector: str) -> str:
     """Return emoji based on sector"""
     sector_emojis = {
@@ -33,6 +44,78 @@ def format_market_cap(market_cap: int) -> str:
     else:
         return f"${market_cap:,}"
 
+def _format_company(row: Dict) -> Dict:
+    """Format a nasdaq_companies row with emojis and readable market cap"""
+    return {
+        'symbol': row['Symbol'],
+        'name': row['Name'],
+        'sector': row['Sector'] or 'Other',
+        'market_cap': row['MarketCap'] or 0,
+        'market_cap_formatted': format_market_cap(row['MarketCap'] or 0),
+        'sector_emoji': get_sector_emoji(row['Sector'] or 'Other'),
+        'display_name': f"{get_sector_emoji(row['Sector'] or 'Other')} {row['Name']}"
+    }
+
+def load_search_index(force: bool = False) -> bool:
+    """
+    Load nasdaq_companies into the in-memory search index
+    The table is only re-read when its fingerprint changed since the last load
+    """
+    global _index_checked_at
+    _index_checked_at = time.monotonic()
+    with db_connection() as db:
+        if not db:
+            return False
+        
+        try:
+            cursor = db.cursor(dictionary=True)
+            cursor.execute("""
+            SELECT COUNT(*) AS row_count,
+                   COALESCE(SUM(CRC32(CONCAT_WS('|', Symbol, Name, Sector, MarketCap))), 0) AS checksum
+            FROM nasdaq_companies
+            """)
+            fingerprint = cursor.fetchone()
+            version = (int(fingerprint['row_count']), int(fingerprint['checksum']))
+            
+            if not force and search_index.loaded and version == search_index.version:
+                return True
+            
+            cursor.execute("SELECT Symbol, Name, Sector, MarketCap FROM nasdaq_companies")
+            rows = cursor.fetchall()
+            
+        except Exception as e:
+            print(f"Error loading search index: {e}")
+            return False
+    
+    search_index.build(rows, version)
+    print(f"Search index loaded with {len(rows)} companies")
+    return True
+
+def warm_search_index():
+    """Load the search index in the background so the first keystroke does not wait for it"""
+    threading.Thread(target=_refresh_search_index, daemon=True).start()
+
+def _ensure_search_index() -> bool:
+    if not search_index.loaded:
+        # First search: load synchronously (one loader, concurrent callers wait for it)
+        with _index_lock:
+            if not search_index.loaded:
+                load_search_index()
+        return search_index.loaded
+    
+    if time.monotonic() - _index_checked_at >= SEARCH_INDEX_REFRESH and not _index_lock.locked():
+        threading.Thread(target=_refresh_search_index, daemon=True).start()
+    return True
+
+def _refresh_search_index():
+    # Searches keep using the current index; skip if a load is already running
+    if not _index_lock.acquire(blocking=False):
+        return
+    try:
+        load_search_index()
+    finally:
+        _index_lock.release()
+
 def search_stocks_by_name(query: str, limit: int = 20) -> List[Dict]:
     """
     Search for stocks by company name or symbol
@@ -41,64 +124,55 @@ def search_stocks_by_name(query: str, limit: int = 20) -> List[Dict]:
     if not query or len(query.strip()) < 2:
         return []
     
-    db = get_db_connection()
-    if not db:
-        return []
+    if _ensure_search_index():
+        return [_format_company(row) for row in search_index.search(query, limit)]
     
-    try:
-        cursor = db.cursor(dictionary=True)
-        
-        # Search both by name and symbol, prioritizing exact symbol matches
-        search_term = f"%{query.strip()}%"
-        
-        search_query = """
-        SELECT Symbol, Name, Sector, MarketCap,
-               CASE 
-                   WHEN Symbol = %s THEN 1  -- Exact symbol match gets highest priority
-                   WHEN Symbol LIKE %s THEN 2  -- Symbol starts with query
-                   WHEN Name LIKE %s THEN 3   -- Name contains query
-                   ELSE 4
-               END as priority
-        FROM nasdaq_companies 
-        WHERE Symbol LIKE %s 
-           OR Name LIKE %s
-        ORDER BY priority ASC, MarketCap DESC
-        LIMIT %s
-        """
-        
-        cursor.execute(search_query, (
-            query.upper().strip(),  # For exact symbol match
-            f"{query.upper().strip()}%",  # For symbol starts with
-            search_term,  # For name contains
-            f"%{query.upper().strip()}%",  # For symbol contains
-            search_term,  # For name contains (duplicate for WHERE clause)
-            limit
-        ))
-        
-        results = cursor.fetchall()
-        
-        # Format results with emojis and readable market cap
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                'symbol': row['Symbol'],
-                'name': row['Name'],
-                'sector': row['Sector'] or 'Other',
-                'market_cap': row['MarketCap'] or 0,
-                'market_cap_formatted': format_market_cap(row['MarketCap'] or 0),
-                'sector_emoji': get_sector_emoji(row['Sector'] or 'Other'),
-                'display_name': f"{get_sector_emoji(row['Sector'] or 'Other')} {row['Name']}"
-            })
-        
-        return formatted_results
+    # Index unavailable (e.g. database was down at startup): search the table directly
+    return _search_stocks_sql(query, limit)
+
+def _search_stocks_sql(query: str, limit: int) -> List[Dict]:
+    with db_connection() as db:
+        if not db:
+            return []
         
-    except Exception as e:
-        print(f"Error searching stocks: {e}")
-        return []
-    finally:
-        if db and db.is_connected():
-            cursor.close()
-            db.close()
+        try:
+            cursor = db.cursor(dictionary=True)
+            
+            # Search both by name and symbol, prioritizing exact symbol matches
+            search_term = f"%{query.strip()}%"
+            
+            search_query = """
+            SELECT Symbol, Name, Sector, MarketCap,
+                   CASE 
+                       WHEN Symbol = %s THEN 1  -- Exact symbol match gets highest priority
+                       WHEN Symbol LIKE %s THEN 2  -- Symbol starts with query
+                       WHEN Name LIKE %s THEN 3   -- Name contains query
+                       ELSE 4
+                   END as priority
+            FROM nasdaq_companies 
+            WHERE Symbol LIKE %s 
+               OR Name LIKE %s
+            ORDER BY priority ASC, MarketCap DESC
+            LIMIT %s
+            """
+            
+            cursor.execute(search_query, (
+                query.upper().strip(),  # For exact symbol match
+                f"{query.upper().strip()}%",  # For symbol starts with
+                search_term,  # For name contains
+                f"%{query.upper().strip()}%",  # For symbol contains
+                search_term,  # For name contains (duplicate for WHERE clause)
+                limit
+            ))
+            
+            results = cursor.fetchall()
+            
+            # Format results with emojis and readable market cap
+            return [_format_company(row) for row in results]
+            
+        except Exception as e:
+            print(f"Error searching stocks: {e}")
+            return []
 
 def get_stock_details_by_symbol(symbol: str) -> Optional[Dict]:
     """
@@ -107,125 +181,109 @@ def get_stock_details_by_symbol(symbol: str) -> Optional[Dict]:
     if not symbol:
         return None
     
-    db = get_db_connection()
-    if not db:
-        return None
+    if search_index.loaded:
+        row = search_index.get(symbol)
+        return _format_company(row) if row else None
     
-    try:
-        cursor = db.cursor(dictionary=True)
-        
-        query = """
-        SELECT Symbol, Name, Sector, MarketCap
-        FROM nasdaq_companies 
-        WHERE Symbol = %s
-        """
-        
-        cursor.execute(query, (symbol.upper(),))
-        result = cursor.fetchone()
-        
-        if result:
-            return {
-                'symbol': result['Symbol'],
-                'name': result['Name'],
-                'sector': result['Sector'] or 'Other',
-                'market_cap': result['MarketCap'] or 0,
-                'market_cap_formatted': format_market_cap(result['MarketCap'] or 0),
-                'sector_emoji': get_sector_emoji(result['Sector'] or 'Other'),
-                'display_name': f"{get_sector_emoji(result['Sector'] or 'Other')} {result['Name']}"
-            }
-        
-        return None
+    with db_connection() as db:
+        if not db:
+            return None
         
-    except Exception as e:
-        print(f"Error getting stock details: {e}")
-        return None
-    finally:
-        if db and db.is_connected():
-            cursor.close()
-            db.close()
+        try:
+            cursor = db.cursor(dictionary=True)
+            
+            query = """
+            SELECT Symbol, Name, Sector, MarketCap
+            FROM nasdaq_companies 
+            WHERE Symbol = %s
+            """
+            
+            cursor.execute(query, (symbol.upper(),))
+            result = cursor.fetchone()
+            
+            if result:
+                return _format_company(result)
+            
+            return None
+            
+        except Exception as e:
+            print(f"Error getting stock details: {e}")
+            return None
 
 def get_top_stocks_by_sector(sector: str = None, limit: int = 10) -> List[Dict]:
     """
     Get top stocks by market cap, optionally filtered by sector
     """
-    db = get_db_connection()
-    if not db:
-        return []
-    
-    try:
-        cursor = db.cursor(dictionary=True)
-        
-        if sector:
-            query = """
-            SELECT Symbol, Name, Sector, MarketCap
-            FROM nasdaq_companies 
-            WHERE Sector = %s AND MarketCap > 0
-            ORDER BY MarketCap DESC
-            LIMIT %s
-            """
-            cursor.execute(query, (sector, limit))
-        else:
-            query = """
-            SELECT Symbol, Name, Sector, MarketCap
-            FROM nasdaq_companies 
-            WHERE MarketCap > 0
-            ORDER BY MarketCap DESC
-            LIMIT %s
-            """
-            cursor.execute(query, (limit,))
-        
-        results = cursor.fetchall()
-        
-        # Format results
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                'symbol': row['Symbol'],
-                'name': row['Name'],
-                'sector': row['Sector'] or 'Other',
-                'market_cap': row['MarketCap'] or 0,
-                'market_cap_formatted': format_market_cap(row['MarketCap'] or 0),
-                'sector_emoji': get_sector_emoji(row['Sector'] or 'Other'),
-                'display_name': f"{get_sector_emoji(row['Sector'] or 'Other')} {row['Name']}"
-            })
-        
-        return formatted_results
+    with db_connection() as db:
+        if not db:
+            return []
         
-    except Exception as e:
-        print(f"Error getting top stocks: {e}")
-        return []
-    finally:
-        if db and db.is_connected():
-            cursor.close()
-            db.close()
+        try:
+            cursor = db.cursor(dictionary=True)
+            
+            if sector:
+                query = """
+                SELECT Symbol, Name, Sector, MarketCap
+                FROM nasdaq_companies 
+                WHERE Sector = %s AND MarketCap > 0
+                ORDER BY MarketCap DESC
+                LIMIT %s
+                """
+                cursor.execute(query, (sector, limit))
+            else:
+                query = """
+                SELECT Symbol, Name, Sector, MarketCap
+                FROM nasdaq_companies 
+                WHERE MarketCap > 0
+                ORDER BY MarketCap DESC
+                LIMIT %s
+                """
+                cursor.execute(query, (limit,))
+            
+            results = cursor.fetchall()
+            
+            # Format results
+            formatted_results = []
+            for row in results:
+                formatted_results.append({
+                    'symbol': row['Symbol'],
+                    'name': row['Name'],
+                    'sector': row['Sector'] or 'Other',
+                    'market_cap': row['MarketCap'] or 0,
+                    'market_cap_formatted': format_market_cap(row['MarketCap'] or 0),
+                    'sector_emoji': get_sector_emoji(row['Sector'] or 'Other'),
+                    'display_name': f"{get_sector_emoji(row['Sector'] or 'Other')} {row['Name']}"
+                })
+            
+            return formatted_results
+            
+        except Exception as e:
+            print(f"Error getting top stocks: {e}")
+            return []
 
 def get_all_sectors() -> List[str]:
     """
     Get all unique sectors from nasdaq companies
     """
-    db = get_db_connection()
-    if not db:
-        return []
-    
-    try:
-        cursor = db.cursor()
-        
-        query = """
-        SELECT DISTINCT Sector 
-        FROM nasdaq_companies 
-        WHERE Sector IS NOT NULL 
-        ORDER BY Sector
-        """
-        
-        cursor.execute(query)
-        results = cursor.fetchall()
+    with db_connection() as db:
+        if not db:
+            return []
         
-        return [row[0] for row in results if row[0]]
-        
-    except Exception as e:
-        print(f"Error getting sectors: {e}")
-        return []
-    finally:
-        if db and db.is_connected():
-            cursor.close()
-            db.close()
+        try:
+            cursor = db.cursor()
+            
+            query = """
+            SELECT DISTINCT Sector 
+            FROM nasdaq_companies 
+            WHERE Sector IS NOT NULL 
+            ORDER BY Sector
+            """
+            
+            cursor.execute(query)
+            results = cursor.fetchall()
+            
+            return [row[0] for row in results if row[0]]
+            
+        except Exception as e:
+            print(f"Error getting sectors: {e}")
+            return []
@@ -0,0 +1,146 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+# Name/symbol substrings are indexed as 2- and 3-grams (queries are at least 2 characters)
+MIN_GRAM = 2
+MAX_GRAM = 3
+
+class _Snapshot:
+    """Immutable index built from one load of the companies table"""
+
+    def __init__(self, rows: Iterable[Dict], version=None):
+        # Entry ids follow market cap order, so any id-sorted list is already ranked
+        self.rows = sorted(
+            (dict(row) for row in rows if row.get('Symbol')),
+            key=lambda row: (-(row.get('MarketCap') or 0), row['Symbol'])
+        )
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.symbols = [row['Symbol'].upper() for row in self.rows]
+        self.symbol_keys = [symbol.lower() for symbol in self.symbols]
+        self.name_keys = [(row.get('Name') or '').lower() for row in self.rows]
+        self.by_symbol = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Prefix trie on symbols; every node keeps the ids below it in ranked order
+        self.trie = {}
+        for i, symbol in enumerate(self.symbols):
+            node = self.trie
+            for char in symbol:
+                node = node.setdefault(char, {})
+                node.setdefault('', []).append(i)
+
+        # Gram postings over "symbol\0name"; grams spanning the separator never match a query
+        self.grams = {}
+        for i, (symbol_key, name_key) in enumerate(zip(self.symbol_keys, self.name_keys)):
+            text = f"{symbol_key}\0{name_key}"
+            seen = set()
+            for n in range(MIN_GRAM, MAX_GRAM + 1):
+                for start in range(len(text) - n + 1):
+                    gram = text[start:start + n]
+                    if '\0' not in gram and gram not in seen:
+                        seen.add(gram)
+                        self.grams.setdefault(gram, []).append(i)
+
+    def prefix_ids(self, prefix: str) -> List[int]:
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+    def substring_candidates(self, text: str) -> List[int]:
+        # The rarest gram of the query bounds the candidates that can contain it
+        n = min(MAX_GRAM, len(text))
+        smallest = None
+        for start in range(len(text) - n + 1):
+            postings = self.grams.get(text[start:start + n])
+            if postings is None:
+                return []
+            if smallest is None or len(postings) < len(smallest):
+                smallest = postings
+        return smallest or []
+
+class SearchIndex:
+    """In-memory company search with the same ranking as the SQL search (exact symbol,
+    symbol prefix, name contains, symbol contains; then market cap)"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "builds": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def build(self, rows: Iterable[Dict], version=None):
+        """Build a new index from company rows and swap it in atomically"""
+        snapshot = _Snapshot(rows, version)
+        with self._lock:
+            self._snapshot = snapshot
+            self._stats["builds"] += 1
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Ranked company rows matching the query by symbol or name"""
+        snapshot = self._snapshot
+        query = (query or '').strip()
+        if snapshot is None or len(query) < MIN_GRAM or limit <= 0:
+            return []
+        with self._lock:
+            self._stats["searches"] += 1
+
+        symbol_query = query.upper()
+        text_query = query.lower()
+
+        exact = snapshot.by_symbol.get(symbol_query)
+        ids = [] if exact is None else [exact]
+        for i in snapshot.prefix_ids(symbol_query):
+            if len(ids) >= limit:
+                break
+            if i != exact:
+                ids.append(i)
+
+        if len(ids) < limit:
+            # Symbol prefix matches are already ranked above anything found here
+            name_matches, symbol_matches = [], []
+            needed = limit - len(ids)
+            for i in snapshot.substring_candidates(text_query):
+                if snapshot.symbol_keys[i].startswith(text_query):
+                    continue
+                if text_query in snapshot.name_keys[i]:
+                    name_matches.append(i)
+                    if len(name_matches) >= needed:
+                        break
+                elif len(symbol_matches) < needed and text_query in snapshot.symbol_keys[i]:
+                    symbol_matches.append(i)
+            ids += (name_matches + symbol_matches)[:needed]
+
+        return [dict(snapshot.rows[i]) for i in ids]
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """Company row for an exact symbol, or None"""
+        snapshot = self._snapshot
+        if snapshot is None or not symbol:
+            return None
+        i = snapshot.by_symbol.get(symbol.upper())
+        return None if i is None else dict(snapshot.rows[i])
+
+    def stats(self) -> Dict:
+        """Index counters for monitoring"""
+        snapshot = self._snapshot
+        with self._lock:
+            return {
+                **self._stats,
+                "loaded": snapshot is not None,
+                "companies": len(snapshot.rows) if snapshot else 0,
+                "grams": len(snapshot.grams) if snapshot else 0,
+                "loaded_at": snapshot.loaded_at if snapshot else None
+            }
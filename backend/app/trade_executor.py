@@ -0,0 +1,288 @@
+import datetime
+from typing import Dict, List, Optional, Tuple
+from .lots import open_lot, ensure_lots, consume_lots, QUANTITY_EPSILON
+from .utils import db_connection
+from .valuation import portfolio_valuation
+from .ledger import trade_ledger
+
+# Every trade locks user_balance before holdings so concurrent buys and sells cannot deadlock.
+# Once the in-memory ledger is loaded it executes trades instead and persists them behind.
+
+def execute_buy(symbol: str, quantity: float, price: float, user_id: str = 'default_user',
+                cash: float = None) -> Dict:
+    """
+    Buy in one transaction on one connection: cash check, trade insert,
+    holdings upsert and cash debit. `cash`, when given, caps the spend.
+    """
+    if trade_ledger.loaded:
+        return trade_ledger.buy(symbol, quantity, price, user_id, cash)
+
+    with db_connection() as db:
+        if not db:
+            return {"error": "Database connection failed"}
+
+        cursor = db.cursor(dictionary=True)
+        db.start_transaction()
+
+        balance = _lock_cash_balance(cursor, user_id)
+        if balance is None:
+            return {"error": "User not found"}
+
+        result, holding = _buy(cursor, symbol.upper(), quantity, price, user_id, balance, cash)
+        if 'error' in result:
+            return result
+
+        db.commit()
+    result["durable"] = True
+    publish_fill(result, holding)
+    return result
+
+def execute_sell(symbol: str, quantity: float, price: float, user_id: str = 'default_user') -> Dict:
+    """
+    Sell in one transaction on one connection: FIFO cost basis from the open
+    lots, trade and realized P&L inserts, holdings update and cash credit.
+    """
+    if trade_ledger.loaded:
+        return trade_ledger.sell(symbol, quantity, price, user_id)
+
+    with db_connection() as db:
+        if not db:
+            return {"error": "Database connection failed"}
+
+        cursor = db.cursor(dictionary=True)
+        db.start_transaction()
+
+        balance = _lock_cash_balance(cursor, user_id)
+        if balance is None:
+            return {"error": "User not found"}
+
+        result, holding = _sell(cursor, symbol.upper(), quantity, price, user_id, balance)
+        if 'error' in result:
+            return result
+
+        db.commit()
+    result["durable"] = True
+    publish_fill(result, holding)
+    return result
+
+def execute_batch(trades: List[Tuple[str, str, float, float]], user_id: str = 'default_user') -> Dict:
+    """
+    Run (side, symbol, quantity, price) trades for one user, in order, in one
+    transaction: if any trade fails none of them is kept. Returns the per-trade
+    results, or the error and `failed_index` of the trade that failed.
+    """
+    if trade_ledger.loaded:
+        return trade_ledger.execute_batch(trades, user_id)
+
+    with db_connection() as db:
+        if not db:
+            return {"error": "Database connection failed"}
+
+        cursor = db.cursor(dictionary=True)
+        db.start_transaction()
+
+        balance = _lock_cash_balance(cursor, user_id)
+        if balance is None:
+            return {"error": "User not found"}
+
+        results, holdings = [], []
+        for index, (side, symbol, quantity, price) in enumerate(trades):
+            if side == "BUY":
+                result, holding = _buy(cursor, symbol.upper(), quantity, price, user_id, balance)
+            else:
+                result, holding = _sell(cursor, symbol.upper(), quantity, price, user_id, balance)
+            if 'error' in result:
+                db.rollback()
+                return {"error": result['error'], "failed_index": index}
+            balance = result['cash_balance']
+            results.append(result)
+            holdings.append(holding)
+
+        db.commit()
+    for result, holding in zip(results, holdings):
+        result["durable"] = True
+        publish_fill(result, holding)
+    return {"success": True, "results": results, "cash_balance": balance, "durable": True}
+
+def fill_orders(fills: List[Tuple[int, str, str, str, float, float]]) -> List[Dict]:
+    """
+    Fill triggered resting orders, each (order_id, user_id, side, symbol, quantity, price),
+    in one transaction together with their FILLED status, so an order is never filled
+    twice nor marked filled without its trade. Orders fill or fail one by one: returns
+    a result per fill, an error for the ones that failed (their status is the caller's),
+    flagged `retryable` when the database rather than the account refused it.
+    """
+    if trade_ledger.loaded:
+        return trade_ledger.fill_orders(fills)
+
+    with db_connection() as db:
+        if not db:
+            return [{"error": "Database connection failed", "retryable": True} for _ in fills]
+
+        cursor = db.cursor(dictionary=True)
+        db.start_transaction()
+
+        # Every user's balance before any holdings, in one order across fills
+        balances = {user_id: _lock_cash_balance(cursor, user_id) for user_id in sorted({fill[1] for fill in fills})}
+        results, filled, holdings = [], [], []
+        for order_id, user_id, side, symbol, quantity, price in fills:
+            if balances[user_id] is None:
+                results.append({"error": "User not found"})
+                continue
+            if side == "BUY":
+                result, holding = _buy(cursor, symbol.upper(), quantity, price, user_id, balances[user_id])
+            else:
+                result, holding = _sell(cursor, symbol.upper(), quantity, price, user_id, balances[user_id])
+            results.append(result)
+            if 'error' in result:
+                continue
+            balances[user_id] = result['cash_balance']
+            cursor.execute("""
+                UPDATE resting_orders SET status = 'FILLED', fill_price = %s, trade_id = %s, message = %s
+                WHERE order_id = %s
+            """, filled_order_row(order_id, result))
+            filled.append(result)
+            holdings.append(holding)
+
+        db.commit()
+    for result, holding in zip(filled, holdings):
+        result["durable"] = True
+        publish_fill(result, holding)
+    return results
+
+def filled_order_row(order_id: int, result: Dict) -> Tuple:
+    """(fill_price, trade_id, message, order_id) for the resting_orders update of a filled order"""
+    message = f"{result['side']} {result['filled_quantity']} {result['symbol']} at ${result['filled_price']:.2f}"
+    return result['filled_price'], result['trade_id'], message, order_id
+
+def _buy(cursor, symbol: str, quantity: float, price: float, user_id: str, balance: float,
+         cash: float = None) -> Tuple[Dict, Optional[Tuple]]:
+    """The buy's writes inside the caller's transaction; returns the result and the new holding"""
+    total_cost = price * quantity
+    available = balance if cash is None else min(balance, cash)
+    if total_cost > available:
+        return {"error": f"Insufficient funds. Required: ${total_cost:.2f}, Available: ${available:.2f}"}, None
+
+    holding = _lock_holding(cursor, symbol)
+
+    now = datetime.datetime.now()
+    cursor.execute("""
+        INSERT INTO trades (stock_symbol, trade_type, price_at_trade, quantity, trade_date)
+        VALUES (%s, %s, %s, %s, %s)
+    """, (symbol, "BUY", price, quantity, now))
+    trade_id = cursor.lastrowid
+    open_lot(cursor, trade_id, symbol, quantity, price, now)
+
+    if holding:
+        # Weighted average cost of the combined position
+        old_quantity = float(holding['quantity'])
+        new_quantity = old_quantity + quantity
+        new_avg_cost = (old_quantity * float(holding['average_cost']) + total_cost) / new_quantity
+        cursor.execute("""
+            UPDATE holdings SET quantity = %s, average_cost = %s WHERE stock_symbol = %s
+        """, (new_quantity, new_avg_cost, symbol))
+    else:
+        new_quantity, new_avg_cost = quantity, price
+        cursor.execute("""
+            INSERT INTO holdings (stock_symbol, quantity, average_cost) VALUES (%s, %s, %s)
+        """, (symbol, quantity, price))
+
+    cursor.execute("""
+        UPDATE user_balance SET cash_balance = cash_balance - %s WHERE user_id = %s
+    """, (total_cost, user_id))
+
+    return {
+        "success": True,
+        "trade_id": trade_id,
+        "symbol": symbol,
+        "side": "BUY",
+        "filled_price": price,
+        "filled_quantity": quantity,
+        "total_cost": total_cost,
+        "cash_balance": balance - total_cost
+    }, (new_quantity, new_avg_cost, None)
+
+def _sell(cursor, symbol: str, quantity: float, price: float, user_id: str,
+          balance: float) -> Tuple[Dict, Optional[Tuple]]:
+    """The sell's writes inside the caller's transaction; returns the result and the new holding"""
+    proceeds = price * quantity
+
+    holding = _lock_holding(cursor, symbol)
+    holding_quantity = float(holding['quantity']) if holding else 0
+    if holding_quantity < quantity:
+        return {"error": f"Insufficient shares. Available: {holding_quantity}, Requested: {quantity}"}, None
+
+    # Consume the oldest open lots; what is left keeps the position's cost
+    open_quantity, open_cost = ensure_lots(cursor, symbol, holding_quantity)
+    if open_quantity + QUANTITY_EPSILON < quantity:
+        return {"error": f"Insufficient shares. Available: {open_quantity}, Requested: {quantity}"}, None
+    cost_basis = consume_lots(cursor, symbol, quantity)
+    realized_pnl = proceeds - cost_basis
+    remaining_quantity = open_quantity - quantity
+    remaining_cost = open_cost - cost_basis
+
+    now = datetime.datetime.now()
+    cursor.execute("""
+        INSERT INTO trades (stock_symbol, trade_type, price_at_trade, quantity, trade_date, realized_pnl)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (symbol, "SELL", price, quantity, now, realized_pnl))
+    trade_id = cursor.lastrowid
+
+    cursor.execute("""
+        INSERT INTO profit_and_loss (stock_symbol, trade_id, realized_pnl, calculation_date)
+        VALUES (%s, %s, %s, %s)
+    """, (symbol, trade_id, realized_pnl, now))
+
+    new_quantity = holding_quantity - quantity
+    if new_quantity <= 0:
+        cursor.execute("DELETE FROM holdings WHERE stock_symbol = %s", (symbol,))
+        new_avg_cost = 0
+    else:
+        new_avg_cost = round(remaining_cost / remaining_quantity, 4) if remaining_quantity > 0 else 0
+        cursor.execute("""
+            UPDATE holdings SET quantity = %s, average_cost = %s WHERE stock_symbol = %s
+        """, (new_quantity, new_avg_cost, symbol))
+
+    cursor.execute("""
+        UPDATE user_balance SET cash_balance = cash_balance + %s WHERE user_id = %s
+    """, (proceeds, user_id))
+
+    return {
+        "success": True,
+        "trade_id": trade_id,
+        "symbol": symbol,
+        "side": "SELL",
+        "filled_price": price,
+        "filled_quantity": quantity,
+        "proceeds": proceeds,
+        "realized_pnl": round(realized_pnl, 2),
+        "cash_balance": balance + proceeds
+    }, (new_quantity, new_avg_cost, realized_pnl)
+
+def publish_fill(result: Dict, holding: Tuple):
+    """After the commit: update the live valuation and log the fill"""
+    new_quantity, new_avg_cost, realized_pnl = holding
+    portfolio_valuation.apply_trade(result['symbol'], new_quantity, new_avg_cost, realized_pnl or 0)
+    log_fill(result, holding)
+
+def log_fill(result: Dict, holding: Tuple):
+    new_quantity, new_avg_cost, realized_pnl = holding
+    symbol, quantity, price = result['symbol'], result['filled_quantity'], result['filled_price']
+    if realized_pnl is None:
+        print(f"Bought {quantity} {symbol} at ${price:.2f}: {new_quantity} shares at ${new_avg_cost:.4f} avg cost")
+    else:
+        print(f"Sold {quantity} {symbol} at ${price:.2f}: realized P&L ${realized_pnl:.2f}, "
+              f"{max(new_quantity, 0)} shares left at ${new_avg_cost:.4f} avg cost")
+
+def _lock_cash_balance(cursor, user_id: str) -> Optional[float]:
+    cursor.execute("""
+        SELECT cash_balance FROM user_balance WHERE user_id = %s FOR UPDATE
+    """, (user_id,))
+    row = cursor.fetchone()
+    return float(row['cash_balance']) if row else None
+
+def _lock_holding(cursor, symbol: str) -> Optional[Dict]:
+    cursor.execute("""
+        SELECT quantity, average_cost FROM holdings WHERE stock_symbol = %s FOR UPDATE
+    """, (symbol,))
+    return cursor.fetchone()
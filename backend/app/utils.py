@@ -1,52 +1,92 @@
 import mysql.connector
 import datetime
 import os
-from typing import Dict
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
 from dotenv import load_dotenv
-from .market import get_quote
+from .db_pool import ConnectionPool
+from .market import get_quote_with_status, get_quotes, quote_cache
+from .quote_cache import MISS
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_db_connection():
-    """Get database connection using environment variables"""
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def _open_db_connection():
+    """Open a new raw database connection using environment variables"""
+    return mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST'),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD'),
+        database=os.getenv('MYSQL_DB')
+    )
+
+def get_db_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ConnectionPool(
+                    _open_db_connection,
+                    size=int(os.getenv('MYSQL_POOL_SIZE', 10)),
+                    timeout=float(os.getenv('MYSQL_POOL_TIMEOUT', 10)),
+                    recycle_seconds=float(os.getenv('MYSQL_POOL_RECYCLE', 3600)),
+                    health_check=os.getenv('MYSQL_POOL_HEALTH_CHECK', 'true').lower() != 'false'
+                )
+    return _db_pool
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled database connection (yields None if one cannot be obtained)"""
+    pool = get_db_pool()
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD'),
-            database=os.getenv('MYSQL_DB')
-        )
-        return connection
+        pooled = pool.acquire()
     except Exception as e:
         print(f"Database connection error: {e}")
-        return None
+        yield None
+        return
+    try:
+        yield pooled.connection
+    finally:
+        pool.release(pooled)
+
+def get_db_pool_metrics() -> Dict:
+    """Get connection pool metrics (in-use, waiters, wait-time histogram)"""
+    return get_db_pool().metrics()
 
 def get_current_price(symbol: str) -> Dict:
     """Get current stock price with API-first, database-fallback strategy"""
-    db = None
     api_error = None
     db_error = None
     
     try:
-        # First, try to get fresh price from API
-        print(f"Fetching fresh price from API for {symbol}...")
-        api_data = get_quote(symbol.upper())
+        # First, try the shared quote cache (which fetches from the API on a miss)
+        api_data, cache_status = get_quote_with_status(symbol.upper())
         
         if api_data and '05. price' in api_data:
             current_price = float(api_data['05. price'])
             
-            # Cache the fresh price in database for future fallback use
-            cache_success = cache_price_in_database(symbol.upper(), api_data)
-            if cache_success:
-                print(f"Fresh price cached in database for {symbol}")
+            if cache_status == MISS:
+                # Cache the fresh price in database for future fallback use (only the fetching caller writes)
+                cache_success = cache_price_in_database(symbol.upper(), api_data)
+                if cache_success:
+                    print(f"Fresh price cached in database for {symbol}")
+                print(f"Fresh price from API for {symbol}: ${current_price}")
+                last_updated = datetime.datetime.now()
+            else:
+                cached = quote_cache.peek(symbol.upper())
+                age = cached[1] if cached else 0
+                last_updated = datetime.datetime.now() - datetime.timedelta(seconds=age)
             
-            print(f"Fresh price from API for {symbol}: ${current_price}")
             return {
                 "symbol": symbol.upper(),
                 "current_price": current_price,
-                "source": "api",
-                "last_updated": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                "source": "api" if cache_status == MISS else "cache",
+                "last_updated": last_updated.strftime('%Y-%m-%d %H:%M:%S')
             }
         else:
             api_error = "Invalid API response or missing price data"
@@ -58,57 +98,29 @@ def get_current_price(symbol: str) -> Dict:
     # API failed, try database fallback
     try:
         print(f"API failed, trying database fallback for {symbol}...")
-        db = get_db_connection()
-        if db:
-            cursor = db.cursor(dictionary=True)
-            cursor.execute("""
-                SELECT stock_symbol, current_price, open_price, high_price, low_price,
-                       volume, previous_close, change_amount, change_percent,
-                       latest_trading_day, updated_at 
-                FROM api_stock_information 
-                WHERE stock_symbol = %s
-            """, (symbol.upper(),))
+        with db_connection() as db:
+            if db:
+                cursor = db.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT stock_symbol, current_price, open_price, high_price, low_price,
+                           volume, previous_close, change_amount, change_percent,
+                           latest_trading_day, updated_at 
+                    FROM api_stock_information 
+                    WHERE stock_symbol = %s
+                """, (symbol.upper(),))
             
-            result = cursor.fetchone()
-            if result and result['current_price']:
-                print(f"Fallback price found in database for {symbol}: ${result['current_price']}")
-                
-                # Return data in both API format and database format for compatibility
-                change_percent_formatted = f"{result['change_percent']}%" if result['change_percent'] is not None else "0%"
-                
-                return {
-                    # Database format (new)
-                    "symbol": result['stock_symbol'],
-                    "current_price": float(result['current_price']) if result['current_price'] else 0,
-                    "change_amount": float(result['change_amount']) if result['change_amount'] else 0,
-                    "change_percent": change_percent_formatted,
-                    "volume": int(result['volume']) if result['volume'] else 0,
-                    "source": "database_fallback",
-                    "last_updated": result['updated_at'].strftime('%Y-%m-%d %H:%M:%S') if result['updated_at'] else None,
-                    
-                    # API format compatibility (for existing frontend code)
-                    "01. symbol": result['stock_symbol'],
-                    "02. open": str(result['open_price']) if result['open_price'] else "0",
-                    "03. high": str(result['high_price']) if result['high_price'] else "0", 
-                    "04. low": str(result['low_price']) if result['low_price'] else "0",
-                    "05. price": str(result['current_price']) if result['current_price'] else "0",
-                    "06. volume": str(result['volume']) if result['volume'] else "0",
-                    "07. latest trading day": result['latest_trading_day'] if result['latest_trading_day'] else None,
-                    "08. previous close": str(result['previous_close']) if result['previous_close'] else "0",
-                    "09. change": str(result['change_amount']) if result['change_amount'] else "0",
-                    "10. change percent": change_percent_formatted
-                }
+                result = cursor.fetchone()
+                if result and result['current_price']:
+                    print(f"Fallback price found in database for {symbol}: ${result['current_price']}")
+                    return _row_to_quote(result, "database_fallback")
+                else:
+                    db_error = "No cached data found in database"
             else:
-                db_error = "No cached data found in database"
-        else:
-            db_error = "Database connection failed"
+                db_error = "Database connection failed"
             
     except Exception as e:
         db_error = str(e)
         print(f"Database fallback failed for {symbol}: {db_error}")
-    finally:
-        if db:
-            db.close()
     
     # Both API and database failed
     if "rate limit" in api_error.lower() if api_error else False:
@@ -116,75 +128,185 @@ def get_current_price(symbol: str) -> Dict:
     else:
         return {"error": f"Both API and database failed. API error: {api_error}. Database error: {db_error}"}
 
+def get_current_prices(symbols: List[str], max_age: float = None) -> Dict[str, Dict]:
+    """
+    Resolve quotes for many symbols at once: fresh cache entries first, then one
+    database query, then a parallel upstream fetch for anything missing or stale.
+    Each quote carries its source and age in seconds; unresolvable symbols are omitted.
+    """
+    max_age = quote_cache.ttl if max_age is None else max_age
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols if symbol))
+    quotes = {}
+    stale = {}
+    
+    for symbol in symbols:
+        cached = quote_cache.peek(symbol)
+        if cached:
+            quote, age = cached
+            if age < max_age:
+                quotes[symbol] = _with_source(quote, "cache", age)
+            else:
+                stale[symbol] = _with_source(quote, "cache_stale", age)
+    
+    pending = [symbol for symbol in symbols if symbol not in quotes]
+    if pending:
+        now = datetime.datetime.now()
+        for symbol, row in _load_price_rows(pending).items():
+            age = (now - row['updated_at']).total_seconds() if row['updated_at'] else float('inf')
+            if age < max_age:
+                quotes[symbol] = _with_source(_row_to_quote(row, "database"), "database", age)
+            elif symbol not in stale or age < stale[symbol]['age_seconds']:
+                stale[symbol] = _with_source(_row_to_quote(row, "database_stale"), "database_stale", age)
+    
+    pending = [symbol for symbol in symbols if symbol not in quotes]
+    if pending:
+        # One batch download (with parallel per-symbol fallback) for everything still missing
+        fetched = get_quotes(pending, force_refresh=True)
+        if fetched:
+            cache_prices_in_database(fetched)
+        for symbol, quote in fetched.items():
+            quotes[symbol] = _with_source(quote, "api", 0)
+    
+    # Upstream failed: a stale price is better than none
+    for symbol in symbols:
+        if symbol not in quotes and symbol in stale:
+            quotes[symbol] = stale[symbol]
+    
+    return {symbol: quotes[symbol] for symbol in symbols if symbol in quotes}
+
+def _load_price_rows(symbols: List[str]) -> Dict[str, Dict]:
+    try:
+        with db_connection() as db:
+            if not db:
+                return {}
+            
+            cursor = db.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(symbols))
+            cursor.execute(f"""
+                SELECT stock_symbol, current_price, open_price, high_price, low_price,
+                       volume, previous_close, change_amount, change_percent,
+                       latest_trading_day, updated_at 
+                FROM api_stock_information 
+                WHERE stock_symbol IN ({placeholders})
+            """, symbols)
+            
+            return {row['stock_symbol'].upper(): row for row in cursor.fetchall() if row['current_price']}
+            
+    except Exception as e:
+        print(f"Error loading cached prices for {', '.join(symbols)}: {e}")
+        return {}
+
+def _with_source(quote: Dict, source: str, age: float) -> Dict:
+    return {**quote, "source": source, "age_seconds": round(age, 1) if age != float('inf') else None}
+
+def _row_to_quote(result: Dict, source: str) -> Dict:
+    """Build a quote in both database and API format from an api_stock_information row"""
+    change_percent_formatted = f"{result['change_percent']}%" if result['change_percent'] is not None else "0%"
+    
+    return {
+        # Database format (new)
+        "symbol": result['stock_symbol'],
+        "current_price": float(result['current_price']) if result['current_price'] else 0,
+        "change_amount": float(result['change_amount']) if result['change_amount'] else 0,
+        "change_percent": change_percent_formatted,
+        "volume": int(result['volume']) if result['volume'] else 0,
+        "source": source,
+        "last_updated": result['updated_at'].strftime('%Y-%m-%d %H:%M:%S') if result['updated_at'] else None,
+        
+        # API format compatibility (for existing frontend code)
+        "01. symbol": result['stock_symbol'],
+        "02. open": str(result['open_price']) if result['open_price'] else "0",
+        "03. high": str(result['high_price']) if result['high_price'] else "0", 
+        "04. low": str(result['low_price']) if result['low_price'] else "0",
+        "05. price": str(result['current_price']) if result['current_price'] else "0",
+        "06. volume": str(result['volume']) if result['volume'] else "0",
+        "07. latest trading day": result['latest_trading_day'] if result['latest_trading_day'] else None,
+        "08. previous close": str(result['previous_close']) if result['previous_close'] else "0",
+        "09. change": str(result['change_amount']) if result['change_amount'] else "0",
+        "10. change percent": change_percent_formatted
+    }
+
+def _quote_to_row(symbol: str, api_data: Dict) -> tuple:
+    """Extract the api_stock_information column values from an API quote"""
+    current_price = float(api_data.get('05. price', 0))
+    open_price = float(api_data.get('02. open', current_price))
+    high_price = float(api_data.get('03. high', current_price))
+    low_price = float(api_data.get('04. low', current_price))
+    previous_close = float(api_data.get('08. previous close', current_price))
+    change_amount = float(api_data.get('09. change', 0))
+    change_percent = api_data.get('10. change percent', '0%').rstrip('%')
+    volume = int(api_data.get('06. volume', 0))
+    latest_trading_day = api_data.get('07. latest trading day', datetime.date.today().strftime('%Y-%m-%d'))
+    
+    return (symbol, open_price, high_price, low_price, current_price, volume,
+            latest_trading_day, previous_close, change_amount, change_percent)
+
 def cache_price_in_database(symbol: str, api_data: Dict) -> bool:
     """Cache API price data in database for future use"""
-    db = None
+    return cache_prices_in_database({symbol: api_data})
+
+def cache_prices_in_database(quotes: Dict[str, Dict]) -> bool:
+    """Cache API price data for many symbols with a single multi-row upsert"""
+    if not quotes:
+        return True
+    
     try:
-        db = get_db_connection()
-        if not db:
-            return False
+        with db_connection() as db:
+            if not db:
+                return False
+                
+            cursor = db.cursor()
             
-        cursor = db.cursor()
-        
-        # Extract relevant data from API response
-        current_price = float(api_data.get('05. price', 0))
-        open_price = float(api_data.get('02. open', current_price))
-        high_price = float(api_data.get('03. high', current_price))
-        low_price = float(api_data.get('04. low', current_price))
-        previous_close = float(api_data.get('08. previous close', current_price))
-        change_amount = float(api_data.get('09. change', 0))
-        change_percent = api_data.get('10. change percent', '0%').rstrip('%')
-        volume = int(api_data.get('06. volume', 0))
-        latest_trading_day = api_data.get('07. latest trading day', datetime.date.today().strftime('%Y-%m-%d'))
-        
-        # Insert or update the stock information
-        cursor.execute("""
-            INSERT INTO api_stock_information 
-            (stock_symbol, open_price, high_price, low_price, current_price, volume, 
-             latest_trading_day, previous_close, change_amount, change_percent)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            open_price = VALUES(open_price),
-            high_price = VALUES(high_price),
-            low_price = VALUES(low_price),
-            current_price = VALUES(current_price),
-            volume = VALUES(volume),
-            latest_trading_day = VALUES(latest_trading_day),
-            previous_close = VALUES(previous_close),
-            change_amount = VALUES(change_amount),
-            change_percent = VALUES(change_percent),
-            updated_at = CURRENT_TIMESTAMP
-        """, (symbol, open_price, high_price, low_price, current_price, volume,
-              latest_trading_day, previous_close, change_amount, change_percent))
+            rows = [_quote_to_row(symbol, api_data) for symbol, api_data in quotes.items()]
+            placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(rows))
+            
+            # Insert or update the stock information for every symbol in one statement
+            cursor.execute(f"""
+                INSERT INTO api_stock_information 
+                (stock_symbol, open_price, high_price, low_price, current_price, volume, 
+                 latest_trading_day, previous_close, change_amount, change_percent)
+                VALUES {placeholders}
+                ON DUPLICATE KEY UPDATE
+                open_price = VALUES(open_price),
+                high_price = VALUES(high_price),
+                low_price = VALUES(low_price),
+                current_price = VALUES(current_price),
+                volume = VALUES(volume),
+                latest_trading_day = VALUES(latest_trading_day),
+                previous_close = VALUES(previous_close),
+                change_amount = VALUES(change_amount),
+                change_percent = VALUES(change_percent),
+                updated_at = CURRENT_TIMESTAMP
+            """, [value for row in rows for value in row])
+            
+            db.commit()
+            print(f"Cached fresh price data for {', '.join(quotes)} in database")
         
-        db.commit()
-        print(f"Cached fresh price data for {symbol} in database")
+        # Revalue the holdings these prices touch (imported here: valuation imports utils)
+        from .valuation import portfolio_valuation
+        portfolio_valuation.update_prices({row[0]: row[4] for row in rows})
+        # Fill any resting limit/stop orders the new prices trigger
+        from .order_service import order_service
+        order_service.on_prices({row[0]: row[4] for row in rows})
         return True
-        
+            
     except Exception as e:
-        print(f"Error caching price for {symbol}: {e}")
+        print(f"Error caching prices for {', '.join(quotes)}: {e}")
         return False
-    finally:
-        if db:
-            db.close()
 
 def test_database_connection() -> bool:
     """Test database connectivity"""
-    db = None
     try:
-        db = get_db_connection()
-        if db:
-            cursor = db.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-            print("Database connection test successful")
-            return True
-        else:
-            print("Database connection test failed")
-            return False
+        with db_connection() as db:
+            if db:
+                cursor = db.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                print("Database connection test successful")
+                return True
+            else:
+                print("Database connection test failed")
+                return False
     except Exception as e:
         print(f"Database connection test failed: {e}")
         return False
-    finally:
-        if db:
-            db.close()
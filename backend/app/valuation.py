@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from .utils import db_connection
+
+# Holdings, prices and realized P&L are DECIMAL(10, 2) in the database
+def _cents(value) -> float:
+    return round(float(value), 2)
+
+class PortfolioValuation:
+    """
+    Live valuation of the holdings, seeded from the database and updated
+    incrementally as prices are cached and trades commit. Portfolio totals are
+    running sums, so summaries are O(1); a holding's row is rebuilt only when
+    its quantity, cost or price changes.
+    """
+
+    def __init__(self, resync_seconds: float = 300):
+        # Re-seed this often to pick up writes made outside the app (SQL scripts, other processes)
+        self.resync_seconds = resync_seconds
+
+        self._lock = threading.Lock()
+        self._positions = {}      # symbol -> {quantity, average_cost, current_price, row}
+        self._prices = {}         # last known price per symbol, held or not
+        self._realized = {}       # symbol -> realized P&L of its SELL trades
+        self._symbols = None      # held symbols in order, rebuilt when a holding opens or closes
+        self._ordered = None      # their rows, rebuilt when any row changes
+        self._market_value = 0.0
+        self._cost_basis = 0.0
+        self._realized_total = 0.0
+        self._loaded_at = None
+        self._changes = 0
+        self._stats = {"loads": 0, "price_updates": 0, "trade_updates": 0, "reads": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def load(self) -> bool:
+        """Seed (or re-seed) from holdings, api_stock_information and the trade history"""
+        from .ledger import trade_ledger
+        if trade_ledger.loaded:
+            # Read the tables only after the ledger's pending trades have reached them
+            try:
+                trade_ledger.flush()
+            except Exception as e:
+                print(f"Error flushing trade ledger before valuation load: {e}")
+                return False
+        for _ in range(3):
+            with self._lock:
+                changes = self._changes
+            try:
+                with db_connection() as db:
+                    if not db:
+                        return False
+                    db.start_transaction(consistent_snapshot=True, readonly=True)
+                    cursor = db.cursor(dictionary=True)
+                    cursor.execute("SELECT stock_symbol, current_price FROM api_stock_information")
+                    prices = cursor.fetchall()
+                    cursor.execute("SELECT stock_symbol, quantity, average_cost FROM holdings")
+                    holdings = cursor.fetchall()
+                    cursor.execute("""
+                        SELECT stock_symbol, COALESCE(SUM(realized_pnl), 0) AS realized_pnl
+                        FROM trades WHERE trade_type = 'SELL'
+                        GROUP BY stock_symbol
+                    """)
+                    realized = cursor.fetchall()
+            except Exception as e:
+                print(f"Error loading portfolio valuation: {e}")
+                return False
+
+            with self._lock:
+                if self._changes != changes:
+                    # A trade or price landed while we were reading; read again
+                    continue
+                self._positions = {}
+                self._prices = {row['stock_symbol']: float(row['current_price']) for row in prices}
+                self._market_value = 0.0
+                self._cost_basis = 0.0
+                for holding in holdings:
+                    self._set_position(holding['stock_symbol'], float(holding['quantity']),
+                                       float(holding['average_cost']))
+                self._realized = {row['stock_symbol']: float(row['realized_pnl']) for row in realized}
+                self._realized_total = sum(self._realized.values())
+                self._symbols = None
+                self._ordered = None
+                self._loaded_at = time.monotonic()
+                self._stats["loads"] += 1
+            print(f"Portfolio valuation loaded: {len(holdings)} holdings")
+            return True
+
+        print("Portfolio valuation kept changing during load; will retry on next read")
+        return False
+
+    def update_prices(self, prices: Dict[str, float]):
+        """New prices were cached; revalue only the holdings they touch"""
+        with self._lock:
+            self._changes += 1
+            for symbol, price in prices.items():
+                symbol = symbol.upper()
+                price = _cents(price)
+                self._prices[symbol] = price
+                position = self._positions.get(symbol)
+                if position and position['current_price'] != price:
+                    self._set_position(symbol, position['quantity'], position['average_cost'])
+                    self._stats["price_updates"] += 1
+
+    def apply_trade(self, symbol: str, quantity: float, average_cost: float, realized_pnl: float = 0):
+        """A trade committed: the holding is now `quantity` at `average_cost` (0 shares removes it)"""
+        symbol = symbol.upper()
+        with self._lock:
+            self._changes += 1
+            self._stats["trade_updates"] += 1
+            if realized_pnl:
+                realized_pnl = _cents(realized_pnl)
+                self._realized[symbol] = self._realized.get(symbol, 0.0) + realized_pnl
+                self._realized_total += realized_pnl
+            if quantity > 0:
+                self._set_position(symbol, _cents(quantity), _cents(average_cost))
+            else:
+                self._drop_position(symbol)
+
+    def portfolio_summary(self, symbol: str = None) -> Optional[Dict]:
+        """get_portfolio_summary() document, or None when not loaded"""
+        symbol = symbol.upper() if symbol else None
+        with self._lock:
+            if not self._fresh():
+                return None
+            self._stats["reads"] += 1
+            if symbol:
+                position = self._positions.get(symbol)
+                rows = [position['row']] if position else []
+                market_value = position['market_value'] if position else 0.0
+                cost_basis = position['cost_basis'] if position else 0.0
+                realized = self._realized.get(symbol, 0.0)
+            else:
+                rows = self._rows()
+                market_value, cost_basis, realized = self._market_value, self._cost_basis, self._realized_total
+
+        unrealized = market_value - cost_basis
+        return {
+            "holdings": rows,
+            "summary": {
+                "total_portfolio_value": round(market_value, 2),
+                "total_cost_basis": round(cost_basis, 2),
+                "total_unrealized_pnl": round(unrealized, 2),
+                "total_realized_pnl": round(realized, 2),
+                "total_pnl": round(unrealized + realized, 2),
+                "unrealized_pnl_percent": round((unrealized / cost_basis * 100) if cost_basis > 0 else 0, 2),
+                "holdings_count": len(rows)
+            }
+        }
+
+    def unrealized_pnl(self, symbol: str = None) -> Optional[Dict]:
+        """calculate_unrealized_pnl() document, or None when not loaded"""
+        symbol = symbol.upper() if symbol else None
+        with self._lock:
+            if not self._fresh():
+                return None
+            self._stats["reads"] += 1
+            if symbol:
+                position = self._positions.get(symbol)
+                positions = [position] if position else []
+            else:
+                positions = [self._positions[held] for held in self._held_symbols()
+                             if self._positions[held]['quantity'] > 0]
+            if symbol or len(positions) < len(self._positions):
+                market_value = sum(position['market_value'] for position in positions)
+                cost_basis = sum(position['cost_basis'] for position in positions)
+            else:
+                market_value, cost_basis = self._market_value, self._cost_basis
+
+        if not positions:
+            return {"unrealized_pnl": 0, "holdings": [], "total_market_value": 0, "total_cost_basis": 0}
+        unrealized = market_value - cost_basis
+        return {
+            "unrealized_pnl": round(unrealized, 2),
+            "total_market_value": round(market_value, 2),
+            "total_cost_basis": round(cost_basis, 2),
+            "unrealized_pnl_percent": round((unrealized / cost_basis * 100) if cost_basis > 0 else 0, 2),
+            "holdings": [position['pnl_row'] for position in positions]
+        }
+
+    def stats(self) -> Dict:
+        """Valuation counters for monitoring"""
+        with self._lock:
+            return {
+                **self._stats,
+                "loaded": self.loaded,
+                "holdings": len(self._positions),
+                "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self.loaded else None,
+                "resync_seconds": self.resync_seconds
+            }
+
+    def _fresh(self) -> bool:
+        # Called with the lock held; a stale model re-seeds in the background and keeps serving
+        if not self.loaded:
+            return False
+        if time.monotonic() - self._loaded_at > self.resync_seconds:
+            self._loaded_at = time.monotonic()
+            threading.Thread(target=self.load, daemon=True, name="valuation-resync").start()
+        return True
+
+    def _held_symbols(self) -> List[str]:
+        if self._symbols is None:
+            self._symbols = sorted(self._positions)
+        return self._symbols
+
+    def _rows(self) -> List[Dict]:
+        if self._ordered is None:
+            self._ordered = [self._positions[symbol]['row'] for symbol in self._held_symbols()]
+        return self._ordered
+
+    def _drop_position(self, symbol: str):
+        position = self._positions.pop(symbol, None)
+        if position:
+            self._market_value -= position['market_value']
+            self._cost_basis -= position['cost_basis']
+            self._symbols = None
+            self._ordered = None
+
+    def _set_position(self, symbol: str, quantity: float, average_cost: float):
+        # Unpriced holdings are valued at cost, as in the holdings ⨝ prices query
+        current_price = self._prices.get(symbol) or average_cost
+        market_value = quantity * current_price
+        cost_basis = quantity * average_cost
+        unrealized = market_value - cost_basis
+        unrealized_percent = round((unrealized / cost_basis * 100) if cost_basis > 0 else 0, 2)
+
+        previous = self._positions.get(symbol)
+        if previous:
+            self._market_value -= previous['market_value']
+            self._cost_basis -= previous['cost_basis']
+        else:
+            self._symbols = None
+        self._market_value += market_value
+        self._cost_basis += cost_basis
+
+        # Rows are replaced, never mutated, so documents already handed out stay consistent
+        self._positions[symbol] = {
+            "quantity": quantity,
+            "average_cost": average_cost,
+            "current_price": current_price,
+            "market_value": market_value,
+            "cost_basis": cost_basis,
+            "row": {
+                'stock_symbol': symbol,
+                'quantity': quantity,
+                'average_cost': average_cost,
+                'current_price': current_price,
+                'market_value': round(market_value, 2),
+                'cost_basis': round(cost_basis, 2),
+                'unrealized_pnl': round(unrealized, 2),
+                'unrealized_pnl_percent': unrealized_percent
+            },
+            "pnl_row": {
+                "symbol": symbol,
+                "quantity": quantity,
+                "average_cost": average_cost,
+                "current_price": current_price,
+                "cost_basis": round(cost_basis, 2),
+                "market_value": round(market_value, 2),
+                "unrealized_pnl": round(unrealized, 2),
+                "unrealized_pnl_percent": unrealized_percent
+            }
+        }
+        self._ordered = None
+
+# Shared valuation behind the portfolio and unrealized P&L endpoints
+portfolio_valuation = PortfolioValuation(resync_seconds=float(os.getenv('VALUATION_RESYNC_SECONDS', 300)))
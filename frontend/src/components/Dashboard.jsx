@@ -3,6 +3,16 @@ import { Link } from 'react-router-dom';
 import apiService from '../services/apiService';
 import StockSearchDropdown from './StockSearchDropdown';
 
+// Portfolio, cash and P&L come from one /api/dashboard snapshot; shaped like
+// Promise.allSettled results so both loaders below read them the same way
+const fetchDashboardSections = async () => {
+  try {
+    const dashboard = await apiService.getDashboard();
+    return [dashboard.portfolio, dashboard.cash, dashboard.pnl].map(value => ({ status: 'fulfilled', value }));
+  } catch (reason) {
+    return [0, 1, 2].map(() => ({ status: 'rejected', reason }));
+  }
+};
 
 const Dashboard = () => {
   const [portfolioData, setPortfolioData] = useState({
@@ -116,12 +126,8 @@ const Dashboard = () => {
       setLoading(true);
       setError(null);
       
-      // Fetch real portfolio data and comprehensive P&L data from database
-      const [portfolioResponse, cashResponse, comprehensivePnLResponse] = await Promise.allSettled([
-        apiService.getPortfolio(),
-        apiService.getBalance(),
-        apiService.getComprehensivePnL() // Get comprehensive P&L (realized + unrealized) for all holdings
-      ]);
+      // Fetch portfolio, cash and comprehensive P&L from one database snapshot
+      const [portfolioResponse, cashResponse, comprehensivePnLResponse] = await fetchDashboardSections();
 
       // Get portfolio data
       let holdings = [];
@@ -192,27 +198,20 @@ const Dashboard = () => {
         cashBalance = parseFloat(cashResponse.value.cash_balance);
       }
 
-      // Fetch quotes for watchlist stocks and holdings with intelligent caching
-      // First try database-only, then fallback to API if needed
-      const quotes = {};
+      // Fetch quotes for watchlist stocks and holdings in one request
+      // (backend serves cache/database prices and fetches only missing or stale symbols)
+      let quotes = {};
       const allSymbols = [...new Set([...watchlist, ...holdings.map(h => h.symbol)])]; // Combine and deduplicate
       
-      for (const symbol of allSymbols) {
+      if (allSymbols.length > 0) {
         try {
-          // Use database-first approach (backend automatically handles this)
-          const quote = await apiService.getStockQuote(symbol);
-          quotes[symbol] = quote;
-        } catch (err) {
-          console.warn(`Failed to fetch quote for ${symbol}:`, err);
-          // Optionally try to get from database only as fallback
-          try {
-            const dbQuote = await apiService.getStockQuoteFromDb(symbol);
-            if (dbQuote && !dbQuote.error) {
-              quotes[symbol] = dbQuote;
-            }
-          } catch (dbErr) {
-            console.warn(`No cached data available for ${symbol}`);
+          const quotesResponse = await apiService.getStockQuotes(allSymbols);
+          quotes = quotesResponse.quotes || {};
+          if (quotesResponse.missing && quotesResponse.missing.length > 0) {
+            console.warn(`No quote data available for ${quotesResponse.missing.join(', ')}`);
           }
+        } catch (err) {
+          console.warn('Failed to fetch watchlist quotes:', err);
         }
       }
       
@@ -252,11 +251,7 @@ const Dashboard = () => {
       
       try {
         // Fetch only the essential data without triggering loading state
-        const [portfolioResponse, cashResponse, comprehensivePnLResponse] = await Promise.allSettled([
-          apiService.getPortfolio(),
-          apiService.getBalance(),
-          apiService.getComprehensivePnL()
-        ]);
+        const [portfolioResponse, cashResponse, comprehensivePnLResponse] = await fetchDashboardSections();
 
         // Update portfolio data
         let holdings = [];
@@ -332,21 +327,7 @@ const Dashboard = () => {
           cashBalance = parseFloat(cashResponse.value.cash_balance);
         }
 
-        // Update watchlist quotes and holdings quotes
-        const quotes = {};
-        const allSymbols = [...new Set([...watchlist, ...holdings.map(h => h.symbol)])]; // Combine and deduplicate
-        
-        for (const symbol of allSymbols) {
-          try {
-            const quote = await apiService.getStockQuote(symbol);
-            quotes[symbol] = quote;
-          } catch (err) {
-            console.warn(`Failed to fetch quote for ${symbol}:`, err);
-          }
-        }
-
-        // Update state without triggering loading
-        setStockQuotes(quotes);
+        // Update state without triggering loading (watchlist quotes arrive over the stream)
         setPortfolioData({
           totalValue,
           totalCash: cashBalance,
@@ -370,6 +351,19 @@ const Dashboard = () => {
     };
   }, [watchlist]);
 
+  // Live quotes for the watchlist and holdings, pushed by the server
+  const holdingSymbols = portfolioData.holdings.map(h => h.symbol).filter(Boolean).sort().join(',');
+  useEffect(() => {
+    const allSymbols = [...new Set([...watchlist, ...(holdingSymbols ? holdingSymbols.split(',') : [])])];
+    if (allSymbols.length === 0) return undefined;
+
+    const closeStream = apiService.streamQuotes(allSymbols, (quotes) => {
+      setStockQuotes(prev => ({ ...prev, ...quotes }));
+    });
+
+    return closeStream;
+  }, [watchlist, holdingSymbols]);
+
   const formatCurrency = (amount) => {
     return new Intl.NumberFormat('en-US', {
       style: 'currency',
@@ -49,19 +49,12 @@ const Trading = () => {
           setAvailableCash(parseFloat(balance.cash_balance));
         }
 
-        // Refresh current holdings and stock quote if a stock is selected
+        // Refresh current holdings if a stock is selected (quotes arrive over the stream)
         if (selectedStock) {
-          // Fetch both updated stock quote and holdings
-          const [quoteResult, holdingsResult] = await Promise.allSettled([
-            apiService.getStockQuote(selectedStock),
+          const [holdingsResult] = await Promise.allSettled([
             apiService.getPortfolio(selectedStock)
           ]);
 
-          // Update stock quote with fresh data
-          if (quoteResult.status === 'fulfilled') {
-            setStockQuote(quoteResult.value);
-          }
-
           // Update holdings data
           if (holdingsResult.status === 'fulfilled' && holdingsResult.value.holdings && holdingsResult.value.holdings.length > 0) {
             const holding = holdingsResult.value.holdings[0];
@@ -88,6 +81,19 @@ const Trading = () => {
     };
   }, [selectedStock]);
 
+  // Live quote for the selected stock, pushed by the server
+  useEffect(() => {
+    if (!selectedStock) return undefined;
+
+    const closeStream = apiService.streamQuotes([selectedStock], (quotes) => {
+      if (quotes[selectedStock]) {
+        setStockQuote(quotes[selectedStock]);
+      }
+    });
+
+    return closeStream;
+  }, [selectedStock]);
+
   // Popular stocks for quick access
   const popularStocks = [
     { symbol: 'AAPL', name: 'Apple Inc.' },
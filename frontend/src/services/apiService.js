@@ -74,6 +74,32 @@ const apiService = {
     return api.get(`/stocks/${symbol}`);
   },
 
+  // Quotes for many symbols in one request: { quotes: { SYMBOL: quote }, missing: [...] }
+  // Each quote includes its source (cache, database, api, ...) and age_seconds.
+  getStockQuotes: async (symbols) => {
+    return api.get("/stocks", {
+      params: { symbols: symbols.map((s) => s.toUpperCase()).join(",") },
+    });
+  },
+
+  // Subscribe to server-pushed quote updates; onQuotes receives { SYMBOL: quote }.
+  // Returns a function that closes the stream.
+  streamQuotes: (symbols, onQuotes, onError = null) => {
+    const list = [...new Set(symbols.map((s) => s.toUpperCase()))];
+    const source = new EventSource(
+      `/api/stream/quotes?symbols=${encodeURIComponent(list.join(","))}`
+    );
+    source.addEventListener("quotes", (event) => {
+      onQuotes(JSON.parse(event.data));
+    });
+    source.onerror = (error) => {
+      // EventSource reconnects on its own; just report it
+      console.warn("Quote stream error:", error);
+      if (onError) onError(error);
+    };
+    return () => source.close();
+  },
+
   // Get stock quote from database only (no API fallback)
   getStockQuoteFromDb: async (symbol) => {
     return api.get(`/stocks/${symbol}/db-only`);
@@ -129,6 +155,14 @@ const apiService = {
     });
   },
 
+  // Get portfolio, cash balance, P&L and performance in one request
+  // (the browser revalidates with If-None-Match and reuses its copy on 304)
+  getDashboard: async (days = 30, userId = "default_user") => {
+    return api.get("/dashboard", {
+      params: { days, user_id: userId },
+    });
+  },
+
   // Get portfolio performance metrics
   getPerformance: async (days = 30) => {
     return api.get("/portfolio/performance", {
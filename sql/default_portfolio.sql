@@ -18,6 +18,19 @@ CREATE TABLE IF NOT EXISTS api_stock_information(
     INDEX idx_symbol (stock_symbol)
 );
 
+-- Locally stored OHLCV bars so chart requests do not re-download history
+CREATE TABLE IF NOT EXISTS price_history (
+    stock_symbol VARCHAR(50) NOT NULL,
+    bar_interval VARCHAR(10) NOT NULL,
+    bar_time DATETIME NOT NULL,
+    open_price DOUBLE NOT NULL,
+    high_price DOUBLE NOT NULL,
+    low_price DOUBLE NOT NULL,
+    close_price DOUBLE NOT NULL,
+    volume BIGINT NOT NULL,
+    PRIMARY KEY (stock_symbol, bar_interval, bar_time)
+);
+
 -- Holdings table to track current positions
 CREATE TABLE IF NOT EXISTS holdings (
     holding_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -45,10 +58,35 @@ CREATE TABLE IF NOT EXISTS trades (
     INDEX idx_symbol (stock_symbol),
     INDEX idx_type (trade_type),
     INDEX idx_date (trade_date),
+    INDEX idx_type_date (trade_type, trade_date),
     INDEX idx_symbol_date (stock_symbol, trade_date),
     INDEX idx_composite_filter (stock_symbol, trade_type, trade_date)
 );
 
+-- Upgrade: databases created before idx_type_date (CREATE TABLE IF NOT EXISTS skips it) get it here;
+-- MySQL has no CREATE INDEX IF NOT EXISTS, so the ALTER only runs when the index is missing
+SET @add_index = (
+    SELECT IF(COUNT(*) = 0, 'ALTER TABLE trades ADD INDEX idx_type_date (trade_type, trade_date)', 'DO 0')
+    FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'trades' AND index_name = 'idx_type_date'
+);
+PREPARE add_index FROM @add_index;
+EXECUTE add_index;
+DEALLOCATE PREPARE add_index;
+
+-- Open FIFO lots: one row per BUY with shares not yet sold (closed lots are deleted)
+CREATE TABLE IF NOT EXISTS open_lots (
+    lot_id INT AUTO_INCREMENT PRIMARY KEY,
+    trade_id INT NOT NULL,
+    stock_symbol VARCHAR(50) NOT NULL,
+    remaining_quantity DECIMAL(10, 2) NOT NULL,
+    cost_per_share DECIMAL(10, 2) NOT NULL,
+    opened_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (trade_id) REFERENCES trades(trade_id),
+    UNIQUE KEY unique_trade (trade_id),
+    INDEX idx_symbol_fifo (stock_symbol, opened_at, lot_id)
+);
+
 -- User cash balance table
 CREATE TABLE IF NOT EXISTS user_balance (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -61,6 +99,39 @@ CREATE TABLE IF NOT EXISTS user_balance (
 -- Insert default cash balance
 INSERT IGNORE INTO user_balance (user_id, cash_balance) VALUES ('default_user', 5000000.00);
 
+-- Portfolio NAV snapshots per user: one EOD row per day (stamped 23:59:59) plus optional intraday rows
+CREATE TABLE IF NOT EXISTS nav_snapshots (
+    user_id VARCHAR(50) NOT NULL,
+    snapshot_type ENUM('EOD','INTRADAY') NOT NULL,
+    snapshot_time DATETIME NOT NULL,
+    cash_balance DECIMAL(15, 2) NOT NULL,
+    market_value DECIMAL(15, 2) NOT NULL,
+    cost_basis DECIMAL(15, 2) NOT NULL,
+    realized_pnl DECIMAL(15, 2) NOT NULL,
+    unrealized_pnl DECIMAL(15, 2) NOT NULL,
+    nav DECIMAL(15, 2) NOT NULL,
+    PRIMARY KEY (user_id, snapshot_type, snapshot_time)
+);
+
+-- Weekly and monthly NAV rollups, recomputed from the EOD snapshots as each day closes
+CREATE TABLE IF NOT EXISTS nav_rollups (
+    user_id VARCHAR(50) NOT NULL,
+    period ENUM('WEEK','MONTH') NOT NULL,
+    period_start DATE NOT NULL,
+    open_nav DECIMAL(15, 2) NOT NULL,
+    high_nav DECIMAL(15, 2) NOT NULL,
+    low_nav DECIMAL(15, 2) NOT NULL,
+    close_nav DECIMAL(15, 2) NOT NULL,
+    cash_balance DECIMAL(15, 2) NOT NULL,
+    market_value DECIMAL(15, 2) NOT NULL,
+    cost_basis DECIMAL(15, 2) NOT NULL,
+    realized_pnl DECIMAL(15, 2) NOT NULL,
+    unrealized_pnl DECIMAL(15, 2) NOT NULL,
+    days_count INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, period, period_start)
+);
+
 -- Profit and Loss tracking table (optional - for detailed P&L history)
 CREATE TABLE IF NOT EXISTS profit_and_loss (
     pl_id INT PRIMARY KEY AUTO_INCREMENT,
@@ -74,6 +145,26 @@ CREATE TABLE IF NOT EXISTS profit_and_loss (
     INDEX idx_date (calculation_date)
 );
 
+-- Resting limit/stop orders; open ones (PENDING, or TRIGGERED stop-limits) are reloaded into the trigger index
+CREATE TABLE IF NOT EXISTS resting_orders (
+    order_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id VARCHAR(50) NOT NULL,
+    stock_symbol VARCHAR(50) NOT NULL,
+    side ENUM('BUY','SELL') NOT NULL,
+    order_type ENUM('LIMIT','STOP','STOP_LIMIT') NOT NULL,
+    quantity INT NOT NULL,
+    limit_price DECIMAL(10, 2) NULL,
+    stop_price DECIMAL(10, 2) NULL,
+    status ENUM('PENDING','TRIGGERED','FILLED','REJECTED','CANCELLED') NOT NULL DEFAULT 'PENDING',
+    fill_price DECIMAL(10, 2) NULL,
+    trade_id INT NULL,
+    message VARCHAR(255) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_status (status),
+    INDEX idx_user_status (user_id, status)
+);
+
 CREATE TABLE IF NOT EXISTS news (
 	headline_id INT PRIMARY KEY AUTO_INCREMENT,
     headline TEXT NOT NULL,
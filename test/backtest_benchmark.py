@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Backtest Benchmark
+==================
+Replays a synthetic daily close matrix (random walks, some symbols listing
+late) through the SMA crossover and buy-and-hold strategies with the
+in-memory ledger, and checks the ledger's bookkeeping: final equity equals
+cash plus marked positions, and realized P&L equals the sum over the trade
+log. Sizes can be tuned with the SYMBOLS and YEARS environment variables.
+"""
+
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Add project paths
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from backend.app.backtest import run_backtest, SmaCrossover, BuyAndHold
+
+SYMBOLS = int(os.getenv('SYMBOLS', 300))
+YEARS = int(os.getenv('YEARS', 10))
+
+def make_closes(symbols: int, years: int) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    index = pd.bdate_range('2015-01-01', periods=252 * years)
+    steps = rng.normal(0.0003, 0.015, (len(index), symbols))
+    closes = 50 * np.exp(np.cumsum(steps, axis=0))
+    # Every tenth symbol only starts trading a year in
+    closes[:252, ::10] = np.nan
+    return pd.DataFrame(closes, index=index, columns=[f"S{i:03d}" for i in range(symbols)])
+
+def check(result, closes: pd.DataFrame) -> bool:
+    last = closes.ffill().iloc[-1]
+    marked = sum(quantity * last[symbol] for symbol, quantity in result['positions'].items())
+    equity_ok = abs(result['equity_curve']['cash'][-1] + marked - result['final_equity']) < 0.05
+    realized = sum(trade['realized_pnl'] for trade in result['trades'] if trade['realized_pnl'] is not None)
+    realized_ok = abs(realized - result['realized_pnl']) < 0.01 * max(1, result['trades_count'])
+    return equity_ok and realized_ok
+
+def main():
+    print("BACKTEST BENCHMARK")
+    print("=" * 50)
+    closes = make_closes(SYMBOLS, YEARS)
+    print(f"{closes.shape[1]:,} symbols x {closes.shape[0]:,} daily bars\n")
+
+    for name, strategy in (("sma_crossover(20, 50)", SmaCrossover(20, 50)), ("buy_and_hold", BuyAndHold())):
+        result = run_backtest(strategy, closes, initial_cash=1_000_000)
+        if not check(result, closes):
+            print(f"❌ {name}: ledger totals do not add up")
+            sys.exit(1)
+        print(f"{name:<24} {result['elapsed_ms']:10.1f} ms  {result['trades_count']:7,} trades  "
+              f"final equity ${result['final_equity']:,.2f}  max drawdown {result['metrics']['max_drawdown']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Order Engine Benchmark
+======================
+Rests tens of thousands of LIMIT, STOP and STOP_LIMIT orders in the trigger
+index, replays random-walk price updates against it, and checks every update
+against a full scan of the pending orders: the same orders must fill and the
+same stop-limits must activate. Some orders are cancelled along the way.
+Sizes can be tuned with the ORDERS, SYMBOLS and UPDATES environment variables.
+"""
+
+import sys
+import os
+import random
+import time
+
+# Add project paths
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from backend.app.order_service import TriggerIndex, RestingOrder
+from backend.app.order_request import OrderType, OrderSide
+
+ORDERS = int(os.getenv('ORDERS', 50_000))
+SYMBOLS = int(os.getenv('SYMBOLS', 50))
+UPDATES = int(os.getenv('UPDATES', 5_000))
+
+def make_orders(count: int, symbols: int):
+    rng = random.Random(7)
+    orders = []
+    for order_id in range(1, count + 1):
+        order_type = rng.choice([OrderType.LIMIT, OrderType.STOP, OrderType.STOP_LIMIT])
+        side = rng.choice([OrderSide.BUY, OrderSide.SELL])
+        trigger = round(rng.uniform(50, 150), 2)
+        # Stop-limits buy up to a little above the stop, or sell down to a little below it
+        offset = round(rng.uniform(0, 5), 2) * (1 if side == OrderSide.BUY else -1)
+        orders.append(RestingOrder(
+            order_id, 'default_user', f"S{rng.randrange(symbols):03d}", side, order_type, 10,
+            limit_price=trigger if order_type == OrderType.LIMIT else
+            (trigger + offset if order_type == OrderType.STOP_LIMIT else None),
+            stop_price=trigger if order_type != OrderType.LIMIT else None
+        ))
+    return orders
+
+def scan(pending: dict, symbol: str, price: float):
+    """Reference: check every pending order of the symbol"""
+    fills, activated = set(), set()
+    for order in pending.values():
+        if order.symbol != symbol:
+            continue
+        if order.order_type == OrderType.STOP_LIMIT and not order.activated:
+            falling, stop = order.placement()
+            if price <= stop if falling else price >= stop:
+                order.activated = True
+                activated.add(order.order_id)
+            else:
+                continue
+        falling, trigger = order.placement()
+        if price <= trigger if falling else price >= trigger:
+            fills.add(order.order_id)
+    for order_id in fills:
+        del pending[order_id]
+    return fills, activated
+
+def main():
+    print("ORDER ENGINE BENCHMARK")
+    print("=" * 50)
+    orders = make_orders(ORDERS, SYMBOLS)
+    # Separate copies for the index and the reference scan (activation mutates orders)
+    index = TriggerIndex()
+    for order in orders:
+        index.add(order)
+    pending = {order.order_id: RestingOrder(order.order_id, order.user_id, order.symbol, order.side, order.order_type,
+                                            order.quantity, order.limit_price, order.stop_price)
+               for order in orders}
+    print(f"{ORDERS:,} resting orders over {SYMBOLS} symbols, {UPDATES:,} price updates\n")
+
+    rng = random.Random(11)
+    prices = {f"S{i:03d}": 100.0 for i in range(SYMBOLS)}
+    index_ms = scan_ms = 0.0
+    filled = 0
+    for update in range(UPDATES):
+        symbol = f"S{rng.randrange(SYMBOLS):03d}"
+        prices[symbol] = round(max(1.0, prices[symbol] * (1 + rng.gauss(0, 0.02))), 2)
+
+        if update % 10 == 0 and len(index):
+            # Cancel a random open order in both
+            order_id = rng.choice(list(pending))
+            index.remove(order_id)
+            del pending[order_id]
+
+        started = time.perf_counter()
+        fills, activated = index.trigger(symbol, prices[symbol])
+        index_ms += (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        expected_fills, expected_activated = scan(pending, symbol, prices[symbol])
+        scan_ms += (time.perf_counter() - started) * 1000
+
+        if {order.order_id for order in fills} != expected_fills or \
+                {order.order_id for order in activated} != expected_activated:
+            print(f"❌ Update {update} ({symbol} at {prices[symbol]}): index and full scan disagree")
+            sys.exit(1)
+        filled += len(fills)
+
+    if len(index) != len(pending):
+        print(f"❌ {len(index)} orders left in the index, {len(pending)} in the full scan")
+        sys.exit(1)
+
+    print(f"{'orders filled':<30} {filled:>10,}")
+    print(f"{'orders still resting':<30} {len(index):>10,}")
+    print(f"{'trigger index (per update)':<30} {index_ms / UPDATES * 1000:>10.1f} us")
+    print(f"{'full scan (per update)':<30} {scan_ms / UPDATES * 1000:>10.1f} us")
+    print(f"{'speedup':<30} {scan_ms / index_ms if index_ms else float('inf'):>10.1f}x")
+
+if __name__ == "__main__":
+    main()
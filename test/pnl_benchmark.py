@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+P&L Kernel Benchmark
+====================
+Compares the previous per-row Python loops of get_portfolio_summary and
+calculate_unrealized_pnl with the vectorized kernels they now share, on
+synthetic cursor rows: DECIMAL values for the old loops (as mysql.connector
+returns them) and DOUBLE values for the new queries, which CAST the columns.
+(Realized P&L statistics are aggregated in SQL, so there is no Python loop
+left to compare there.) The size can be tuned with the HOLDINGS environment
+variable.
+"""
+
+import sys
+import os
+import time
+import random
+from contextlib import contextmanager
+from decimal import Decimal
+
+# Add project paths
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from backend.app import pnl, portfolio
+
+HOLDINGS = int(os.getenv('HOLDINGS', 10_000))
+
+def cents(low: float, high: float) -> Decimal:
+    return Decimal(random.randint(int(low * 100), int(high * 100))) / 100
+
+def make_holdings(count: int):
+    return [
+        {
+            'stock_symbol': f"S{i:05d}",
+            'quantity': cents(1, 500),
+            'average_cost': cents(1, 900),
+            # Some holdings have no cached price and are valued at cost
+            'current_price': cents(1, 900) if i % 20 else None
+        }
+        for i in range(count)
+    ]
+
+def as_double(rows):
+    """The same rows as a CAST(... AS DOUBLE) query returns them"""
+    return [{key: float(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+            for row in rows]
+
+class FixtureCursor:
+    """Answers the holdings and realized-sum queries from fixture rows"""
+
+    def __init__(self, holdings):
+        self.holdings = holdings
+        self.result = []
+
+    def execute(self, query, params=None):
+        if 'FROM holdings' in query:
+            self.result = self.holdings
+        else:
+            self.result = [{'total_realized_pnl': Decimal('1234.56')}]
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+class FixtureConnection:
+    def __init__(self, holdings):
+        self.holdings = holdings
+
+    def cursor(self, dictionary=False):
+        return FixtureCursor(self.holdings)
+
+def legacy_holdings_loop(holdings):
+    """The previous per-row valuation loop (get_portfolio_summary / calculate_unrealized_pnl)"""
+    portfolio_value = 0
+    total_cost_basis = 0
+    unrealized_pnl = 0
+    rows = []
+    for holding in holdings:
+        quantity = float(holding['quantity'])
+        avg_cost = float(holding['average_cost'])
+        current_price = float(holding['current_price']) if holding['current_price'] else avg_cost
+        market_value = current_price * quantity
+        cost_basis = avg_cost * quantity
+        holding_unrealized_pnl = market_value - cost_basis
+        portfolio_value += market_value
+        total_cost_basis += cost_basis
+        unrealized_pnl += holding_unrealized_pnl
+        rows.append({
+            'stock_symbol': holding['stock_symbol'],
+            'quantity': quantity,
+            'average_cost': avg_cost,
+            'current_price': current_price,
+            'market_value': round(market_value, 2),
+            'cost_basis': round(cost_basis, 2),
+            'unrealized_pnl': round(holding_unrealized_pnl, 2),
+            'unrealized_pnl_percent': round((holding_unrealized_pnl / cost_basis * 100) if cost_basis > 0 else 0, 2)
+        })
+    return rows, round(portfolio_value, 2), round(total_cost_basis, 2), round(unrealized_pnl, 2)
+
+def timed(name: str, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"{name:<40} {elapsed:10.1f} ms")
+    return result, elapsed
+
+def main():
+    print("P&L KERNEL BENCHMARK")
+    print("=" * 50)
+    print(f"{HOLDINGS:,} holdings\n")
+
+    random.seed(7)
+    holdings = make_holdings(HOLDINGS)
+    double_holdings = as_double(holdings)
+
+    @contextmanager
+    def fixture_connection():
+        yield FixtureConnection(double_holdings)
+
+    # Serve the SQL paths from the fixture (the live valuation is not loaded here)
+    portfolio.db_connection = fixture_connection
+    pnl.db_connection = fixture_connection
+
+    (legacy_rows, value, cost, unrealized), before_holdings = timed("before: holdings loop", legacy_holdings_loop, holdings)
+    summary, after_summary = timed("after:  get_portfolio_summary", portfolio.get_portfolio_summary)
+    unrealized_report, after_unrealized = timed("after:  calculate_unrealized_pnl", pnl.calculate_unrealized_pnl)
+
+    # Both paths must produce the same documents
+    checks = [
+        summary['summary']['total_portfolio_value'] == value,
+        summary['summary']['total_cost_basis'] == cost,
+        unrealized_report['unrealized_pnl'] == unrealized,
+    ]
+    if not all(checks) or legacy_rows != summary['holdings']:
+        print("❌ Kernel output differs from the previous loops")
+        sys.exit(1)
+
+    print(f"\nPortfolio summary speedup:  {before_holdings / after_summary:.2f}x")
+    print(f"Unrealized P&L speedup:     {before_holdings / after_unrealized:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Quote Latency Benchmark
+=======================
+Compares the old get_quote path (ticker.info + ticker.history) with the
+history-only path against a stubbed yFinance fixture, so the numbers do not
+depend on the network. Latencies of the stubbed calls can be tuned with the
+INFO_LATENCY_MS and HISTORY_LATENCY_MS environment variables.
+"""
+
+import sys
+import os
+import time
+import statistics
+import pandas as pd
+
+# Add project paths
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, 'backend'))
+
+from backend.app import market
+
+# Typical latencies observed for yFinance calls (milliseconds)
+INFO_LATENCY_MS = float(os.getenv('INFO_LATENCY_MS', 350))
+HISTORY_LATENCY_MS = float(os.getenv('HISTORY_LATENCY_MS', 90))
+ITERATIONS = int(os.getenv('ITERATIONS', 20))
+
+# Recorded AAPL daily bars (period="2d")
+HISTORY_FIXTURE = pd.DataFrame(
+    {
+        'Open': [225.14, 227.62],
+        'High': [228.42, 229.86],
+        'Low': [224.73, 226.95],
+        'Close': [227.18, 229.35],
+        'Volume': [48125600, 51732900],
+        'Dividends': [0.0, 0.0],
+        'Stock Splits': [0.0, 0.0]
+    },
+    index=pd.DatetimeIndex(['2025-08-14', '2025-08-15'], tz='America/New_York', name='Date')
+)
+
+INFO_FIXTURE = {'symbol': 'AAPL', 'longName': 'Apple Inc.', 'currentPrice': 229.35}
+
+class StubTicker:
+    """Stand-in for yf.Ticker that returns the recorded fixture after a fixed delay"""
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        time.sleep(INFO_LATENCY_MS / 1000)
+        return dict(INFO_FIXTURE)
+
+    def history(self, period="1mo", interval="1d", **kwargs):
+        time.sleep(HISTORY_LATENCY_MS / 1000)
+        return HISTORY_FIXTURE.copy()
+
+def legacy_fetch_quote(symbol: str):
+    """The previous quote path: fetches ticker.info and then ignores it"""
+    ticker = market.yf.Ticker(symbol)
+    info = ticker.info
+    hist = ticker.history(period="2d")
+    return market._quote_from_history(symbol, hist)
+
+def time_calls(func, symbol: str):
+    samples = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        func(symbol)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def report(name: str, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{name:<28} mean {statistics.mean(samples):8.2f} ms   "
+          f"median {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms")
+    return statistics.mean(samples)
+
+def main():
+    print("QUOTE LATENCY BENCHMARK")
+    print("=" * 50)
+    print(f"Stubbed latency: info={INFO_LATENCY_MS:.0f} ms, history={HISTORY_LATENCY_MS:.0f} ms, "
+          f"{ITERATIONS} iterations\n")
+
+    original_ticker = market.yf.Ticker
+    market.yf.Ticker = StubTicker
+    try:
+        # Both paths must produce the same quote
+        if legacy_fetch_quote("AAPL") != market._fetch_quote("AAPL"):
+            print("❌ Quote output differs between the old and new paths")
+            sys.exit(1)
+
+        before = report("before (info + history)", time_calls(legacy_fetch_quote, "AAPL"))
+        after = report("after (history only)", time_calls(market._fetch_quote, "AAPL"))
+    finally:
+        market.yf.Ticker = original_ticker
+
+    print(f"\nSpeedup: {before / after:.2f}x ({before - after:.2f} ms saved per quote)")
+
+if __name__ == "__main__":
+    main()